@@ -1,3 +1,7 @@
+import time
+
+launch_time = time.perf_counter()  # measured before anything else is imported for --startup-profile
+
 import sys
 import os
 import tkinter as tk
@@ -35,23 +39,37 @@ is_portable = True
 root_dir = Path(getattr(sys, "_MEIPASS", Path.cwd()))
 
 
+# '--startup-profile' prints a timed breakdown of the startup, '--startup-profile=quit' also closes the window after
+# the first paint and exits with status 1 if the first paint target was missed
+startup_profile = None
+for arg in sys.argv[1:]:
+    if arg == "--startup-profile" or arg.startswith("--startup-profile="):
+        startup_profile = arg.split("=", maxsplit=1)[1] if "=" in arg else "print"
+
+
 # safely import Editor
+# Pillow is only imported when sprites have to be resized, so only its metadata is checked here
+from importlib import metadata
 try:
-    import PIL
-except ImportError:
+    cur_pil_ver = metadata.version("pillow")
+except metadata.PackageNotFoundError:
     display_warning("Missing Package",
                     f"Needs Python package Pillow {ver_str(min_pil_ver)}+ to work properly.\n\nYou can install it via "
                     f"the console command 'pip install pillow'.")
     sys.exit()
-cur_pil_ver = PIL.__version__.split(".", maxsplit=2)
-cur_pil_ver = tuple(int(subver) for subver in cur_pil_ver)
+cur_pil_ver = cur_pil_ver.split(".", maxsplit=2)
+cur_pil_ver = tuple(int("".join(char for char in subver if char.isdigit()) or 0) for subver in cur_pil_ver)
 if cur_pil_ver < min_pil_ver:
     display_warning("Unsupported Version",
                     f"Pillow {ver_str(cur_pil_ver)} is not supported. Please use version {ver_str(min_pil_ver)} or "
                     f"higher.")
     sys.exit()
 else:
-    from program.source import Editor
+    from program.source import Profiler as prf
+    if startup_profile:
+        prf.startup_profiler.start(launch_time)
+    with prf.startup_profiler.stage("imports"):
+        from program.source import Editor
 
 
 if is_portable:
@@ -67,7 +85,7 @@ else:
 if cur_version >= min_version:
     # noinspection PyBroadException
     try:
-        Editor.startup(profile_dir=profile_dir, root_dir=root_dir, dev_mode=dev_mode)
+        Editor.startup(profile_dir=profile_dir, root_dir=root_dir, dev_mode=dev_mode, startup_profile=startup_profile)
     except KeyboardInterrupt:  # avoid printing KeyboardInterrupt error
         sys.exit()
     except Exception as e:
@@ -78,6 +96,8 @@ if cur_version >= min_version:
         else:
             display_error("Internal Error", f"{type(e).__name__}: {e}")
         sys.exit()
+    if startup_profile == "quit" and prf.startup_profiler.first_paint_exceeded():
+        sys.exit(1)
 else:
     display_warning("Unsupported Version", f"Python {ver_str(cur_version)} is not supported. Please use Python "
                                            f"{ver_str(min_version)} or higher.")
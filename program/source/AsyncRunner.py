@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+
+from program.source import Lanes as ln
+from program.source import Emulator as emu
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# Runs programs inside an asyncio event loop without blocking it, the emulator has to be started first (e.g. by
+# Headless.startup()):
+#
+#     state = await run_program(source, {"max_steps": 10 ** 6, "word_size": 32})
+#
+#     async for snapshot in iter_program(source, limits):  # one snapshot every yield_steps steps, the last one is final
+#         ...
+#
+# Cancelling the task stops the program at the next yield, asyncio.wait_for() can limit its run time.
+LIMIT_KEYS = "max_steps", "max_jmps", "max_cels", "word_size", "overflow_mode"
+YIELD_STEPS = 1000  # one or two milliseconds of steps between two yields to the event loop
+
+
+@contextlib.contextmanager
+def limits_applied(limits):
+    """Set the emulator properties of limits and restore the previous ones afterwards
+    
+    The properties are globals of Emulator.py that all programs share, so they are only changed while a program runs
+    without yielding to the event loop."""
+    properties = emu.MIN_ADR_LEN, emu.MAX_JMPS, emu.MAX_CELS, emu.WORD_SIZE, emu.OVERFLOW_MODE
+    emu.st_properties(properties[0], limits.get("max_jmps", properties[1]), limits.get("max_cels", properties[2]),
+                      limits.get("word_size", properties[3]), limits.get("overflow_mode", properties[4]))
+    try:
+        yield
+    finally:
+        emu.st_properties(*properties)
+
+
+def check_limits(limits):
+    for key in limits:
+        if key not in LIMIT_KEYS:
+            raise ValueError(f"Unknown limit '{key}', choose from: {', '.join(LIMIT_KEYS)}")
+    with limits_applied(limits):  # raises a ValueError for unsupported values
+        pass
+
+
+def execute_steps(prg, steps, max_steps=None):
+    """Execute up to steps commands of a started program, like Lanes.continue_executing()"""
+    stop_steps = prg.steps + steps
+    while prg.executing and prg.steps < stop_steps:
+        if max_steps is not None and prg.steps >= max_steps:
+            prg.executing = False
+            raise ln.StepLimitExceeded(emu.eh.error("MaxSteps", max_steps=max_steps))
+        prg.execute_cell()
+
+
+def gt_snapshot(prg):
+    return {"accu": prg.accu, "pc": prg.pc, "steps": prg.steps, "done": False}
+
+
+async def iter_program(prg, limits=None, inputs=None, yield_steps=YIELD_STEPS):
+    """Execute prg (source, lines or a Program) and yield a snapshot of its registers every yield_steps steps
+    
+    The last snapshot is the final state of Lanes.gt_state() with "done" set, errors of the program end up in its
+    "error" instead of being raised."""
+    limits = limits or {}
+    check_limits(limits)
+    try:
+        with limits_applied(limits):
+            if not isinstance(prg, emu.Program):
+                prg = emu.Program(prg)
+            ln.apply_inputs(prg, inputs or {})
+            prg.start_executing()
+        while prg.executing:
+            with limits_applied(limits):
+                execute_steps(prg, yield_steps, limits.get("max_steps"))
+            if prg.executing:
+                await asyncio.sleep(0)  # lets other tasks run and raises CancelledError if the task was cancelled
+                yield gt_snapshot(prg)
+    except Exception as error:
+        state = ln.gt_state(prg, error) if isinstance(prg, emu.Program) else {"accu": None, "pc": None, "steps": 0,
+                                                                              "memory": {}, "error": str(error)}
+    else:
+        state = ln.gt_state(prg)
+    state["done"] = True
+    yield state
+
+
+async def run_program(prg, limits=None, inputs=None, yield_steps=YIELD_STEPS):
+    """Execute prg like iter_program() and return its final state"""
+    async for state in iter_program(prg, limits, inputs, yield_steps):
+        pass
+    return state
@@ -0,0 +1,192 @@
+import os
+import sys
+import gc
+import json
+import time
+import types
+import platform
+import argparse
+import tempfile
+import statistics
+
+from program.source import Headless as hl
+from program.source import Emulator as emu
+from program.source import Generator as gen
+from program.source import PackHandler as pck
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# usage: python -m program.source.Benchmark [--save-baseline] [--fail-on-regression] [--help for all options]
+DEFAULT_BASELINE = os.path.join(pck.program_dir.parent, "benchmarks", "baseline.json")
+
+
+def time_case(func, repeat):
+    """Return the median and minimum seconds of func() over repeat runs; garbage collection is paused while timing"""
+    times = []
+    for i in range(repeat):
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    return {"median": statistics.median(times), "min": min(times), "runs": repeat}
+
+
+def gt_machine_info():
+    return {"python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count()}
+
+
+def run_step_mode(prg_str):
+    prg = emu.Program(prg_str)
+    prg.execute(False)  # first step only starts executing
+    while not prg.halted:
+        prg.execute(False)
+
+
+def gt_cases(args, cache_dir):
+    prg_str = gen.gen_program(args.cells, args.loop_depth, args.loop_count, args.store_density, args.comment_ratio,
+                              args.seed)
+    # every fourth cell only, so that fill_empty_cells() has to create the cells in between
+    sparse_cells = [emu.Cell(*emu.split_cell_at_comment(line)) for line in prg_str.split("\n")[::4]]
+    executed_prg = emu.Program(prg_str)
+    executed_prg.execute()
+    error_handler = pck.ErrorHandler()
+    packs_dir = f"{pck.program_dir}/resources"
+    pck.PackHandler(cache_dir).gt_pack_data("default_profile", packs_dir)  # fill the disk cache
+    warm_handler = pck.PackHandler()
+    warm_handler.gt_pack_data("default_profile", packs_dir)
+    
+    def fill_empty_cells():
+        for cell in sparse_cells:
+            cell.line = None
+        emu.Program("").fill_empty_cells(list(sparse_cells))
+    
+    def execute_all():
+        prg = emu.Program(prg_str)
+        prg.execute()
+    
+    cases = {"create_cells": lambda: emu.Program(prg_str),
+             "fill_empty_cells": fill_empty_cells,
+             "execute_all": execute_all,
+             "execute_steps": lambda: run_step_mode(prg_str),
+             "gt_prg": lambda: executed_prg.gt_prg(),
+             "str": lambda: str(executed_prg),
+             "error": lambda: [error_handler.error("AdrNotUnique", adr="42") for i in range(1000)],
+             "gt_pack_data_cold": lambda: pck.PackHandler().gt_pack_data("default_profile", packs_dir),
+             "gt_pack_data_disk_cache": lambda: pck.PackHandler(cache_dir).gt_pack_data("default_profile", packs_dir),
+             "gt_pack_data_warm": lambda: warm_handler.gt_pack_data("default_profile", packs_dir)}
+    display_output = gt_display_output_case(executed_prg)
+    if display_output:
+        cases["display_output"] = display_output
+    return cases
+
+
+def gt_display_output_case(prg):
+    """Return a case that renders prg into an OutCodeBlock, or None if there is no display to create a Tk root on"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        return None
+    root.withdraw()
+    from program.source import Widgets as wdg
+    stub_editor = types.SimpleNamespace(theme_text_bg="#FFFFFF", theme_text_fg="#000000", theme_cursor_color="#000000",
+                                        theme_accent_color="#0000FF", theme_error_color="#FF0000",
+                                        gt_code_font=lambda: ("Courier New", 10))
+    out_CDB = wdg.OutCodeBlock(root, stub_editor)
+    out_CDB.pack()
+    sections = prg.gt_prg()
+    
+    def display_output():
+        out_CDB.displayed_runs = None  # force a redraw
+        out_CDB.display_output(*sections)
+        root.update_idletasks()
+    return display_output
+
+
+def compare(results, baseline, tolerance):
+    """Return the names of all cases whose median is more than tolerance (relative) slower than in the baseline"""
+    regressions = []
+    for name, result in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            print(f"  {name:<24} {result['median'] * 1000:10.3f} ms  (not in baseline)")
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else 1.0
+        verdict = ""
+        if ratio > 1 + tolerance:
+            verdict = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<24} {result['median'] * 1000:10.3f} ms  {ratio:6.2f}x baseline{verdict}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m program.source.Benchmark",
+                                     description="Time the parse, execute and render paths of the emulator.")
+    parser.add_argument("--cells", type=int, default=200, help="memory cells of the synthetic program")
+    parser.add_argument("--loop-depth", type=int, default=2, help="nesting depth of the countdown loops")
+    parser.add_argument("--loop-count", type=int, default=3, help="iterations of each loop")
+    parser.add_argument("--store-density", type=float, default=0.3, help="share of STA commands in the loop body")
+    parser.add_argument("--comment-ratio", type=float, default=0.2, help="share of lines with a comment")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20, help="runs per case; the median is reported")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative slowdown that counts as regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with 1 if a case regressed")
+    args = parser.parse_args(argv)
+    
+    hl.startup()
+    results = {"machine": gt_machine_info(),
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "program": {"cells": args.cells, "loop_depth": args.loop_depth, "loop_count": args.loop_count,
+                           "store_density": args.store_density, "comment_ratio": args.comment_ratio,
+                           "seed": args.seed,
+                           "steps": gen.gt_expected_steps(args.loop_depth, args.loop_count, args.cells)},
+               "cases": {}}
+    with tempfile.TemporaryDirectory(prefix="assemblitor-benchmark-") as cache_dir:  # for the disk cache of packs
+        for name, func in gt_cases(args, cache_dir).items():
+            results["cases"][name] = time_case(func, args.repeat)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+    regressions = []
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("program") != results["program"]:
+            print("Warning: the baseline was measured with a different synthetic program.")
+        print(f"Compared to {args.baseline}:")
+        regressions = compare(results, baseline, args.tolerance)
+    else:
+        for name, result in results["cases"].items():
+            print(f"  {name:<24} {result['median'] * 1000:10.3f} ms")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+        print(f"Saved baseline to {args.baseline}")
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import sys
+import json
+import time
+import argparse
+import statistics
+
+from program.source import Headless as hl
+from program.source import Emulator as emu
+from program.source import PackHandler as pck
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# usage: python -m program.source.Corpus [--repeat N] [--program NAME ...] [--output FILE]
+
+
+def gt_corpus():
+    """Return the reference programs as {name: {"name": ..., "program": ..., "expected": ...}}"""
+    return pck.ph.gt_pack_data("corpus", f"{pck.program_dir}/resources")
+
+
+def gt_memory(prg):
+    """Return {address: value} of all memory cells that hold a value"""
+    return {cell.gt_adr(): cell.gt_val() for cell in prg.cells if cell.toks[1].type == 2 and not cell.is_empty()}
+
+
+def gt_state(prg):
+    return {"accu": prg.accu, "pc": prg.pc, "steps": prg.steps, "memory": gt_memory(prg)}
+
+
+def check_state(state, expected):
+    """Return a description of every difference between the final state of a program and its expected state"""
+    mismatches = []
+    for key in ("accu", "pc", "steps"):
+        if state[key] != expected[key]:
+            mismatches.append(f"{key} is {state[key]}, expected {expected[key]}")
+    for adr in sorted(set(state["memory"]) | set(expected["memory"])):
+        val = state["memory"].get(adr)
+        expected_val = expected["memory"].get(adr)
+        if val != expected_val:
+            mismatches.append(f"memory cell {adr} is {val}, expected {expected_val}")
+    return mismatches
+
+
+def run_program(prg_str, expected, repeat):
+    """Execute prg_str repeat times and return its final state, the differences to expected and the median runtime"""
+    prgs = [emu.Program(prg_str) for i in range(repeat)]  # parsed beforehand so that only the execution is timed
+    times = []
+    for prg in prgs:
+        start = time.perf_counter()
+        prg.execute()
+        times.append(time.perf_counter() - start)
+    state = gt_state(prgs[0])
+    return state, check_state(state, expected), statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m program.source.Corpus",
+                                     description="Execute the reference programs, check their final states and report "
+                                                 "their throughput.")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per program; the median is reported")
+    parser.add_argument("--program", action="append", help="only run this program (can be given several times)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    
+    hl.startup()
+    corpus = gt_corpus()
+    names = args.program or list(corpus)
+    results = {}
+    failed = False
+    for name in names:
+        if name not in corpus:
+            print(f"Unknown program '{name}', choose from: {', '.join(corpus)}")
+            return 2
+        entry = corpus[name]
+        state, mismatches, seconds = run_program(entry["program"], entry["expected"], args.repeat)
+        steps_per_s = state["steps"] / seconds if seconds else 0
+        results[name] = {"steps": state["steps"], "seconds": seconds, "steps_per_s": steps_per_s,
+                         "mismatches": mismatches}
+        verdict = "ok" if not mismatches else "FAILED"
+        print(f"  {entry['name']:<40} {state['steps']:8} steps {steps_per_s:12,.0f} steps/s  {verdict}")
+        for mismatch in mismatches:
+            print(f"      {mismatch}")
+        failed = failed or bool(mismatches)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 import os
+import time
 import ctypes
 import traceback
+import collections
 import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.filedialog as fd
@@ -9,6 +11,8 @@ from program.source import Emulator as emu
 from program.source import Widgets as wdg
 from program.source import Subwindows as sub
 from program.source import PackHandler as pck
+from program.source import Profiler as prf
+from program.source import ProgramCache as pcc
 
 
 #          Copyright Blyfh https://github.com/Blyfh
@@ -40,28 +44,32 @@ ph: pck.ProfileHandler
 lh: pck.LangHandler
 eh: pck.ErrorHandler
 sh: pck.SpriteHandler
+PERF_HISTORY_LEN = 100  # runs kept for the performance window in developer mode
 
 
-def startup(profile_dir, root_dir, dev_mode=False):
+def startup(profile_dir, root_dir, dev_mode=False, startup_profile=None):
     global ph
     global lh
     global eh
     global sh
-    ph = pck.ProfileHandler(profile_dir)
-    lh = pck.LangHandler(ph.language())
-    eh = pck.ErrorHandler()
-    sh = pck.SpriteHandler(ph.theme())
-    emu.startup(profile_handler=ph, error_handler=eh)
-    sub.startup(profile_handler=ph, language_handler=lh, sprite_handler=sh, emulator=emu)
-    if dev_mode:  # overwrite profile if dev_mode is activated by startup
-        ph.save_profile_data("dev_mode", dev_mode)
-    ed = Editor(root_dir)
+    with prf.startup_profiler.stage("pack loading"):
+        pck.ph.set_cache_dir(os.path.join(profile_dir, "cache"))  # compiled .dict packs to speed up the next startup
+        ph = pck.ProfileHandler(profile_dir)
+        lh = pck.LangHandler(ph.language())
+        eh = pck.ErrorHandler()
+        sh = pck.SpriteHandler(ph.theme())
+        emu.startup(profile_handler=ph, error_handler=eh)
+        sub.startup(profile_handler=ph, language_handler=lh, sprite_handler=sh, emulator=emu)
+        if dev_mode and not ph.dev_mode():  # overwrite profile if dev_mode is activated by startup
+            ph.save_profile_data("dev_mode", dev_mode)
+    ed = Editor(root_dir, startup_profile)
 
 
 class Editor:
     
-    def __init__(self, root_dir):
+    def __init__(self, root_dir, startup_profile=None):
         self.root_dir = root_dir
+        self.startup_profile = startup_profile
         self.dev_mode = ph.dev_mode()
         self.init_inp = ""
         self.dirty_flag = False
@@ -70,12 +78,26 @@ class Editor:
         self.file_types = ((lh.file_mng("AsmFiles"), "*.asm"),
                            (lh.file_mng("TxtFiles"), "*.txt"))
         self.emu = emu.Emulator()
+        self.perf_history = collections.deque(maxlen=PERF_HISTORY_LEN)  # newest run last
         self.action_on_closing_unsaved_prg = ph.closing_unsaved()
-        self.build_gui()
+        with prf.startup_profiler.stage("widget construction"):
+            self.build_gui()
         if self.dev_mode:  # special startup for developers
             pass
+        if self.startup_profile:
+            # idle callbacks can run before the window is mapped, so the first paint is taken from its <Map> event
+            self.root.bind("<Map>", self.on_first_paint, add="+")
         self.root.mainloop()
     
+    def on_first_paint(self, event):
+        if event.widget is not self.root or prf.startup_profiler.gt_mark("first paint") is not None:
+            return  # bindings of the root also get the events of its children
+        self.root.update_idletasks()  # draw the widgets of the mapped window before taking the time
+        prf.startup_profiler.mark("first paint")
+        print(prf.startup_profiler.report())
+        if self.startup_profile == "quit":
+            self.root.destroy()
+    
     def report_callback_exception(self, exc, val, tb):  # exc = exception obj, val = error message, tb = traceback obj
         if self.dev_mode:
             traceback.print_exception(val)
@@ -117,10 +139,12 @@ class Editor:
         self.title_font    = ("DejaVu Sans", 15, "bold")
         self.subtitle_font = ("DejaVu Sans", 13)
         self.set_theme(theme=self.active_theme)
-        self.options_SUB = sub.Options(    editor=self)
-        self.shortcuts_SUB = sub.Shortcuts(editor=self)
-        self.assembly_SUB  = sub.Assembly( editor=self)
-        self.about_SUB     = sub.About(    editor=self)
+        # subwindows are only constructed when they get opened for the first time
+        self.options_SUB   = None
+        self.shortcuts_SUB = None
+        self.assembly_SUB  = None
+        self.about_SUB     = None
+        self.performance_SUB = None
         self.root.minsize(*lh.gui("minsize"))
         self.root.config(bg=self.theme_base_bg)
         self.root.title(lh.gui("title"))
@@ -136,6 +160,7 @@ class Editor:
         self.style.configure("text.TFrame",           background=self.theme_text_bg)
         self.style.configure("TLabel",                background=self.theme_text_bg,           foreground=self.theme_text_fg)
         self.style.configure("img.TLabel",            background=self.theme_base_bg)  # for gui.Button that inherits from ttk.Label
+        self.style.configure("perf.TLabel",           background=self.theme_base_bg,           foreground=self.theme_base_fg, font=("TkDefaultFont", 8))
         self.style.configure("info_title.TLabel",     background=self.theme_highlight_base_bg, foreground=self.theme_highlight_text_fg, anchor="center")
         self.style.configure("info_value.TLabel",     background=self.theme_highlight_text_bg, foreground=self.theme_highlight_text_fg, anchor="center", font=self.gt_code_font())
         self.style.configure("subtitle.TLabel",       background=self.theme_text_bg,           foreground=self.theme_text_fg, font=self.subtitle_font)
@@ -153,15 +178,15 @@ class Editor:
         self.file_MNU.add_command(label=lh.gui("Reload"),  command=self.reload_file)
         self.file_MNU.add_command(label=lh.gui("Save"),    command=self.save_file)
         self.file_MNU.add_command(label=lh.gui("SaveAs"),  command=self.save_file_as)
-        self.file_MNU.add_command(label=lh.gui("Options"), command=self.options_SUB.open)
+        self.file_MNU.add_command(label=lh.gui("Options"), command=lambda: self.open_subwindow("options_SUB"))
         self.file_MNU.add_command(label=lh.gui("Exit"),    command=self.destroy)
         self.menubar.add_cascade(label=lh.gui("File"), menu=self.file_MNU, underline=0)
         
         self.help_MNU = tk.Menu(self.menubar, tearoff=False)
-        self.help_MNU.add_command(label=lh.gui("Assembly"),  command=self.assembly_SUB.open)
-        self.help_MNU.add_command(label=lh.gui("Shortcuts"), command=self.shortcuts_SUB.open)
+        self.help_MNU.add_command(label=lh.gui("Assembly"),  command=lambda: self.open_subwindow("assembly_SUB"))
+        self.help_MNU.add_command(label=lh.gui("Shortcuts"), command=lambda: self.open_subwindow("shortcuts_SUB"))
         self.help_MNU.add_command(label=lh.gui("DemoPrg"),   command=self.open_demo_prg)
-        self.help_MNU.add_command(label=lh.gui("About"),     command=self.about_SUB.open)
+        self.help_MNU.add_command(label=lh.gui("About"),     command=lambda: self.open_subwindow("about_SUB"))
         self.menubar.add_cascade(label=lh.gui("Help"), menu=self.help_MNU, underline = 0)
         
         self.taskbar_FRM = ttk.Frame(self.root)
@@ -229,6 +254,12 @@ class Editor:
         self.prgc_title_LBL.pack(side="top",    fill="x")
         self.prgc_value_LBL.pack(side="bottom", fill="x")
         
+        # timings of the last run, only shown in developer mode
+        self.perf_LBL = ttk.Label(self.taskbar_FRM, style="perf.TLabel", cursor="hand2", justify="right")
+        self.perf_LBL.bind("<Button-1>", lambda event: self.open_subwindow("performance_SUB"))
+        self.perf_TIP = wdg.Tooltip(self.perf_LBL, text=lh.gui("PerfTip"))
+        self.update_perf_overlay()
+        
         # events
         
         self.root.bind(sequence="<F5>",               func=lambda event: self.run_all())
@@ -253,6 +284,18 @@ class Editor:
         
         self.root.protocol(name="WM_DELETE_WINDOW", func=self.destroy)  # when clicking close button of the window
     
+    def open_subwindow(self, subwindow_attr):
+        subwindow = getattr(self, subwindow_attr)
+        if subwindow is None:
+            subwindow_classes = {"options_SUB":   sub.Options,
+                                 "shortcuts_SUB": sub.Shortcuts,
+                                 "assembly_SUB":  sub.Assembly,
+                                 "about_SUB":     sub.About,
+                                 "performance_SUB": sub.Performance}
+            subwindow = subwindow_classes[subwindow_attr](editor=self)
+            setattr(self, subwindow_attr, subwindow)
+        subwindow.open()
+    
     def gt_code_font(self):
         return ph.code_font()
     
@@ -269,6 +312,10 @@ class Editor:
             self.theme_highlight_base_bg = "#BBBBFF"
             self.theme_highlight_text_bg = "#CCCCFF"
             self.theme_highlight_text_fg = "#000000"
+            self.theme_address_color = "#777777"
+            self.theme_command_color = "#0033B3"
+            self.theme_value_color   = "#1750EB"
+            self.theme_operand_color = "#871094"
         elif theme == "dark":
             sh.set_theme(theme="dark")
             self.theme_base_bg = "#222222"
@@ -281,6 +328,10 @@ class Editor:
             self.theme_highlight_base_bg = "#EEEEEE"
             self.theme_highlight_text_bg = "#DDDDDD"
             self.theme_highlight_text_fg = "#000000"
+            self.theme_address_color = "#999999"
+            self.theme_command_color = "#CC7832"
+            self.theme_value_color   = "#6897BB"
+            self.theme_operand_color = "#9876AA"
     
     def update_code_font(self):
         code_font = self.gt_code_font()
@@ -290,7 +341,8 @@ class Editor:
         self.ireg_opr_LBL  .config(font=code_font)
         self.accu_value_LBL.config(font=code_font)
         self.prgc_value_LBL.config(font=code_font)
-        self.assembly_SUB.set_code_font()
+        if self.assembly_SUB:
+            self.assembly_SUB.set_code_font()
     
     def update_incr_decr_tooltips(self):
         option = self.chng_opt_OMN.current_option()  # either "adr", "adr_opr", "opr"
@@ -307,6 +359,7 @@ class Editor:
     def destroy(self):
         if not self.dirty_flag or self.dev_mode or self.can_close_unsaved_prg():
             self.root.destroy()
+            ph.flush()  # the write-behind thread is a daemon and would be stopped mid-write on exit
     
     def can_close_unsaved_prg(self):  # returns if it is okay to continue
         if self.action_on_closing_unsaved_prg == "ask":
@@ -331,13 +384,49 @@ class Editor:
                 self.root.title(self.root.title()[1:])
     
     def run(self, execute_all):
-        inp = self.inp_CDB.gt_input()
-        out = self.emu.gt_out(inp, execute_all)
-        self.prgc_value_LBL.config(text=out[1])
-        self.accu_value_LBL.config(text=out[2])
-        self.ireg_cmd_LBL  .config(text=out[3][0])
-        self.ireg_opr_LBL  .config(text=out[3][1])
-        self.out_CDB.display_output(*out[0])
+        if self.inp_CDB.is_loading():  # the program isn't complete yet
+            return
+        if self.dev_mode:
+            prf.run_profiler.start()
+        try:
+            inp = self.inp_CDB.gt_input()
+            out = self.emu.gt_out(inp, execute_all, prg_generation=self.inp_CDB.edit_generation)
+            with prf.run_profiler.stage("labels"):
+                self.prgc_value_LBL.config(text=out[1])
+                self.accu_value_LBL.config(text=out[2])
+                self.ireg_cmd_LBL  .config(text=out[3][0])
+                self.ireg_opr_LBL  .config(text=out[3][1])
+            with prf.run_profiler.stage("render"):
+                self.out_CDB.display_output(*out[0])
+                if self.dev_mode:
+                    self.root.update_idletasks()  # include the redraw that would otherwise happen after returning
+        finally:
+            if prf.run_profiler.enabled:
+                prf.run_profiler.stop()
+                self.add_perf_record(execute_all)
+    
+    def add_perf_record(self, execute_all):
+        execute = prf.run_profiler.gt_seconds("execute")
+        steps = self.emu.last_steps
+        record = {"time":    time.strftime("%H:%M:%S"),
+                  "mode":    "all" if execute_all else "step",
+                  "parse":   prf.run_profiler.gt_seconds("parse"),
+                  "execute": execute,
+                  "steps":   steps,
+                  "steps_per_s": steps / execute if execute else None,
+                  "output":  prf.run_profiler.gt_seconds("output"),
+                  "render":  prf.run_profiler.gt_seconds("render"),
+                  "labels":  prf.run_profiler.gt_seconds("labels")}
+        self.perf_history.append(record)
+        self.perf_LBL.config(text=lh.gui("PerfOverlay").format(**prf.format_run_record(record)))
+        if self.performance_SUB and self.performance_SUB.active:
+            self.performance_SUB.refresh()
+    
+    def update_perf_overlay(self):
+        if self.dev_mode:
+            self.perf_LBL.pack(side="right", padx=(5, 0))
+        else:
+            self.perf_LBL.pack_forget()
     
     def run_all(self):
         self.run(execute_all=True)
@@ -360,13 +449,41 @@ class Editor:
     
     def reload_file(self):
         if self.file_path:
-            with open(self.file_path, "r", encoding="utf-8") as file:
-                prg_str = file.read()
-            self.open_prg(prg_str=prg_str, win_title=f"{self.file_path} – {lh.gui('title')}")
+            size = os.path.getsize(self.file_path)
+            if size > self.inp_CDB.LOAD_CHUNK_CHARS:
+                # large files are streamed in from the event loop, so the window stays responsive while loading
+                if self.dirty_flag:
+                    if not self.can_close_unsaved_prg():
+                        return
+                self.set_dirty_flag(False)
+                self.root.title(f"{self.file_path} – {lh.gui('title')}")
+                file = open(self.file_path, "r", encoding="utf-8")
+                self.inp_CDB.load_file(file, size, on_done=self.on_file_loaded)
+            else:
+                with open(self.file_path, "r", encoding="utf-8") as file:
+                    prg_str = file.read()
+                if self.open_prg(prg_str=prg_str, win_title=f"{self.file_path} – {lh.gui('title')}"):
+                    self.load_compiled_prg()
+    
+    def on_file_loaded(self, prg_str):
+        self.init_inp = prg_str
+        self.set_dirty_flag(self.inp_CDB.is_dirty())
+        if not self.dirty_flag:
+            self.load_compiled_prg()
+    
+    def load_compiled_prg(self):
+        """Let the emulator use the compiled program cache of the opened file until the input gets edited"""
+        if pck.ph.cache_dir:
+            # nothing is read or parsed here, the emulator does it on the first run, so opening a file stays fast
+            compiled_file = pcc.CompiledFile(self.file_path, os.path.join(pck.ph.cache_dir, "programs"))
+            self.emu.st_compiled(self.inp_CDB.edit_generation, compiled_file)
     
     def save_file(self):
+        if self.inp_CDB.is_loading():  # would save only the part of the file that is already loaded
+            return
         if self.file_path:
             self.init_inp = self.inp_CDB.gt_input()
+            self.inp_CDB.mark_saved()
             with open(self.file_path, "w", encoding="utf-8") as file:
                 file.write(self.init_inp)
             self.set_dirty_flag(False)
@@ -374,6 +491,8 @@ class Editor:
             self.save_file_as()
     
     def save_file_as(self):
+        if self.inp_CDB.is_loading():
+            return
         file_path = fd.asksaveasfilename(title=lh.file_mng("SaveFile"), initialdir=self.last_dir,
                                          filetypes=self.file_types, defaultextension=".asm")
         if file_path:  # check for cancellation
@@ -384,12 +503,13 @@ class Editor:
     def open_prg(self, prg_str="", win_title=None):
         if self.dirty_flag:
             if not self.can_close_unsaved_prg():
-                return
+                return False
         self.inp_CDB.st_input(prg_str)
         self.init_inp = prg_str
+        self.inp_CDB.mark_saved()
         self.set_dirty_flag(False)
-        if not win_title:
-            self.root.title(lh.gui("title"))
+        self.root.title(win_title or lh.gui("title"))
+        return True
     
     def open_demo_prg(self):
         self.open_prg(lh.demo())
@@ -1,4 +1,11 @@
+import gc
+import os
+import re
+import mmap
 import string
+import threading
+import contextlib
+from program.source import Profiler as prf
 
 
 #          Copyright Blyfh https://github.com/Blyfh
@@ -9,9 +16,19 @@ import string
 
 CMDS = "STP", "ADD", "SUB", "MUL", "DIV", "LDA", "STA", "JMP", "JLE", "JZE", "JNZ"
 CMDS_no_val_opr = "STA", "JMP", "JLE", "JZE", "JNZ"
+OPR_KINDS = {None: "empty_opr", 0: "direct_opr", 1: "indirect_opr", 2: "absolute_opr"}  # by Operand.type
+# a token and the whitespaces after it, as split by split_cel_str()
+TOK_PATTERN = re.compile(f"[^{re.escape(string.whitespace)}]+[{re.escape(string.whitespace)}]*")
+PARSER_VERSION = 1  # increase whenever the result of parsing changes, so that compiled programs get rebuilt
+WORD_SIZES = 0, 8, 16, 32, 64  # bits of the ACC and memory values, 0 = unbounded
+OVERFLOW_MODES = "wrap", "saturate", "trap"
 MIN_ADR_LEN = 0
 MAX_JMPS = 0
 MAX_CELS = 0
+WORD_SIZE = 0
+OVERFLOW_MODE = "wrap"
+WORD_MIN = 0  # smallest and largest value of a signed word of WORD_SIZE bits
+WORD_MAX = 0
 
 
 def startup(profile_handler, error_handler):
@@ -22,13 +39,76 @@ def startup(profile_handler, error_handler):
     update_properties()
 
 
+def headless_startup(error_handler, min_adr_len, max_jmps, max_cels, word_size=0, overflow_mode="wrap"):
+    # used by tools that run without a profile
+    global eh
+    eh = error_handler
+    st_properties(min_adr_len, max_jmps, max_cels, word_size, overflow_mode)
+
+
 def update_properties():
+    st_properties(ph.min_adr_len(), ph.max_jmps(), ph.max_cels(), ph.word_size(), ph.overflow_mode())
+
+
+def st_properties(min_adr_len, max_jmps, max_cels, word_size=0, overflow_mode="wrap"):
     global MIN_ADR_LEN
     global MAX_JMPS
     global MAX_CELS
-    MIN_ADR_LEN = ph.min_adr_len()
-    MAX_JMPS = ph.max_jmps()
-    MAX_CELS = ph.max_cels()
+    global WORD_SIZE
+    global OVERFLOW_MODE
+    global WORD_MIN
+    global WORD_MAX
+    global fit_word
+    if word_size not in WORD_SIZES:
+        raise ValueError(f"Unsupported word size {word_size}, choose from {WORD_SIZES}.")
+    if overflow_mode not in OVERFLOW_MODES:
+        raise ValueError(f"Unsupported overflow mode '{overflow_mode}', choose from {OVERFLOW_MODES}.")
+    MIN_ADR_LEN = min_adr_len
+    MAX_JMPS = max_jmps
+    MAX_CELS = max_cels
+    WORD_SIZE = word_size
+    OVERFLOW_MODE = overflow_mode
+    if word_size:
+        WORD_MIN = -2 ** (word_size - 1)
+        WORD_MAX = 2 ** (word_size - 1) - 1
+        fit_word = globals()[f"fit_word_{overflow_mode}"]
+    else:
+        WORD_MIN = WORD_MAX = 0
+        fit_word = fit_word_unbounded
+
+
+# fit_word(val, adr) brings the result of an operation in memory cell adr into the range of a word, see st_properties()
+# bounded values stay small ints, so every step costs the same instead of growing with the number of digits
+# values are Python ints fitted after every operation instead of fixed-width machine integers (array, ctypes or NumPy
+# types): the cells and the ACC keep one representation for all word sizes and unbounded mode, and an operation on
+# Python ints is as fast as one on boxed fixed-width ints, which would also need their own overflow checks for trap
+
+def fit_word_unbounded(val, adr):
+    return val
+
+
+def fit_word_wrap(val, adr):  # two's complement, like the registers of a real CPU
+    if WORD_MIN <= val <= WORD_MAX:
+        return val
+    return (val - WORD_MIN) % (WORD_MAX - WORD_MIN + 1) + WORD_MIN
+
+
+def fit_word_saturate(val, adr):
+    if val < WORD_MIN:
+        return WORD_MIN
+    elif val > WORD_MAX:
+        return WORD_MAX
+    return val
+
+
+def fit_word_trap(val, adr):
+    if WORD_MIN <= val <= WORD_MAX:
+        return val
+    raise Exception(eh.error("WordOverflow", adr=adr, val=val, word_size=WORD_SIZE, word_min=WORD_MIN,
+                             word_max=WORD_MAX))
+
+
+fit_word = fit_word_unbounded
 
 
 def concatenate(str1, str2):  # used by Cell.gt_content() to add spaces between tokens if necessary
@@ -39,15 +119,144 @@ def concatenate(str1, str2):  # used by Cell.gt_content() to add spaces between
 
 
 def split_cell_at_comment(cel_cmt_str):  # used by Program.gt_cells() and Editor.change_text() to split cell and comment
-    i = 0
-    while i < len(cel_cmt_str) and cel_cmt_str[i] != ";":
-        i += 1
+    i = cel_cmt_str.find(";")
+    if i == -1:
+        i = len(cel_cmt_str)
     # move additional whitespaces after cell to comment (first whitespace is appended to cell)
-    while i > 1 and cel_cmt_str[i - 1] in string.whitespace and cel_cmt_str[i - 2] in string.whitespace:
-        i -= 1
+    i = min(i, len(cel_cmt_str[:i].rstrip(string.whitespace)) + 1)
     return cel_cmt_str[:i], cel_cmt_str[i:]
 
 
+def line_error(err_msg, line):
+    """Create an Assembly error that remembers the line of the program it was caused by"""
+    error = Exception(err_msg)
+    error.line = line  # used by the editor's live validation to mark the offending line
+    return error
+
+
+def tok_error(err, fallback_msg, **kwargs):  # used by Token.create_tok(), falls back to a plain message
+    try:
+        return Exception(eh.error(err, **kwargs))
+    except Exception:
+        return Exception(fallback_msg)
+
+
+def validate_prg(prg_str, is_cancelled=None):
+    """Return None if prg_str can be turned into a Program, else (line, error message) of the first error"""
+    try:
+        # runs in the background while the user types, pausing the GC would pause it for the editor as well
+        Program(prg_str, is_cancelled, pause_gc=False)
+    except ValidationCancelled:
+        raise
+    except Exception as error:
+        return getattr(error, "line", None), str(error)
+    return None
+
+
+def iter_lines(lines):
+    """Yield the lines of an iterable of line break terminated lines (e.g. a text file) like str.split("\\n") would"""
+    line = ""
+    for line in lines:
+        yield line[:-1] if line.endswith("\n") else line
+    if line.endswith("\n"):
+        yield ""
+
+
+def iter_mmap_lines(mm, encoding="utf-8"):  # used by parse_file(); encoding has to be ASCII compatible
+    line = b""
+    for line in iter(mm.readline, b""):
+        if line.endswith(b"\r\n"):
+            yield line[:-2].decode(encoding)
+        elif line.endswith(b"\n"):
+            yield line[:-1].decode(encoding)
+        else:
+            yield line.decode(encoding)
+    if line.endswith(b"\n"):
+        yield ""
+
+
+def parse_file(path, encoding="utf-8", is_cancelled=None):
+    """Return the Program of a file that is read through a memory map line by line instead of as a whole string"""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:  # empty files can't be mapped
+            return Program("", is_cancelled)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return Program(iter_mmap_lines(mm, encoding), is_cancelled)
+
+
+class ValidationCancelled(Exception):  # raised by Program.create_cells() if is_cancelled() becomes true
+    pass
+
+
+# the GC is switched off for the whole process, so overlapping gc_paused() blocks of several threads are counted and
+# only the last one to end turns it back on
+gc_pause_lock = threading.Lock()
+gc_pauses = 0
+gc_was_enabled = False
+
+
+@contextlib.contextmanager
+def gc_paused():  # creating many acyclic objects at once would trigger lots of pointless garbage collections
+    global gc_pauses
+    global gc_was_enabled
+    with gc_pause_lock:
+        if gc_pauses == 0:
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+        gc_pauses += 1
+    try:
+        yield
+    finally:
+        with gc_pause_lock:
+            gc_pauses -= 1
+            if gc_pauses == 0 and gc_was_enabled:
+                gc.enable()
+
+
+def compile_prg(prg):
+    """Return the parsed program as nested tuples for marshal, see ProgramCache.py; build_prg() reverses this"""
+    return prg.top_cmt, tuple(compile_cell(cell) for cell in prg.cells)
+
+
+def compile_cell(cell):
+    return cell.is_user_generated, cell.line, cell.cmt, tuple(compile_tok(tok) for tok in cell.toks)
+
+
+def compile_tok(tok):
+    if tok.type == 3:
+        tok_val = tok.tok.opr_str, tok.tok.cpos, tok.tok.type, tok.tok.opr
+    else:
+        tok_val = tok.tok
+    return tok.tok_str, tok.tpos, tok.cpos, tok.type, tok_val
+
+
+def build_prg(compiled_prg):
+    """Return a new Program from compile_prg() data without tokenizing and validating its cells again"""
+    prg = Program("")
+    prg.top_cmt, compiled_cells = compiled_prg
+    with gc_paused():
+        prg.cells = [build_cell(compiled_cell) for compiled_cell in compiled_cells]
+    return prg
+
+
+def build_cell(compiled_cell):
+    cell = Cell.__new__(Cell)
+    cell.is_user_generated, cell.line, cell.cmt, compiled_toks = compiled_cell
+    cell.toks = [build_tok(compiled_tok) for compiled_tok in compiled_toks]
+    return cell
+
+
+def build_tok(compiled_tok):
+    tok = Token.__new__(Token)
+    tok.tok_str, tok.tpos, tok.cpos, tok.type, tok_val = compiled_tok
+    if tok.type == 3:
+        tok.tok = Operand.__new__(Operand)
+        tok.tok.opr_str, tok.tok.cpos, tok.tok.type, tok.tok.opr = tok_val
+    else:
+        tok.tok = tok_val
+    return tok
+
+
 def add_leading_zeros(adr_str, offset=0):
     adr_str_stripped = adr_str.strip()
     leading_zeros = (MIN_ADR_LEN - len(adr_str_stripped) + offset) * "0"
@@ -55,87 +264,241 @@ def add_leading_zeros(adr_str, offset=0):
     return whitespace_wrapping[0] + leading_zeros + adr_str_stripped + whitespace_wrapping[1]
 
 
+def lex_line(line):
+    """Return (start, end, kind) spans of all tokens and the comment in a line without raising on invalid tokens"""
+    # uses the same splitting and classification as Program.create_cells() so that the editor's syntax highlighting
+    # always agrees with the emulator
+    cel_str, cmt = split_cell_at_comment(line)
+    spans = []
+    if cel_str.strip():
+        tok_strs = split_cel_str(cel_str)
+        kinds = [classify_tok(tok_strs[tpos].strip(), tpos)[0] or "invalid" for tpos in range(len(tok_strs))]
+        error_key = gt_cell_error_key(kinds[1], tok_strs[1].strip().upper(), kinds[2])
+        if error_key == "MissingOpr":
+            kinds[1] = "invalid"
+        elif error_key:
+            kinds[2] = "invalid"
+        pos = 0
+        for tpos in range(len(tok_strs)):
+            tok = tok_strs[tpos].strip()
+            if tok:
+                start = pos + tok_strs[tpos].index(tok)
+                spans.append((start, start + len(tok), kinds[tpos]))
+            pos += len(tok_strs[tpos])
+    if ";" in cmt:
+        spans.append((len(cel_str) + cmt.index(";"), len(line), "comment"))
+    return spans
+
+
+def split_cel_str(cel_str_unstripped):  # used by Cell.__init__(), lex_line() and the editor
+    cel_str = cel_str_unstripped.lstrip()  # remove whitespaces before address
+    lwrapping = cel_str_unstripped[:len(cel_str_unstripped) - len(cel_str)]
+    # each token keeps the whitespaces up to the next token
+    tok_strs = TOK_PATTERN.findall(cel_str) or [""]
+    while len(tok_strs) < 3:
+        tok_strs.append("")
+    tok_strs[0] = lwrapping + tok_strs[0]  # add whitespaces before address
+    return tok_strs
+
+
+def classify_tok(tok, tpos):
+    """Return (kind, value, error key) of a stripped token at position tpos of a cell
+    
+    This is the grammar of the tokens for Token.create_tok(), Operand.create_opr() and lex_line(). Invalid tokens have
+    the kind None and the key of their error in errors.dict."""
+    if tpos == 0:
+        tok_int = gt_int(tok)
+        if tok_int is None:
+            return None, None, "AdrTokNotInt"
+        elif tok_int < 0:
+            return None, None, "AdrTokIsNegative"
+        return "address", tok_int, None
+    elif tpos == 1:
+        tok_int = gt_int(tok)
+        if tok_int is not None:
+            return "value", tok_int, None
+        elif tok == "":
+            return "value", 0, None  # empty cell
+        elif tok.upper() in CMDS:
+            return "command", tok.upper(), None
+        return None, None, "TokNotValOrCmd"
+    elif tpos == 2:
+        if tok == "":
+            return "empty_opr", None, None
+        elif tok[0] == "#":
+            tok_int = gt_int(tok[1:])
+            return ("absolute_opr", tok_int, None) if tok_int is not None else (None, None, "ValOprNotInt")
+        elif tok[0] == "(" and tok[-1] == ")":
+            tok_int = gt_int(tok[1:-1])
+            if tok_int is None:
+                return None, None, "IndOprNotInt"
+            return ("indirect_opr", tok_int, None) if tok_int >= 0 else (None, None, "IndOprIsNegative")
+        tok_int = gt_int(tok)
+        if tok_int is None:
+            return None, None, "UnknownOpr"
+        return ("direct_opr", tok_int, None) if tok_int >= 0 else (None, None, "DirOprIsNegative")
+    return None, None, "MaxCelLength"  # more than 3 tokens
+
+
+def gt_cell_error_key(val_kind, cmd, opr_kind):
+    """Return the key of the error of a cell whose tokens are valid on their own but not together, else None"""
+    if opr_kind == "empty_opr":
+        if val_kind == "command" and cmd != "STP":
+            return "MissingOpr"
+    elif val_kind == "value":
+        return "ValCellOpr"
+    elif cmd == "STP":
+        return "StpCellOpr"
+    elif opr_kind == "absolute_opr" and cmd in CMDS_no_val_opr:
+        return "CmdHasValOpr"
+    return None
+
+
+def gt_int(tok):
+    try:
+        return int(tok)
+    except ValueError:
+        return None
+
+
 class Emulator:
     
     def __init__(self):
         self.prg_str = ""
+        self.prg_generation = None  # edit generation of the editor's input that prg_str belongs to
         self.prg = None
         self.is_new_prg = True
         self.last_execute_all_flag = None
+        self.last_steps = 0  # commands executed by the last call of gt_out()
+        self.compiled = None  # (prg_generation, ProgramCache.CompiledFile) of the file opened in the editor
     
-    def gt_out(self, prg_str, execute_all_flag=True):
-        if self.prg_str != prg_str or execute_all_flag != self.last_execute_all_flag or self.prg and self.prg.halted:
+    def gt_out(self, prg_str, execute_all_flag=True, prg_generation=None):
+        if prg_generation is not None and self.prg_generation is not None:
+            # the editor's edit generation only changes with the input, so the strings don't have to be compared
+            prg_changed = prg_generation != self.prg_generation
+        else:
+            prg_changed = self.prg_str != prg_str
+        self.prg_generation = prg_generation
+        if prg_changed or execute_all_flag != self.last_execute_all_flag or self.prg and self.prg.halted:
             # program or execution type changed or last execution step reached STP/eh.error.NeverStopped
             self.is_new_prg = True  # program reset
             self.last_execute_all_flag = execute_all_flag
+        self.last_steps = 0
         if self.is_new_prg:
-            self.create_prg(prg_str)
+            with prf.run_profiler.stage("parse"):
+                self.create_prg(prg_str, prg_generation)
+            if prg_generation is not None:
+                self.prg_str = None  # the generation identifies the program, so no copy of the source has to be kept
         if len(self.prg.cells) == 0:
             # program is empty (can include comments though)
             return self.prg.gt_prg(), "", "", ("", "")
-        self.prg.execute(execute_all_flag)
-        return self.prg.gt_prg(execute_all_flag), str(self.prg.pc), str(self.prg.accu), self.prg.gt_ireg()
-    
-    def create_prg(self, prg_str):
+        # a step that starts a new execution doesn't execute a command yet, see Program.execute()
+        steps_before = self.prg.steps if not execute_all_flag and self.prg.executing else 0
+        try:
+            with prf.run_profiler.stage("execute"):
+                self.prg.execute(execute_all_flag)
+        finally:
+            self.last_steps = self.prg.steps - steps_before
+        with prf.run_profiler.stage("output"):
+            return self.prg.gt_prg(execute_all_flag), str(self.prg.pc), str(self.prg.accu), self.prg.gt_ireg()
+    
+    def create_prg(self, prg_str, prg_generation=None):
         self.prg_str = prg_str
         self.prg = None  # for Editor.format_error() detecting failed program initialisation
-        self.prg = Program(prg_str)
+        compiled_file = None
+        if self.compiled and prg_generation is not None and self.compiled[0] == prg_generation:
+            compiled_file = self.compiled[1]
+        compiled_prg = compiled_file.gt_compiled_prg(prg_str) if compiled_file else None
+        if compiled_prg is not None:
+            self.prg = build_prg(compiled_prg)
+        else:
+            self.prg = Program(prg_str)
+            if compiled_file:  # compiled before the first execution changes the cells
+                compiled_file.st_compiled_prg(prg_str, compile_prg(self.prg))
         self.is_new_prg = False
+    
+    def st_compiled(self, prg_generation, compiled_file):
+        """Use the compiled program of compiled_file instead of parsing the input while it is at prg_generation"""
+        self.compiled = (prg_generation, compiled_file) if compiled_file is not None else None
 
 
 class Program:
     
-    def __init__(self, prg_str):
+    def __init__(self, prg, is_cancelled=None, pause_gc=True):
         self.jmps_to_adr = {}  # each element logs how many times the pointer jumped to its cell
         self.top_cmt = ""
-        self.cells = self.create_cells(prg_str)
+        if pause_gc:
+            with gc_paused():  # the collections would get slower with every cell, making parsing superlinear
+                self.cells = self.create_cells(prg, is_cancelled)
+        else:
+            self.cells = self.create_cells(prg, is_cancelled)
         self.accu = 0
         self.pc = 0
+        self.steps = 0  # number of executed commands since the execution started
+        self.stored_adrs = set()  # addresses that STA wrote to, used by SpecRunner.py to reset the program
         self.executing = False
         self.halted = False
     
     def __str__(self):
-        prg_str = self.top_cmt
-        for cell in self.cells:
-            prg_str += str(cell)
-        return prg_str
-    
-    def create_cells(self, prg_str):
-        if not prg_str:
-            return []
-        lines = prg_str.split("\n")
+        return self.top_cmt + "".join([str(cell) for cell in self.cells])
+    
+    def create_cells(self, prg, is_cancelled=None):
+        """prg is the program string or an iterable of its lines without line breaks, see iter_lines()"""
+        if isinstance(prg, str):
+            if not prg:
+                return []
+            lines = prg.split("\n")
+        else:
+            lines = prg  # consumed one line at a time, so only the cells stay in memory
         cells = []
-        for i in range(len(lines)):
-            line = split_cell_at_comment(lines[i])
+        # comments are collected in lists and joined once, "+=" on them gets quadratic for long runs of comment lines
+        top_cmt_parts = []
+        cmt_parts = []  # lines below the last cell that belong to its comment
+        for i, line_str in enumerate(lines):
+            if is_cancelled and i % 256 == 0 and is_cancelled():
+                raise ValidationCancelled()
+            line = split_cell_at_comment(line_str)
             if line[0].strip() == "":  # no cell in current line
                 if len(cells) > 0:  # not first line; some empty line in between
-                    cells[-1].cmt += "\n" + line[0] + line[1]
+                    cmt_parts.append("\n" + line[0] + line[1])
                 elif i == 0:
-                    self.top_cmt = line[0] + line[1]
+                    top_cmt_parts.append(line[0] + line[1])
                     if line[1]:
-                        self.top_cmt += "\n"
+                        top_cmt_parts.append("\n")
                 else:
-                    self.top_cmt += line[0] + line[1] + "\n"
+                    top_cmt_parts.append(line[0] + line[1] + "\n")
             else:
-                cell = Cell(line[0], line[1])
+                try:
+                    cell = Cell(line[0], line[1])
+                except Exception as error:
+                    error.line = i
+                    raise
+                cell.line = i
+                if cmt_parts:
+                    cells[-1].cmt += "".join(cmt_parts)
+                    cmt_parts.clear()
                 cells.append(cell)
+        if cmt_parts:
+            cells[-1].cmt += "".join(cmt_parts)
+        self.top_cmt = "".join(top_cmt_parts)
         return self.fill_empty_cells(cells)
     
     def gt_prg(self, execute_all_flag=False):
         """Return a tuple with the executing cell in the middle to colorcode it in the output widget"""
         if not execute_all_flag and len(self.cells) > 0:
-            prg_str1 = self.top_cmt
+            prg_strs1 = [self.top_cmt]
             executed_cell = None
-            prg_str2 = ""
+            prg_strs2 = []
             for cell in self.cells:
                 if cell.gt_adr() < self.pc:
-                    prg_str1 += str(cell)
+                    prg_strs1.append(str(cell))
                 elif cell.gt_adr() > self.pc:
-                    prg_str2 += str(cell)
+                    prg_strs2.append(str(cell))
                 else:
                     executed_cell = cell
             if executed_cell:  # current cell exists
-                return prg_str1, executed_cell.gt_content(), executed_cell.gt_comment() + "\n" + prg_str2
+                prg_str2 = executed_cell.gt_comment() + "\n" + "".join(prg_strs2)
+                return "".join(prg_strs1), executed_cell.gt_content(), prg_str2
             else:
                 self.executing = False
                 self.halted = True
@@ -160,12 +523,14 @@ class Program:
         self.halted = False
         self.accu = 0
         self.pc = 0
+        self.steps = 0
         self.jmps_to_adr.clear()
     
     def execute_cell(self):
         if self.pc < len(self.cells):
             self.execute_command(self.pc)
             self.pc += 1
+            self.steps += 1
         else:
             self.executing = False
             self.halted = True
@@ -177,29 +542,28 @@ class Program:
         getattr(self, f"cmd_{cmd}")(opr)
     
     def fill_empty_cells(self, cells):
-        i = 0
-        while i < len(cells):
-            adr = cells[i].gt_adr()
+        # builds a new list instead of inserting into cells, which would move all following cells for every gap
+        filled_cells = []
+        for cell in cells:
+            adr = cell.gt_adr()
             if adr > MAX_CELS - 1:
-                raise Exception(eh.error("MaxPrgLength", max_adrs=MAX_CELS, adrs=adr + 1))
-            if i == adr:
-                pass
-            elif i < adr:
-                cell = Cell(f"{i} ", is_user_generated=False)
-                cells.insert(i, cell)
-            elif str(cells[adr].toks[1]) == "":
-                raise Exception(
-                    eh.error("AdrsNotChronological",
-                             # add_leading_zeros() because error message literally refers to address, not memory cell
-                             small_adr=add_leading_zeros(str(adr)),
-                             big_adr=add_leading_zeros(str(cells[i - 1].gt_adr()))))
-            else:
-                raise Exception(
-                    eh.error("AdrNotUnique",
-                             # add_leading_zeros() because error message literally refers to address, not memory cell
-                             adr=add_leading_zeros(str(adr))))
-            i += 1
-        return cells
+                raise line_error(eh.error("MaxPrgLength", max_adrs=MAX_CELS, adrs=adr + 1), cell.line)
+            if adr < len(filled_cells):
+                if str(filled_cells[adr].toks[1]) == "":
+                    raise line_error(
+                        eh.error("AdrsNotChronological",
+                                 # add_leading_zeros() because error message literally refers to address, not memory cell
+                                 small_adr=add_leading_zeros(str(adr)),
+                                 big_adr=add_leading_zeros(str(filled_cells[-1].gt_adr()))), cell.line)
+                else:
+                    raise line_error(
+                        eh.error("AdrNotUnique",
+                                 # add_leading_zeros() because error message literally refers to address, not memory cell
+                                 adr=add_leading_zeros(str(adr))), cell.line)
+            while len(filled_cells) < adr:
+                filled_cells.append(Cell(f"{len(filled_cells)} ", is_user_generated=False))
+            filled_cells.append(cell)
+        return filled_cells
     
     def gt_ireg(self):
         cmd = self.gt_cel(self.pc).gt_cmd()
@@ -244,26 +608,27 @@ class Program:
         self.halted = True
     
     def cmd_ADD(self, opr):
-        self.accu += self.gt_final_value(opr)
+        self.accu = fit_word(self.accu + self.gt_final_value(opr), self.pc)
     
     def cmd_SUB(self, opr):
-        self.accu -= self.gt_final_value(opr)
+        self.accu = fit_word(self.accu - self.gt_final_value(opr), self.pc)
     
     def cmd_MUL(self, opr):
-        self.accu *= self.gt_final_value(opr)
+        self.accu = fit_word(self.accu * self.gt_final_value(opr), self.pc)
     
     def cmd_DIV(self, opr):
         divisor = self.gt_final_value(opr)
         if divisor == 0:
             raise Exception(eh.error("DivByZero", adr=self.pc))
-        self.accu //= divisor  # integer division
+        self.accu = fit_word(self.accu // divisor, self.pc)  # integer division
     
     def cmd_LDA(self, opr):
-        self.accu = self.gt_final_value(opr)
+        self.accu = fit_word(self.gt_final_value(opr), self.pc)  # values in the program may exceed the word size
     
     def cmd_STA(self, opr):
         adr = self.gt_final_adr(opr)
         self.gt_cel(adr).edit(self.accu)
+        self.stored_adrs.add(adr)
     
     def cmd_JMP(self, opr):
         adr = self.gt_final_adr(opr)
@@ -280,7 +645,7 @@ class Program:
     def cmd_JZE(self, opr):
         if self.accu == 0:
             self.cmd_JMP(opr)
-
+    
     def cmd_JNZ(self, opr):
         if self.accu != 0:
             self.cmd_JMP(opr)
@@ -290,9 +655,10 @@ class Cell:
     
     def __init__(self, cel_str="", cmt="", is_user_generated=True):
         self.is_user_generated = is_user_generated
+        self.line = None  # line of the program string, None for automatically generated cells
         self.cmt = cmt
         self.toks = []
-        tok_strs = self.split_cel_str(cel_str)
+        tok_strs = split_cel_str(cel_str)
         self.create_toks(tok_strs)
     
     def __str__(self):
@@ -309,41 +675,17 @@ class Cell:
             else:
                 tok = Token(tok_strs[tpos], tpos, self.gt_adr())
                 if tok.type == 3:
-                    # token is operand
-                    if tok.tok.type is None:
-                        # empty operand
-                        if self.toks[1].type == 1 and self.toks[1].tok != "STP":  # command lacks operand
-                            raise Exception(eh.error("MissingOpr", cmd=self.gt_cmd(), adr=self.gt_adr()))
-                    else:
-                        if self.toks[1].type == 2:
-                            # operand after a value
-                            raise Exception(eh.error("ValCellOpr", opr=tok.tok, adr=self.gt_adr()))
-                        elif tpos == 2 and self.toks[1].tok == "STP":
-                            # operand after STP
-                            raise Exception(eh.error("StpCellOpr", opr=tok.tok, adr=self.gt_adr()))
-                        elif tok.tok.type == 2 and self.gt_cmd() in CMDS_no_val_opr:
-                            # operand with absolute value for an unsupported command (e.g. STA #5)
-                            raise Exception(eh.error("CmdHasValOpr", opr_str=tok.tok_str, adr=self.gt_adr()))
+                    # token is operand, check that it fits to the command or value before it
+                    val_kind = "command" if self.toks[1].type == 1 else "value"
+                    error_key = gt_cell_error_key(val_kind, self.toks[1].tok, OPR_KINDS[tok.tok.type])
+                    if error_key == "MissingOpr":
+                        raise Exception(eh.error("MissingOpr", cmd=self.gt_cmd(), adr=self.gt_adr()))
+                    elif error_key == "CmdHasValOpr":
+                        raise Exception(eh.error("CmdHasValOpr", opr_str=tok.tok_str.strip(), adr=self.gt_adr()))
+                    elif error_key:
+                        raise Exception(eh.error(error_key, opr=tok.tok, adr=self.gt_adr()))
                 self.toks.append(tok)
     
-    def split_cel_str(self: None, cel_str_unstripped):  # is static but belongs here topically
-        cel_str = cel_str_unstripped.lstrip()  # remove whitespaces before address
-        lwrapping = cel_str_unstripped.split(cel_str)[0]
-        tok_strs = []
-        last_split_pos = 0
-        for i in range(len(cel_str)):
-            if cel_str[i] in string.whitespace and i < len(cel_str) - 1 and cel_str[i + 1] not in string.whitespace:
-                # last whitespace between tokens
-                tok_str = cel_str[last_split_pos:i + 1]
-                tok_strs.append(tok_str)
-                last_split_pos = i + 1
-        tok_str = cel_str[last_split_pos:]
-        tok_strs.append(tok_str)
-        while len(tok_strs) < 3:
-            tok_strs.append("")
-        tok_strs[0] = lwrapping + tok_strs[0]  # add whitespaces before address
-        return tok_strs
-    
     def gt_content(self):  # cell content without comment
         cel_str = ""
         for tok in self.toks:
@@ -389,74 +731,29 @@ class Token:
     
     def create_tok(self, tok_str):
         tok = tok_str.rstrip()
-        if self.tpos == 0:
-            # address
-            try:
-                tok_int = int(tok.lstrip())  # allow whitespaces before address
-            except Exception:
-                # try to obtain a formatted error, but fall back to a plain Exception message
-                try:
-                    err = eh.error("AdrTokNotInt", tok=tok)
-                except Exception:
-                    raise Exception(f"Address token is not an integer: {tok!r}")
-                else:
-                    if isinstance(err, Exception):
-                        raise err
-                    else:
-                        raise Exception(err)
-            if tok_int >= 0:
-                self.type = 0
-                self.cpos = tok_int
-                return tok_int
-            else:
-                try:
-                    err = eh.error("AdrTokIsNegative", tok=tok)
-                except Exception:
-                    raise Exception(f"Address token is negative: {tok!r}")
-                else:
-                    if isinstance(err, Exception):
-                        raise err
-                    else:
-                        raise Exception(err)
-        elif self.tpos == 1:
-            # value or command
-            try:
-                tok_int = int(tok)
-            except ValueError:
-                if tok == "":
-                    self.type = 2
-                    return 0
-                elif tok.upper() in CMDS:
-                    self.type = 1
-                    return tok.upper()
-                else:
-                    # attempt to get a formatted error from eh.error, but fall back to a plain message
-                    try:
-                        err = eh.error("TokNotValOrCmd", adr=self.cpos, tok=tok)
-                    except Exception:
-                        raise Exception(f"Expected a command or a value in memory cell {self.cpos}, not {tok!r}")
-                    else:
-                        if isinstance(err, Exception):
-                            raise err
-                        else:
-                            raise Exception(err)
-            else:
-                self.type = 2
-                return tok_int
-        elif self.tpos == 2:
+        if self.tpos == 2:
             # operand
             self.type = 3
             return Operand(tok, self.cpos)
+        tok = tok.lstrip()  # allow whitespaces before address, messages quote the bare token like for the others
+        kind, tok_val, error_key = classify_tok(tok, self.tpos)
+        if error_key == "AdrTokNotInt":
+            raise tok_error(error_key, f"Address token is not an integer: {tok!r}", tok=tok)
+        elif error_key == "AdrTokIsNegative":
+            raise tok_error(error_key, f"Address token is negative: {tok!r}", tok=tok)
+        elif error_key == "TokNotValOrCmd":
+            raise tok_error(error_key, f"Expected a command or a value in memory cell {self.cpos}, not {tok!r}",
+                            adr=self.cpos, tok=tok)
+        elif error_key == "MaxCelLength":
+            raise tok_error(error_key, f"Maximum cell length exceeded at address {self.cpos}", adr=self.cpos)
+        if kind == "address":
+            self.type = 0
+            self.cpos = tok_val
+        elif kind == "command":
+            self.type = 1
         else:
-            try:
-                err = eh.error("MaxCelLength", adr = self.cpos)
-            except Exception:
-                raise Exception(f"Maximum cell length exceeded at address {self.cpos}")
-            else:
-                if isinstance(err, Exception):
-                    raise err
-                else:
-                    raise Exception(err)
+            self.type = 2
+        return tok_val
     
     def add_leading_zeros(self):
         if self.type == 0:
@@ -539,32 +836,9 @@ class Operand:
             return f"#{self.opr}"
     
     def create_opr(self, opr_str):
-        if len(opr_str) > 0:
-            if opr_str[0] == "#":
-                try:
-                    opr_int = int(opr_str[1:])
-                except:
-                    raise Exception(eh.error("ValOprNotInt", adr = self.cpos, opr_str = opr_str))
-                self.type = 2
-                return opr_int
-            elif opr_str[0] == "(" and opr_str[-1] == ")":
-                try:
-                    opr_int = int(opr_str[1:-1])
-                except:
-                    raise Exception(eh.error("IndOprNotInt", adr = self.cpos, opr_str = opr_str))
-                if opr_int >= 0:
-                    self.type = 1
-                    return opr_int
-                else:
-                    raise Exception(eh.error("IndOprIsNegative", adr = self.cpos, opr_str = opr_str))
-            else:
-                try:
-                    opr_int = int(opr_str)
-                except:
-                    raise Exception(eh.error("UnknownOpr", adr = self.cpos, opr_str = opr_str))
-                if opr_int >= 0:
-                    self.type = 0
-                    return opr_int
-                else:
-                    raise Exception(eh.error("DirOprIsNegative", adr = self.cpos, opr_str = opr_str))
+        kind, opr_int, error_key = classify_tok(opr_str, 2)
+        if error_key:
+            raise Exception(eh.error(error_key, adr = self.cpos, opr_str = opr_str))
+        self.type = {"direct_opr": 0, "indirect_opr": 1, "absolute_opr": 2}.get(kind)
+        return opr_int
 
@@ -0,0 +1,135 @@
+import random
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+SCRATCH_CELS = 8  # data cells the generated loop bodies read from and store to
+
+
+def gen_program(cel_count=200, loop_depth=2, loop_count=3, store_density=0.3, comment_ratio=0.2, seed=0):
+    """
+    Return a valid, terminating program string with about cel_count memory cells.
+    
+    The program consists of loop_depth nested countdown loops that run loop_count times each, a loop body of ADD, SUB,
+    LDA and STA commands on scratch cells that fills up the remaining memory cells and the data cells behind STP.
+    store_density is the share of STA commands in the loop body, comment_ratio the share of lines with a comment.
+    The innermost loop start is jumped to loop_count ** loop_depth times, which has to stay below the maximum
+    iteration depth of the emulator.
+    """
+    rng = random.Random(seed)
+    # each loop needs 2 commands to initialize its counter and 4 commands to count down and jump back
+    body_len = max(1, cel_count - 6 * loop_depth - 1 - loop_depth - SCRATCH_CELS)
+    # cells as (label, content) with symbolic operands "@label" that get resolved below
+    cells = []
+    for level in range(loop_depth):
+        cells.append((None, f"LDA #{loop_count}"))
+        cells.append((None, f"STA @cnt{level}"))
+        cells.append((f"loop{level}", None))  # marks the next cell as the loop start
+    for i in range(body_len):
+        scratch = f"@tmp{rng.randrange(SCRATCH_CELS)}"
+        if rng.random() < store_density:
+            cells.append((None, f"STA {scratch}"))
+        else:
+            cells.append((None, rng.choice((f"ADD {scratch}", f"SUB {scratch}", f"LDA {scratch}", "ADD #1",
+                                            "SUB #1"))))
+    for level in reversed(range(loop_depth)):
+        cells.append((None, f"LDA @cnt{level}"))
+        cells.append((None, "SUB #1"))
+        cells.append((None, f"STA @cnt{level}"))
+        cells.append((None, f"JNZ @loop{level}"))
+    cells.append((None, "STP"))
+    for level in range(loop_depth):
+        cells.append((f"cnt{level}", None))
+        cells.append((None, "0"))
+    for i in range(SCRATCH_CELS):
+        cells.append((f"tmp{i}", None))
+        cells.append((None, str(rng.randrange(-9, 10))))
+    
+    labels = {}
+    contents = []
+    for label, content in cells:
+        if label:
+            labels[label] = len(contents)
+        else:
+            contents.append(content)
+    lines = []
+    for adr, content in enumerate(contents):
+        tok_strs = content.split(" ")
+        if len(tok_strs) == 2 and tok_strs[1].startswith("@"):
+            content = f"{tok_strs[0]} {labels[tok_strs[1][1:]]:02}"
+        line = f"{adr:02} {content}"
+        if rng.random() < comment_ratio:
+            line += f" ; {rng.choice(('counter', 'loop body', 'scratch value', 'generated'))}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def gt_expected_steps(loop_depth=2, loop_count=3, cel_count=200):
+    """Return the number of executed commands of gen_program() with the same arguments"""
+    body_len = max(1, cel_count - 6 * loop_depth - 1 - loop_depth - SCRATCH_CELS)
+    steps = body_len
+    for level in range(loop_depth):
+        steps = loop_count * (steps + 4) + 2
+    return steps + 1  # STP
+
+
+# worst-case inputs for Stress.py, each one grows linearly with n
+
+def gen_address_gaps(n):
+    """n values at every other address, so that an empty cell has to be created between each two of them"""
+    return "\n".join(["00 STP"] + [f"{2 * i:02} {i}" for i in range(1, n + 1)])
+
+
+def gen_huge_gap(n):
+    """a single value n addresses behind STP"""
+    return f"00 STP\n{n} 1"
+
+
+def gen_top_comments(n):
+    """n comment-only lines that all end up in Program.top_cmt"""
+    return "\n".join([f"; comment line {i}" for i in range(n)] + ["00 STP"])
+
+
+def gen_cell_comments(n):
+    """n comment-only and empty lines below a cell that all end up in its Cell.cmt"""
+    lines = ["00 LDA #1 ; comment"]
+    for i in range(n):
+        lines.append(f"   ; comment line {i}" if i % 2 else "")
+    lines.append("01 STP")
+    return "\n".join(lines)
+
+
+def gen_whitespace_runs(n):
+    """cells whose tokens are separated by n whitespaces each"""
+    spaces = " " * n
+    tabs = "\t" * n
+    return "\n".join((f"00{spaces}LDA{spaces}#1{spaces}; spaces", f"01{tabs}STA{tabs}03{tabs}; tabs",
+                      f"{spaces}02 STP{spaces}"))
+
+
+def gen_indirect_chain(n):
+    """a program that follows a chain of n pointer cells by indirect addressing"""
+    base = 12
+    lines = [f"00 LDA #{n} ; follow the chain n times",
+             "01 STA 10",
+             "02 LDA (11) ; pointer = (pointer)",
+             "03 STA 11",
+             "04 LDA 10",
+             "05 SUB #1",
+             "06 STA 10",
+             "07 JNZ 02",
+             "08 STP",
+             "10 0  ; counter",
+             f"11 {base} ; pointer"]
+    for i in range(n):
+        lines.append(f"{base + i} {base + (i + 1) % n}")
+    return "\n".join(lines)
+
+
+def gen_max_jumps(n):
+    """a loop that jumps n - 1 times to the same memory cell"""
+    return f"00 LDA #{n}\n01 SUB #1\n02 JNZ 01\n03 STP"
@@ -0,0 +1,365 @@
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+import traceback
+import statistics
+import collections
+import multiprocessing
+import concurrent.futures
+import http.server
+
+from program.source import Headless as hl
+from program.source import Emulator as emu
+from program.source import SpecRunner as spr
+from program.source import ResultCache as rc
+
+try:
+    import resource
+except ImportError:  # not available on Windows, where jobs are only stopped by the timeout
+    resource = None
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# usage: python -m program.source.GradingServer [--port PORT] [--workers N] [--timeout S] [--cpu-seconds S]
+#                                               [--memory-mib M] [--max-queue N] [--cache FILE] [--cache-mib M]
+#
+# POST /grade  {"program": "<source>", "spec": {<test spec, see SpecRunner.py>}}  ->  {"status": ..., "suite": ...}
+#              JSON only has string keys, the addresses in "inputs" and "memory" are converted to ints
+# GET  /stats  queue depth, latency, throughput, timeouts, restarted workers and hits of the result cache
+MAX_REQUEST_BYTES = 8 * 2 ** 20
+LATENCY_HISTORY_LEN = 1000
+THROUGHPUT_WINDOW = 60  # seconds
+
+
+def gt_vm_bytes():  # size of the address space of this process, 0 if unknown
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def limit_job(cpu_seconds, memory_bytes):
+    """Allow the next job of this worker cpu_seconds of CPU time and memory_bytes more memory"""
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_limit = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+    # SIGXCPU at the soft limit ends the worker, the hard limits stay as they are so that they can be raised again
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+    resource.setrlimit(resource.RLIMIT_AS, (gt_vm_bytes() + memory_bytes, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+
+def unlimit_job():
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (resource.getrlimit(resource.RLIMIT_AS)[1],) * 2)
+
+
+def gt_spec(data):
+    """Return the test spec of a request with the addresses converted to ints, see SpecRunner.check_spec()"""
+    spec = data.get("spec")
+    if not isinstance(spec, dict) or not isinstance(spec.get("cases"), dict):
+        raise spr.SpecError("The request needs a test spec with a dict of cases under 'spec'.")
+    spec = dict(spec, cases=dict(spec["cases"]))
+    for name, case in spec["cases"].items():
+        if isinstance(case, dict):
+            case = spec["cases"][name] = dict(case)
+            for key in ("inputs", "memory"):
+                if isinstance(case.get(key), dict):
+                    try:
+                        case[key] = {int(adr): val for adr, val in case[key].items()}
+                    except ValueError:
+                        raise spr.SpecError(f"'{key}' of case '{name}' has to map addresses to values.")
+    return spr.check_spec(spec, "request")
+
+
+def worker_main(conn, cpu_seconds, memory_bytes, max_jmps, max_cels):
+    """Run jobs from conn until it closes; PackHandler and the emulator are set up once for all jobs"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the server shuts the workers down
+    hl.startup(max_jmps=max_jmps, max_cels=max_cels)
+    start_vm_bytes = gt_vm_bytes()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        limit_job(cpu_seconds, memory_bytes)
+        result = None
+        try:
+            result = {"status": "done", "suite": spr.run_spec(job["spec"], lambda: emu.Program(job["program"]),
+                                                              "<submission>", "<request>")}
+        except MemoryError:  # the traceback still holds the memory, so the result is built after leaving it
+            pass
+        unlimit_job()
+        if result is None:
+            result = {"status": "memory_limit", "error": f"Job used more than {memory_bytes // 2 ** 20} MiB."}
+        # a worker that kept a lot of memory from its jobs is replaced before it slows down the next ones
+        result["recycle"] = result["status"] != "done" or gt_vm_bytes() > start_vm_bytes + memory_bytes // 2
+        conn.send(result)
+        if result["recycle"]:
+            break
+
+
+class Worker:
+    """A pre-forked worker process and the pipe to it"""
+    
+    def __init__(self, context, limits):
+        self.context = context
+        self.limits = limits
+        self.start()
+    
+    def start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=worker_main, args=(child_conn, *self.limits), daemon=True)
+        self.process.start()
+        child_conn.close()
+    
+    def restart(self):
+        self.stop()
+        self.start()
+    
+    def stop(self):
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+    
+    def run(self, job, timeout):
+        """Return the result of job, or an error result if the worker didn't answer within timeout or died"""
+        self.conn.send(job)
+        if not self.conn.poll(timeout):
+            return {"status": "timeout", "error": f"Job didn't finish within {timeout} seconds."}
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join()
+            if self.process.exitcode == -getattr(signal, "SIGXCPU", 0):
+                return {"status": "cpu_limit", "error": f"Job used more than {self.limits[0]} seconds of CPU time."}
+            return {"status": "crashed", "error": f"Worker exited with code {self.process.exitcode}."}
+
+
+class Stats:
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.counts = collections.Counter()  # submitted, rejected, restarts and the statuses of finished jobs
+        self.in_progress = 0
+        self.latencies = collections.deque(maxlen=LATENCY_HISTORY_LEN)  # seconds from submission to result
+        self.finish_times = collections.deque()
+    
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+    
+    def st_in_progress(self, change):
+        with self.lock:
+            self.in_progress += change
+    
+    def add_finished(self, status, latency):
+        now = time.monotonic()
+        with self.lock:
+            self.counts[status] += 1
+            self.latencies.append(latency)
+            self.finish_times.append(now)
+            while self.finish_times[0] < now - THROUGHPUT_WINDOW:
+                self.finish_times.popleft()
+    
+    def gt_stats(self, queue_depth, workers):
+        now = time.monotonic()
+        with self.lock:
+            latencies = sorted(self.latencies)
+            window = min(THROUGHPUT_WINDOW, now - self.start_time)
+            recent = sum(finish_time >= now - THROUGHPUT_WINDOW for finish_time in self.finish_times)
+            return {
+                "workers":     workers,
+                "queue_depth": queue_depth,
+                "in_progress": self.in_progress,
+                "counts":      dict(self.counts),
+                "latency_ms":  {"p50": statistics.median(latencies) * 1000 if latencies else None,
+                                "p95": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+                                "max": latencies[-1] * 1000 if latencies else None},
+                # jobs per second over the last THROUGHPUT_WINDOW seconds
+                "throughput_per_s": recent / window if window > 0 else 0
+            }
+
+
+class GradingPool:
+    """Runs jobs on pre-forked workers; every worker has a thread that feeds it jobs from the shared queue"""
+    
+    def __init__(self, worker_count, timeout, cpu_seconds, memory_bytes, max_queue, max_jmps=None, max_cels=None,
+                 cache=None):
+        # the workers use the same limits, so the keys of the result cache are built from these properties
+        hl.startup(max_jmps=max_jmps, max_cels=max_cels)
+        # replaced workers are started while the threads of the server run and might hold locks, so they are forked
+        # from a single-threaded fork server that has the modules already imported; other platforms spawn them
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["program.source.GradingServer"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self.cache = cache
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.stats = Stats()
+        self.workers = [Worker(context, (cpu_seconds, memory_bytes, max_jmps, max_cels)) for i in range(worker_count)]
+        for worker in self.workers:
+            threading.Thread(target=self.feed_worker, args=(worker,), daemon=True).start()
+    
+    def submit(self, job):
+        """Return a future of the result of job; raises queue.Full if too many jobs are waiting"""
+        future = concurrent.futures.Future()
+        key = None
+        if self.cache:
+            key = rc.gt_key(job["program"], job["spec"])
+            suite = self.cache.get(key)
+            if suite is not None:  # resubmitted program, its results are returned without running it
+                self.stats.count("cached")
+                future.set_result({"status": "done", "suite": suite, "cached": True})
+                return future
+        try:
+            self.jobs.put_nowait((job, key, future, time.monotonic()))
+        except queue.Full:
+            self.stats.count("rejected")
+            raise
+        self.stats.count("submitted")
+        return future
+    
+    def feed_worker(self, worker):
+        while True:
+            job, key, future, submit_time = self.jobs.get()
+            self.stats.st_in_progress(1)
+            result = {"status": "crashed", "error": "The grading server failed to run the job."}
+            try:
+                try:
+                    result = worker.run(job, self.timeout)
+                except (OSError, ValueError) as error:  # broken pipe to a worker that died between jobs
+                    result = {"status": "crashed", "error": str(error)}
+                if result.pop("recycle", True):
+                    worker.restart()  # other jobs never run on a worker that hit a limit
+                    self.stats.count("restarts")
+                if key and result["status"] == "done":  # jobs that hit a limit might pass when the server is less busy
+                    self.cache.put(key, result["suite"])
+            except Exception:  # e.g. a worker that can't be started again, the answer of the worker is kept
+                traceback.print_exc()
+            finally:  # the request waits for the future, so it has to get a result in any case
+                self.stats.st_in_progress(-1)
+                self.stats.add_finished(result["status"], time.monotonic() - submit_time)
+                future.set_result(result)
+    
+    def gt_stats(self):
+        stats = self.stats.gt_stats(self.jobs.qsize(), len(self.workers))
+        if self.cache:
+            stats["cache"] = self.cache.gt_stats()
+        return stats
+    
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+class GradingHandler(http.server.BaseHTTPRequestHandler):
+    
+    pool = None  # set by serve()
+    
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_json(200, self.pool.gt_stats())
+        else:
+            self.send_json(404, {"error": "Unknown path, use POST /grade or GET /stats."})
+    
+    def do_POST(self):
+        if self.path != "/grade":
+            self.send_json(404, {"error": "Unknown path, use POST /grade or GET /stats."})
+            return
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.send_json(411, {"error": "The request needs a Content-Length header."})
+            return
+        if not (length.isascii() and length.isdigit()):  # int() would also take signs, spaces and underscores
+            self.send_json(400, {"error": "The Content-Length header has to be a non-negative integer."})
+            return
+        length = int(length)
+        if length > MAX_REQUEST_BYTES:
+            self.send_json(413, {"error": f"Requests can only have up to {MAX_REQUEST_BYTES} bytes."})
+            return
+        try:
+            data = json.loads(self.rfile.read(length))
+            if not isinstance(data, dict) or not isinstance(data.get("program"), str):
+                raise spr.SpecError("The request needs the source of the program as a string under 'program'.")
+            job = {"program": data["program"], "spec": gt_spec(data)}
+        except (ValueError, spr.SpecError) as error:
+            self.send_json(400, {"error": str(error)})
+            return
+        try:
+            future = self.pool.submit(job)
+        except queue.Full:
+            self.send_json(503, {"error": "Too many jobs are waiting, try again later."})
+            return
+        self.send_json(200, future.result())
+    
+    def send_json(self, code, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):  # every request would be logged to stderr otherwise
+        pass
+
+
+def serve(host, port, pool):
+    GradingHandler.pool = pool
+    server = http.server.ThreadingHTTPServer((host, port), GradingHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m program.source.GradingServer",
+                                     description="Grade programs against test specs over HTTP with a pool of "
+                                                 "pre-forked workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8642)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="number of worker processes")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds until a job is stopped")
+    parser.add_argument("--cpu-seconds", type=int, default=5, help="CPU time of a job")
+    parser.add_argument("--memory-mib", type=int, default=512, help="memory a job may use")
+    parser.add_argument("--max-queue", type=int, default=1000, help="jobs that may wait before requests are refused")
+    parser.add_argument("--max-jmps", type=int, help="maximum iteration depth (default: from the default profile)")
+    parser.add_argument("--max-cels", type=int, help="maximum program length (default: from the default profile)")
+    parser.add_argument("--cache", help="SQLite file that keeps the results of programs for resubmissions")
+    parser.add_argument("--cache-mib", type=int, default=rc.DEFAULT_MAX_BYTES // 2 ** 20,
+                        help="size of the result cache before the least recently used results are dropped")
+    args = parser.parse_args(argv)
+    
+    cache = rc.ResultCache(args.cache, args.cache_mib * 2 ** 20) if args.cache else None
+    pool = GradingPool(args.workers, args.timeout, args.cpu_seconds, args.memory_mib * 2 ** 20, args.max_queue,
+                       args.max_jmps, args.max_cels, cache)
+    server = serve(args.host, args.port, pool)
+    print(f"Grading on http://{args.host}:{server.server_port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.stop()
+        if cache:
+            cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
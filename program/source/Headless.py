@@ -0,0 +1,19 @@
+from program.source import Emulator as emu
+from program.source import PackHandler as pck
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+def startup(min_adr_len=None, max_jmps=None, max_cels=None, word_size=None, overflow_mode=None):
+    """Prepare the emulator for running without the editor; limits that aren't given are taken from the default profile"""
+    default_profile_data = pck.ph.gt_pack_data("default_profile", f"{pck.program_dir}/resources")
+    emu.headless_startup(error_handler=pck.ErrorHandler(),
+                         min_adr_len=default_profile_data["min_adr_len"] if min_adr_len is None else min_adr_len,
+                         max_jmps=default_profile_data["max_jmps"] if max_jmps is None else max_jmps,
+                         max_cels=default_profile_data["max_cels"] if max_cels is None else max_cels,
+                         word_size=default_profile_data["word_size"] if word_size is None else word_size,
+                         overflow_mode=default_profile_data["overflow_mode"] if overflow_mode is None else overflow_mode)
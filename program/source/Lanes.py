@@ -0,0 +1,405 @@
+import sys
+import time
+import random
+import argparse
+
+from program.source import Corpus as crp
+from program.source import Headless as hl
+from program.source import Emulator as emu
+
+try:
+    import numpy as np
+except ImportError:  # without NumPy every input set is run on its own by the usual emulator
+    np = None
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# usage: python -m program.source.Lanes [--program NAME] [--lanes N] [--input ADR ...] [--min VAL] [--max VAL]
+#                                        [--seed S]
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+MIN_GROUP_LANES = 24  # smaller groups of lanes run faster on the usual emulator than on arrays
+SPARE_CELS = 256  # cells behind the program that lanes can use before they are retired
+
+
+def apply_inputs(prg, inputs):
+    """Overwrite the memory cells of prg with the values of inputs ({address: value})"""
+    for adr, val in inputs.items():
+        if adr < 0:  # would count from the end of the cells
+            raise Exception(emu.eh.error("AdrTokIsNegative", tok=adr))
+        prg.gt_cel(adr).edit(val)
+
+
+class StepLimitExceeded(Exception):  # raised by execute() when a program needs more steps than allowed
+    pass
+
+
+def execute(prg, max_steps=None):
+    """Execute prg from the start like Program.execute() but stop with an error after max_steps commands"""
+    prg.start_executing()
+    continue_executing(prg, max_steps)
+
+
+def continue_executing(prg, max_steps=None):
+    while prg.executing:
+        if max_steps is not None and prg.steps >= max_steps:
+            prg.executing = False
+            raise StepLimitExceeded(emu.eh.error("MaxSteps", max_steps=max_steps))
+        prg.execute_cell()
+
+
+def gt_state(prg, error=None):
+    state = crp.gt_state(prg)
+    state["error"] = None if error is None else str(error)
+    return state
+
+
+def run_single(compiled_prg, inputs, max_steps=None):
+    """Execute a fresh copy of the program with inputs and return its final state, including the error if it crashed"""
+    prg = emu.build_prg(compiled_prg)
+    try:
+        apply_inputs(prg, inputs)
+        execute(prg, max_steps)
+    except MemoryError:  # see SpecRunner.run_case()
+        raise
+    except Exception as error:
+        return gt_state(prg, error)
+    return gt_state(prg)
+
+
+def continue_single(prg, max_steps=None):
+    """Execute the remaining commands of a program whose execution was started and return its final state"""
+    try:
+        continue_executing(prg, max_steps)
+    except MemoryError:
+        raise
+    except Exception as error:
+        return gt_state(prg, error)
+    return gt_state(prg)
+
+
+def run_lanes(prg, inputs_list, max_steps_list=None):
+    """
+    Execute prg once for every input set of inputs_list and return the final state of each run in the same order.
+    
+    max_steps_list optionally gives the step limit of each run (None for no limit), see execute().
+    
+    All runs share one pass over the program with a NumPy array lane per input set. A lane that is about to do
+    anything the arrays can't represent exactly (errors, values beyond 64 bits, cells far behind the program) or that
+    diverged from the other lanes is retired: the usual emulator continues it from its current state. So every state
+    and error message is the same as if the input sets were run one by one.
+    """
+    compiled_prg = emu.compile_prg(prg)
+    max_steps_list = max_steps_list or [None] * len(inputs_list)
+    if np is None or not inputs_list:
+        return [run_single(compiled_prg, inputs, max_steps) for inputs, max_steps in zip(inputs_list, max_steps_list)]
+    engine = LaneEngine(prg, inputs_list, max_steps_list)
+    engine.execute()
+    states = []
+    for lane, inputs in enumerate(inputs_list):
+        if engine.replay[lane]:
+            states.append(run_single(compiled_prg, inputs, max_steps_list[lane]))
+        elif engine.retired[lane]:
+            states.append(continue_single(engine.gt_prg(lane, compiled_prg), max_steps_list[lane]))
+        else:
+            states.append(engine.gt_state(lane))
+    return states
+
+
+class LaneEngine:
+    
+    def __init__(self, prg, inputs_list, max_steps_list):
+        lane_count = len(inputs_list)
+        self.prg_len = len(prg.cells)
+        input_len = max([adr + 1 for inputs in inputs_list for adr in inputs], default=0)
+        # the memory also holds the cells that lanes create behind the program
+        rows = min(emu.MAX_CELS, max(self.prg_len + SPARE_CELS, 2 * self.prg_len, input_len))
+        self.cmds = [None] * rows  # (command, operand type, operand) of every command cell
+        self.is_val = np.ones(rows, dtype=bool)  # cells behind the program are empty value cells
+        self.is_user_val = np.zeros(rows, dtype=bool)  # value cells of the program that aren't empty
+        self.mem = np.zeros((rows, lane_count), dtype=np.int64)
+        self.is_written = np.zeros((rows, lane_count), dtype=bool)  # cells that were edited by inputs or STA
+        self.jmps_to_adr = np.zeros((rows, lane_count), dtype=np.int32)
+        self.cel_count = np.full(lane_count, self.prg_len, dtype=np.int64)  # len(Program.cells) of each lane
+        self.accu = np.zeros(lane_count, dtype=np.int64)
+        self.pc = np.zeros(lane_count, dtype=np.int64)
+        self.steps = np.zeros(lane_count, dtype=np.int64)
+        # lanes that reach their step limit are retired, so that the usual emulator raises the error
+        self.has_step_limits = any(max_steps is not None for max_steps in max_steps_list)
+        self.max_steps = np.array([INT64_MAX if max_steps is None else max_steps for max_steps in max_steps_list],
+                                  dtype=np.int64)
+        self.running = np.ones(lane_count, dtype=bool)
+        self.retired = np.zeros(lane_count, dtype=bool)  # lanes that the usual emulator continues
+        self.replay = np.zeros(lane_count, dtype=bool)  # lanes that the usual emulator runs from the start
+        self.is_native_wrap = emu.WORD_SIZE == 64 and emu.OVERFLOW_MODE == "wrap"  # int64 arithmetic wraps the same
+        self.read_prg(prg)
+        self.read_inputs(inputs_list)
+    
+    def read_prg(self, prg):
+        for adr, cell in enumerate(prg.cells):
+            tok = cell.toks[1]
+            self.is_val[adr] = tok.type == 2
+            if tok.type == 2:
+                if not INT64_MIN <= tok.tok <= INT64_MAX:
+                    self.replay_all()
+                    return
+                self.is_user_val[adr] = not cell.is_empty()
+                self.mem[adr] = tok.tok
+            elif tok.type == 1:
+                opr = cell.toks[2].tok
+                if opr.type == 2 and not INT64_MIN <= opr.opr <= INT64_MAX:
+                    self.replay_all()
+                    return
+                self.cmds[adr] = tok.tok, opr.type, opr.opr
+    
+    def read_inputs(self, inputs_list):
+        for lane, inputs in enumerate(inputs_list):
+            for adr, val in inputs.items():
+                # the usual emulator reports invalid inputs
+                if (type(val) is not int or not 0 <= adr < len(self.is_val) or not self.is_val[adr]
+                        or not INT64_MIN <= val <= INT64_MAX):
+                    self.running[lane] = False
+                    self.replay[lane] = True
+                    break
+                self.mem[adr, lane] = val
+                self.is_written[adr, lane] = True
+                self.cel_count[lane] = max(self.cel_count[lane], adr + 1)
+    
+    def replay_all(self):
+        self.running[:] = False
+        self.replay[:] = True
+    
+    def gt_state(self, lane):
+        """Return the final state of a lane in the format of Corpus.gt_state()"""
+        adrs = np.flatnonzero(self.is_user_val | self.is_written[:, lane])
+        return {"accu": int(self.accu[lane]), "pc": int(self.pc[lane]), "steps": int(self.steps[lane]),
+                "memory": dict(zip(adrs.tolist(), self.mem[adrs, lane].tolist())), "error": None}
+    
+    def gt_prg(self, lane, compiled_prg):
+        """Return a copy of the program in the state of a retired lane, ready to execute its next command"""
+        prg = emu.build_prg(compiled_prg)
+        if self.cel_count[lane] > len(prg.cells):
+            prg.gt_cel(int(self.cel_count[lane]) - 1)  # creates the missing cells
+        for adr in np.flatnonzero(self.is_written[:, lane]).tolist():
+            prg.cells[adr].edit(int(self.mem[adr, lane]))
+        prg.accu = int(self.accu[lane])
+        prg.pc = int(self.pc[lane])
+        prg.steps = int(self.steps[lane])
+        adrs = np.flatnonzero(self.jmps_to_adr[:, lane])
+        prg.jmps_to_adr = dict(zip(adrs.tolist(), self.jmps_to_adr[adrs, lane].tolist()))
+        prg.executing = True
+        return prg
+    
+    def retire(self, lanes):
+        self.running[lanes] = False
+        self.retired[lanes] = True
+    
+    def retire_invalid(self, lanes, is_valid):
+        """Retire the lanes that aren't valid and return the others"""
+        if is_valid.all():
+            return lanes
+        self.retire(lanes[~is_valid])
+        return lanes[is_valid]
+    
+    def execute(self):
+        with np.errstate(over="ignore"):  # overflows are detected and retired, see the cmd_ methods
+            lanes = np.flatnonzero(self.running)
+            while lanes.size:
+                pcs = self.pc[lanes]
+                pc = pcs[0]
+                if (pcs == pc).all():
+                    group = lanes
+                else:
+                    # lanes diverged at conditional jumps; only the largest group of lanes at the same command steps,
+                    # the others wait until it reaches their command and they continue together
+                    pc = np.bincount(pcs).argmax()
+                    group = lanes[pcs == pc]
+                if group.size < MIN_GROUP_LANES:
+                    self.retire(lanes)
+                    break
+                if self.execute_cell(int(pc), group).size < group.size:  # some lanes stopped or got retired
+                    lanes = np.flatnonzero(self.running)
+    
+    def execute_cell(self, adr, lanes):
+        """Execute the command at adr for lanes and return the lanes that are still running"""
+        if adr >= self.prg_len or self.cmds[adr] is None:  # the usual emulator raises the error
+            self.retire(lanes)
+            return lanes[:0]
+        if self.has_step_limits:
+            lanes = self.retire_invalid(lanes, self.steps[lanes] < self.max_steps[lanes])
+        cmd, opr_type, opr = self.cmds[adr]
+        lanes = getattr(self, f"cmd_{cmd}")(lanes, opr_type, opr)  # lanes that didn't get retired
+        self.pc[lanes] += 1
+        self.steps[lanes] += 1
+        return lanes[:0] if cmd == "STP" else lanes
+    
+    def is_val_adr(self, adr):
+        return adr < len(self.is_val) and self.is_val[adr]
+    
+    def extend(self, lanes, adrs):
+        """Count the cells that Program.gt_cel() creates when lanes access adrs (an address or one per lane)"""
+        if np.any(adrs >= self.prg_len):  # cells of the program exist already
+            self.cel_count[lanes] = np.maximum(self.cel_count[lanes], adrs + 1)
+    
+    def gt_final_value(self, lanes, opr_type, opr):
+        """Return the values of the operand for every lane and which of them are valid, see Program.gt_final_value()"""
+        if opr_type == 2:  # value (e.g. 00 LDA #5)
+            return np.full(lanes.size, opr, dtype=np.int64), np.ones(lanes.size, dtype=bool)
+        if not self.is_val_adr(opr):
+            return self.accu[lanes], np.zeros(lanes.size, dtype=bool)
+        if opr_type == 0:  # normal address
+            self.extend(lanes, opr)
+            return self.mem[opr, lanes], np.ones(lanes.size, dtype=bool)
+        adrs, is_valid = self.gt_final_adr(lanes, opr_type, opr)  # nested address (e.g. 00 LDA (5))
+        self.extend(lanes[is_valid], adrs[is_valid])
+        return self.mem[adrs, lanes], is_valid & self.is_val[adrs]
+    
+    def gt_final_adr(self, lanes, opr_type, opr):
+        """Return the addresses of the operand for every lane and which of them are inside of the memory"""
+        if opr_type == 0:  # normal address
+            adrs = np.full(lanes.size, opr, dtype=np.int64)
+        elif opr_type == 1 and self.is_val_adr(opr):  # nested address (e.g. 00 LDA (5))
+            self.extend(lanes, opr)
+            adrs = self.mem[opr, lanes]
+        else:
+            return np.zeros(lanes.size, dtype=np.int64), np.zeros(lanes.size, dtype=bool)
+        is_valid = (adrs >= 0) & (adrs < len(self.is_val))
+        return np.where(is_valid, adrs, 0), is_valid  # invalid addresses are replaced to keep indexing possible
+    
+    def st_accu(self, lanes, vals, is_valid):
+        """Fit vals into a word like Emulator.fit_word(), store them into the ACC and return the lanes that went on"""
+        if emu.WORD_SIZE and not self.is_native_wrap:
+            if emu.OVERFLOW_MODE == "wrap":
+                # two's complement; the low bits are right even if vals - WORD_MIN overflows
+                vals = ((vals - emu.WORD_MIN) & (2 ** emu.WORD_SIZE - 1)) + emu.WORD_MIN
+            elif emu.OVERFLOW_MODE == "saturate":
+                vals = np.clip(vals, emu.WORD_MIN, emu.WORD_MAX)
+            else:
+                is_valid = is_valid & (vals >= emu.WORD_MIN) & (vals <= emu.WORD_MAX)
+        self.accu[lanes[is_valid]] = vals[is_valid]
+        return self.retire_invalid(lanes, is_valid)
+    
+    def cmd_STP(self, lanes, opr_type, opr):
+        self.pc[lanes] -= 1
+        self.running[lanes] = False
+        return lanes
+    
+    def cmd_ADD(self, lanes, opr_type, opr):
+        vals, is_valid = self.gt_final_value(lanes, opr_type, opr)
+        accu = self.accu[lanes]
+        result = accu + vals
+        if not self.is_native_wrap:  # the sign flips if an addition overflows
+            is_valid &= ((accu ^ result) & (vals ^ result)) >= 0
+        return self.st_accu(lanes, result, is_valid)
+    
+    def cmd_SUB(self, lanes, opr_type, opr):
+        vals, is_valid = self.gt_final_value(lanes, opr_type, opr)
+        accu = self.accu[lanes]
+        result = accu - vals
+        if not self.is_native_wrap:
+            is_valid &= ((accu ^ vals) & (accu ^ result)) >= 0
+        return self.st_accu(lanes, result, is_valid)
+    
+    def cmd_MUL(self, lanes, opr_type, opr):
+        vals, is_valid = self.gt_final_value(lanes, opr_type, opr)
+        accu = self.accu[lanes]
+        result = accu * vals
+        if not self.is_native_wrap:  # a product overflowed if dividing it doesn't give back the factor
+            is_quotient_vals = result // np.where(accu == 0, 1, accu) == vals
+            is_valid &= (accu == 0) | (is_quotient_vals & ~((accu == -1) & (vals == INT64_MIN)))
+        return self.st_accu(lanes, result, is_valid)
+    
+    def cmd_DIV(self, lanes, opr_type, opr):
+        vals, is_valid = self.gt_final_value(lanes, opr_type, opr)
+        accu = self.accu[lanes]
+        is_valid &= (vals != 0) & ~((accu == INT64_MIN) & (vals == -1))
+        return self.st_accu(lanes, accu // np.where(is_valid, vals, 1), is_valid)  # integer division
+    
+    def cmd_LDA(self, lanes, opr_type, opr):
+        vals, is_valid = self.gt_final_value(lanes, opr_type, opr)
+        return self.st_accu(lanes, vals.copy(), is_valid)
+    
+    def cmd_STA(self, lanes, opr_type, opr):
+        adrs, is_valid = self.gt_final_adr(lanes, opr_type, opr)
+        is_valid &= self.is_val[adrs]  # overwriting a command raises an error
+        lanes, adrs = self.retire_invalid(lanes, is_valid), adrs[is_valid]
+        self.extend(lanes, adrs)
+        self.mem[adrs, lanes] = self.accu[lanes]
+        self.is_written[adrs, lanes] = True
+        return lanes
+    
+    def cmd_JMP(self, lanes, opr_type, opr):
+        adrs, is_valid = self.gt_final_adr(lanes, opr_type, opr)
+        is_valid &= self.jmps_to_adr[adrs, lanes] <= emu.MAX_JMPS
+        lanes, adrs = self.retire_invalid(lanes, is_valid), adrs[is_valid]
+        self.jmps_to_adr[adrs, lanes] += 1  # every lane appears once, so no increment gets lost
+        self.pc[lanes] = adrs - 1  # "- 1" because the PC will increment automatically
+        return lanes
+    
+    def cmd_JLE(self, lanes, opr_type, opr):
+        jumps = self.accu[lanes] <= 0
+        return np.concatenate((lanes[~jumps], self.cmd_JMP(lanes[jumps], opr_type, opr)))
+    
+    def cmd_JZE(self, lanes, opr_type, opr):
+        jumps = self.accu[lanes] == 0
+        return np.concatenate((lanes[~jumps], self.cmd_JMP(lanes[jumps], opr_type, opr)))
+    
+    def cmd_JNZ(self, lanes, opr_type, opr):
+        jumps = self.accu[lanes] != 0
+        return np.concatenate((lanes[~jumps], self.cmd_JMP(lanes[jumps], opr_type, opr)))
+
+
+def gen_inputs(lane_count, adrs, min_val, max_val, seed):
+    """Return lane_count input sets with random values from min_val to max_val for the cells at adrs"""
+    rng = random.Random(seed)
+    return [{adr: rng.randint(min_val, max_val) for adr in adrs} for lane in range(lane_count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m program.source.Lanes",
+                                     description="Run a reference program over many random input sets at once and "
+                                                 "compare the results and the time with running them one by one.")
+    parser.add_argument("--program", default="multiply", help="name of the reference program in the corpus")
+    parser.add_argument("--lanes", type=int, default=500, help="number of input sets")
+    parser.add_argument("--input", type=int, action="append",
+                        help="address of a cell that gets random values (default: the inputs of the program in the "
+                             "corpus)")
+    parser.add_argument("--min", type=int, default=1, help="smallest random value")
+    parser.add_argument("--max", type=int, default=30, help="largest random value")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    hl.startup()
+    corpus = crp.gt_corpus()
+    if args.program not in corpus:
+        print(f"Unknown program '{args.program}', choose from: {', '.join(corpus)}")
+        return 2
+    prg = emu.Program(corpus[args.program]["program"])
+    adrs = args.input or corpus[args.program]["inputs"]
+    inputs_list = gen_inputs(args.lanes, adrs, args.min, args.max, args.seed)
+    
+    start = time.perf_counter()
+    states = run_lanes(prg, inputs_list)
+    lanes_seconds = time.perf_counter() - start
+    compiled_prg = emu.compile_prg(prg)
+    start = time.perf_counter()
+    single_states = [run_single(compiled_prg, inputs) for inputs in inputs_list]
+    single_seconds = time.perf_counter() - start
+    
+    errors = sum(state["error"] is not None for state in states)
+    mismatches = [lane for lane in range(args.lanes) if states[lane] != single_states[lane]]
+    print(f"  {args.lanes} input sets for cells {', '.join(map(str, adrs))}, {errors} ended with an error")
+    print(f"  lanes      {lanes_seconds * 1000:9.1f} ms" + ("" if np else "  (NumPy is missing, ran one by one)"))
+    print(f"  one by one {single_seconds * 1000:9.1f} ms")
+    for lane in mismatches:
+        print(f"      input set {lane} ({inputs_list[lane]}): {states[lane]} instead of {single_states[lane]}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
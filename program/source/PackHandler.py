@@ -1,7 +1,15 @@
 import os
+import copy
 import glob as gl
 import pathlib as pl
-from PIL import ImageTk, Image
+import tempfile
+import threading
+import traceback
+import contextlib
+import marshal
+import hashlib
+import tkinter as tk
+from program.source import Profiler as prf
 from ast import literal_eval
 
 #          Copyright Blyfh https://github.com/Blyfh
@@ -11,13 +19,38 @@ from ast import literal_eval
 
 
 program_dir = pl.Path(__file__).parent.parent.absolute()
+CACHE_VERSION = 1  # increase whenever the layout of cache files changes
 
 
 class PackHandler:
     
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir  # no compiled cache files are used if None
+        self.loaded_packs = {}  # {pack_path: (mtime_ns, size, pack_data)}
+        self.lang_indices = {}  # {languages_dir: {lang: (mtime_ns, size, lang_name)}}
+    
+    def set_cache_dir(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.loaded_packs.clear()
+        self.lang_indices.clear()
+    
     def gt_pack_data(self, pack, path):
-        # literal_eval safely evaluates literal structures, here a dict
-        return dict(literal_eval(self.gt_pack_str(pack, path)))
+        pack_path = os.path.abspath(f"{path}/{pack}.dict")
+        try:
+            stat = os.stat(pack_path)
+        except OSError:
+            raise FileNotFoundError(f"Couldn't fetch pack '{pack}' from directory '{path}'.")
+        signature = stat.st_mtime_ns, stat.st_size
+        loaded_pack = self.loaded_packs.get(pack_path)
+        if loaded_pack and loaded_pack[:2] == signature:
+            return copy.deepcopy(loaded_pack[2])  # callers may modify the returned dict and the dicts inside it
+        pack_data = self.load_cache(pack_path, signature)
+        if pack_data is None:
+            # literal_eval safely evaluates literal structures, here a dict
+            pack_data = dict(literal_eval(self.gt_pack_str(pack, path)))
+            self.dump_cache(pack_path, signature, pack_data)
+        self.loaded_packs[pack_path] = (*signature, pack_data)
+        return copy.deepcopy(pack_data)
     
     def gt_pack_str(self, pack, path):
         try:
@@ -27,12 +60,80 @@ class PackHandler:
             raise FileNotFoundError(f"Couldn't fetch pack '{pack}' from directory '{path}'.")
     
     def st_pack_data(self, pack, dir, new_data):
+        pack_str = self.format(new_data)
+        # write to a temporary file first and swap it in afterwards, so that a crash mid-write never leaves a torn pack
+        tmp_path = None
         try:
-            with open(f"{dir}/{pack}.dict", "w", encoding="utf-8") as file:
-                file.write(self.format(new_data))
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=dir, prefix=f".{pack}.", suffix=".tmp",
+                                             delete=False) as file:
+                tmp_path = file.name
+                file.write(pack_str)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, f"{dir}/{pack}.dict")
         except:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise FileNotFoundError(f"Couldn't update pack '{pack}' from directory '{dir}'.")
     
+    def gt_cache_path(self, source_path, kind):
+        path_hash = hashlib.sha1(source_path.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{os.path.basename(source_path)}.{path_hash}.{kind}")
+    
+    def load_cache(self, source_path, signature, kind="pack"):
+        """Return the cached data for source_path or None if there is no cache file or it is outdated"""
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.gt_cache_path(source_path, kind), "rb") as file:
+                version, cached_signature, data = marshal.load(file)
+        except (OSError, EOFError, ValueError, TypeError):  # missing or unreadable cache files are just rebuilt
+            return None
+        if version != CACHE_VERSION or tuple(cached_signature) != tuple(signature):
+            return None
+        return data
+    
+    def dump_cache(self, source_path, signature, data, kind="pack"):
+        if not self.cache_dir:
+            return
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile("wb", dir=self.cache_dir, suffix=".tmp", delete=False) as file:
+                tmp_path = file.name
+                marshal.dump((CACHE_VERSION, tuple(signature), data), file)
+            os.replace(tmp_path, self.gt_cache_path(source_path, kind))
+        except (OSError, ValueError):  # the cache is optional, e.g. the cache directory might be read-only
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def gt_lang_index(self, path):
+        """Return {lang: lang_name} for all language packs in path without loading packs that didn't change"""
+        path = os.path.abspath(path)
+        signature = ()  # the index as a whole isn't validated, but each entry is validated below
+        lang_index = self.lang_indices.get(path)
+        if lang_index is None:
+            lang_index = self.load_cache(path, signature, kind="index") or {}
+        new_lang_index = {}
+        for lang_path in sorted(gl.glob(os.path.join(path, "*.dict"))):
+            lang = os.path.basename(lang_path).split(".dict")[0]
+            stat = os.stat(lang_path)
+            entry = lang_index.get(lang)
+            if entry and tuple(entry[:2]) == (stat.st_mtime_ns, stat.st_size):
+                new_lang_index[lang] = tuple(entry)
+            else:
+                # parsed directly to avoid keeping every language pack in memory
+                lang_data = dict(literal_eval(self.gt_pack_str(lang, path)))
+                try:
+                    lang_name = lang_data["info"]["name"]
+                except:
+                    lang_name = None
+                new_lang_index[lang] = (stat.st_mtime_ns, stat.st_size, lang_name)
+        if new_lang_index != lang_index:
+            self.dump_cache(path, signature, new_lang_index, kind="index")
+        self.lang_indices[path] = new_lang_index
+        return {lang: entry[2] for lang, entry in new_lang_index.items()}
+    
     def format(self, dict_data, depth=1):
         items_str = ""
         for key, value in dict_data.items():
@@ -65,26 +166,113 @@ class ProfileHandler:
     
     def __init__(self, profile_dir):
         self.profile_dir = profile_dir
+        self.transaction_changes = None  # collects changes while a transaction is open
+        self.unwritten_data = None  # profile data handed to the write-behind thread that isn't on disk yet
+        self.unwritten_generation = 0  # counts the write-behind saves
+        self.written_generation = 0  # last write-behind save that was written or replaced by a newer write
+        self.unwritten_data_cond = threading.Condition()  # guards the three above
+        self.write_lock = threading.Lock()  # only one thread may write profile.dict at a time
+        self.writer = None  # the write-behind thread, started by the first write-behind save
     
     def reset_profile(self):
+        self.flush()
+        self.transaction_changes = None if self.transaction_changes is None else {}
         default_profile_data = ph.gt_pack_data("default_profile", f"{program_dir}/resources")
-        ph.st_pack_data("profile", f"{self.profile_dir}", new_data=default_profile_data)
+        with self.write_lock:
+            ph.st_pack_data("profile", f"{self.profile_dir}", new_data=default_profile_data)
+    
+    @contextlib.contextmanager
+    def transaction(self, write_behind=False):
+        """Collect all profile changes made inside the with-block and write them to disk at once"""
+        if self.transaction_changes is not None:  # nested transactions join the outer one
+            yield self
+            return
+        self.transaction_changes = {}
+        try:
+            yield self
+            changes = self.transaction_changes
+        finally:
+            self.transaction_changes = None
+        if changes:
+            self.write_profile_data(self.gt_profile_data(changes), write_behind)
     
     def save_profile_data(self, key, new_value):
-        profile_data = ph.gt_pack_data("profile", f"{self.profile_dir}")
-        try:
-            profile_data[key] = new_value
-        except:
-            raise FileNotFoundError(f"Couldn't fetch profile data for '{key}'.")
-        ph.st_pack_data("profile", f"{self.profile_dir}", new_data=profile_data)
+        if self.transaction_changes is not None:
+            self.transaction_changes[key] = new_value
+        else:
+            self.write_profile_data(self.gt_profile_data({key: new_value}))
+    
+    def gt_profile_data(self, changes=None):
+        with self.unwritten_data_cond:
+            unwritten_data = self.unwritten_data
+        if unwritten_data is not None:  # the file on disk is outdated until the write-behind thread is done
+            profile_data = dict(unwritten_data)
+        else:
+            profile_data = ph.gt_pack_data("profile", f"{self.profile_dir}")
+        if self.transaction_changes:
+            profile_data.update(self.transaction_changes)
+        if changes:
+            profile_data.update(changes)
+        return profile_data
+    
+    def write_profile_data(self, profile_data, write_behind=False):
+        if write_behind:
+            with self.unwritten_data_cond:
+                self.unwritten_data = profile_data
+                self.unwritten_generation += 1
+                if self.writer is None:
+                    self.writer = threading.Thread(target=self.write_behind, name="ProfileWriter", daemon=True)
+                    self.writer.start()
+                self.unwritten_data_cond.notify_all()
+        else:
+            with self.write_lock:
+                ph.st_pack_data("profile", f"{self.profile_dir}", new_data=profile_data)
+                with self.unwritten_data_cond:
+                    self.unwritten_data = None  # newer than anything the write-behind thread might still hold
+                    self.written_generation = self.unwritten_generation
+                    self.unwritten_data_cond.notify_all()
+    
+    def write_behind(self):
+        """Write the newest write-behind save whenever there is one, older ones that weren't written yet are skipped"""
+        while True:
+            with self.unwritten_data_cond:
+                self.unwritten_data_cond.wait_for(lambda: self.written_generation != self.unwritten_generation)
+            with self.write_lock:
+                with self.unwritten_data_cond:
+                    profile_data = self.unwritten_data
+                    generation = self.unwritten_generation
+                if generation == self.written_generation:  # a synchronous write took care of it
+                    continue
+                try:
+                    ph.st_pack_data("profile", f"{self.profile_dir}", new_data=profile_data)
+                    is_written = True
+                except FileNotFoundError:  # the data stays readable from memory and is tried again on the next save
+                    traceback.print_exc()
+                    is_written = False
+                with self.unwritten_data_cond:
+                    self.written_generation = generation
+                    if is_written and self.unwritten_generation == generation:
+                        self.unwritten_data = None
+                    self.unwritten_data_cond.notify_all()
+    
+    def flush(self):
+        """Block until the write-behind thread has written all pending changes"""
+        with self.unwritten_data_cond:
+            self.unwritten_data_cond.wait_for(lambda: self.written_generation == self.unwritten_generation)
     
     def gt_value(self, key):
-        profile_data = ph.gt_pack_data("profile", f"{self.profile_dir}")
+        profile_data = self.gt_profile_data()
         try:
             return profile_data[key]
         except KeyError:
             if key == "auto_shift_addresses":
                 return False  # Default value for auto_shift_addresses
+            if key == "auto_shift_operands":
+                return False  # Default value for auto_shift_operands
+            if key == "word_size":
+                return 0  # unbounded like in profiles from before word sizes existed
+            if key == "overflow_mode":
+                return "wrap"
             raise FileNotFoundError(f"Couldn't fetch profile data for '{key}'.")
     
     def theme(self):
@@ -115,12 +303,21 @@ class ProfileHandler:
     def max_jmps(self):
         return self.gt_value("max_jmps")
     
+    def word_size(self):
+        return self.gt_value("word_size")
+    
+    def overflow_mode(self):
+        return self.gt_value("overflow_mode")
+    
     def closing_unsaved(self):
         return self.gt_value("closing_unsaved")
     
     def auto_shift_addresses(self):
         return self.gt_value("auto_shift_addresses")
     
+    def auto_shift_operands(self):
+        return self.gt_value("auto_shift_operands")
+    
     def dev_mode(self):
         return self.gt_value("dev_mode")
 
@@ -132,31 +329,29 @@ class LangHandler:
         self.cur_lang_data = ph.gt_pack_data(self.cur_lang, f"{program_dir}/languages")
     
     def gt_langs(self):
-        lang_paths = gl.glob(os.path.join(program_dir, "languages/*.dict"))
-        langs = []
-        for lang_path in lang_paths:
-            langs.append(os.path.basename(lang_path).split(".dict")[0])
-        return langs
+        return list(ph.gt_lang_index(f"{program_dir}/languages"))
     
     def gt_lang(self, lang_name):
-        langs = self.gt_langs()
-        for lang in langs:
-            if self.gt_lang_name(lang) == lang_name:
+        for lang, name in ph.gt_lang_index(f"{program_dir}/languages").items():
+            if name == lang_name:
                 return lang
         raise FileNotFoundError(f"Couldn't fetch language ID for '{lang_name}'.")
     
     def gt_lang_name(self, lang):
-        lang_data = ph.gt_pack_data(lang, f"{program_dir}/languages")
-        try:
-            lang_name = lang_data["info"]["name"]
-        except:
+        # the language index only loads packs that changed since the index was last built
+        lang_index = ph.gt_lang_index(f"{program_dir}/languages")
+        if lang not in lang_index:
+            raise FileNotFoundError(f"Couldn't fetch pack '{lang}' from directory '{program_dir}/languages'.")
+        lang_name = lang_index[lang]
+        if lang_name is None:
             raise FileNotFoundError(f"Couldn't fetch info data for 'name' from language pack '{lang}'.")
         return lang_name
     
     def gt_langs_with_names(self):
-        langs_with_names = {}
-        for lang in self.gt_langs():
-            langs_with_names[lang] = self.gt_lang_name(lang)
+        langs_with_names = ph.gt_lang_index(f"{program_dir}/languages")
+        for lang, lang_name in langs_with_names.items():
+            if lang_name is None:
+                raise FileNotFoundError(f"Couldn't fetch info data for 'name' from language pack '{lang}'.")
         return langs_with_names
     
     def demo(self):
@@ -190,6 +385,14 @@ class LangHandler:
                                     f"'{self.cur_lang}'.")
         return ele
     
+    def prf_win(self, key):
+        try:
+            ele = self.cur_lang_data["prf_win"][key]
+        except:
+            raise FileNotFoundError(f"Couldn't fetch 'performance' window data for '{key}' from language pack "
+                                    f"'{self.cur_lang}'.")
+        return ele
+    
     def gui(self, key):
         try:
             ele = self.cur_lang_data["gui"][key]
@@ -275,23 +478,60 @@ class SpriteHandler:
         self.theme = theme
     
     def gt_sprite(self, group, sprite, x, y, theme_dependent=False, extension="png"):
+        with prf.startup_profiler.stage("sprite loading"):
+            return self.load_sprite(group, sprite, x, y, theme_dependent, extension)
+    
+    def load_sprite(self, group, sprite, x, y, theme_dependent, extension):
         if theme_dependent:
             if self.theme:
-                try:
-                    img = Image.open(f"{program_dir}/sprites/{group}/{sprite}_{self.theme}.{extension}")
-                except:
-                    raise FileNotFoundError(f"Couldn't fetch sprite '{sprite}' on {self.theme} theme for '{group}'.")
+                sprite_name = f"{sprite}_{self.theme}"
+                error_msg = f"Couldn't fetch sprite '{sprite}' on {self.theme} theme for '{group}'."
             else:
                 raise RuntimeError(f"Can't get theme dependent sprite '{sprite}' for '{group}' if no theme is "
                                    f"specified.")
         else:
+            sprite_name = sprite
+            error_msg = f"Couldn't fetch sprite '{sprite}' for '{group}'."
+        sprite_path = f"{program_dir}/sprites/{group}/{sprite_name}.{extension}"
+        try:
+            mtime_ns = os.stat(sprite_path).st_mtime_ns
+        except OSError:
+            raise FileNotFoundError(error_msg)
+        # Tk reads PNGs by itself, so a warm start doesn't need to decode or resample anything with Pillow
+        cache_path = self.gt_cache_path(group, sprite_name, x, y, mtime_ns)
+        if cache_path and os.path.exists(cache_path):
             try:
-                img = Image.open(f"{program_dir}/sprites/{group}/{sprite}.{extension}")
-            except:
-                raise FileNotFoundError(f"Couldn't fetch sprite '{sprite}' for '{group}'.")
+                return tk.PhotoImage(file=cache_path)
+            except tk.TclError:  # corrupted cache file, gets overwritten below
+                pass
+        from PIL import ImageTk, Image  # only needed on a cold start
+        try:
+            img = Image.open(sprite_path)
+        except:
+            raise FileNotFoundError(error_msg)
         img = img.resize((x, y), Image.LANCZOS)
+        if cache_path:
+            self.dump_cache(img, cache_path)
         return ImageTk.PhotoImage(img)
     
+    def gt_cache_path(self, group, sprite_name, x, y, mtime_ns):
+        if not ph.cache_dir:
+            return None
+        return os.path.join(ph.cache_dir, "sprites", f"{group}.{sprite_name}.{x}x{y}.{mtime_ns}.png")
+    
+    def dump_cache(self, img, cache_path):
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(cache_path), suffix=".tmp",
+                                             delete=False) as file:
+                tmp_path = file.name
+                img.save(file, format="PNG")
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError):  # the cache is optional, e.g. the cache directory might be read-only
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
     def gt_button_sprites(self, group, x=35, y=35, lockable=False):
         default  = self.gt_sprite(group, "default",  x, y, theme_dependent=True)
         hovering = self.gt_sprite(group, "hovering", x, y, theme_dependent=True)
@@ -0,0 +1,94 @@
+import time
+import contextlib
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+FIRST_PAINT_TARGET = 0.5  # seconds from launch until the main window is drawn for the first time
+
+
+def format_run_record(record):  # used by Editor.add_perf_record() and Subwindows.Performance.refresh()
+    formatted = {}
+    for key, value in record.items():
+        if value is None:
+            formatted[key] = "–"
+        elif key == "steps_per_s":
+            formatted[key] = f"{value:,.0f}"
+        elif isinstance(value, float):
+            formatted[key] = f"{value * 1000:.2f} ms"
+        else:
+            formatted[key] = str(value)
+    return formatted
+
+
+class Profiler:
+    
+    def __init__(self):
+        self.enabled = False
+        self.launch_time = None
+        self.stages = {}  # {stage: [seconds, calls, depth]} in order of first occurrence
+        self.depth = 0
+        self.marks = {}  # {mark: seconds since launch}
+    
+    def start(self, launch_time=None):
+        self.enabled = True
+        self.launch_time = launch_time if launch_time is not None else time.perf_counter()
+        self.stages.clear()
+        self.marks.clear()
+        self.depth = 0
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Add the time spent in the with-block to the stage; repeated stages are summed up"""
+        if not self.enabled:
+            yield
+            return
+        stage = self.stages.setdefault(name, [0.0, 0, self.depth])
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage[0] += time.perf_counter() - start
+            stage[1] += 1
+            self.depth -= 1
+    
+    def stop(self):
+        self.enabled = False
+    
+    def gt_seconds(self, name):
+        """Return the summed up time of the stage or None if it wasn't entered"""
+        stage = self.stages.get(name)
+        return stage[0] if stage else None
+    
+    def mark(self, name):
+        if self.enabled:
+            self.marks[name] = time.perf_counter() - self.launch_time
+    
+    def gt_mark(self, name):
+        return self.marks.get(name)
+    
+    def first_paint_exceeded(self):
+        first_paint = self.gt_mark("first paint")
+        return first_paint is not None and first_paint > FIRST_PAINT_TARGET
+    
+    def report(self):
+        lines = ["Startup profile:"]
+        for name, (seconds, calls, depth) in self.stages.items():
+            calls_str = f" ({calls} calls)" if calls > 1 else ""
+            lines.append(f"  {'  ' * depth}{name + calls_str:<{40 - 2 * depth}} {seconds * 1000:8.1f} ms")
+        for name, seconds in self.marks.items():
+            lines.append(f"  {'time to ' + name:<40} {seconds * 1000:8.1f} ms")
+        first_paint = self.gt_mark("first paint")
+        if first_paint is not None:
+            verdict = "EXCEEDED" if self.first_paint_exceeded() else "ok"
+            lines.append(f"  first paint target: {FIRST_PAINT_TARGET * 1000:.0f} ms -> {verdict}")
+        return "\n".join(lines)
+
+
+startup_profiler = Profiler()
+run_profiler = Profiler()  # timings of the last run in the editor, only enabled in developer mode
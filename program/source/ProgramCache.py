@@ -0,0 +1,113 @@
+import os
+import mmap
+import struct
+import marshal
+import hashlib
+import tempfile
+from program.source import Emulator as emu
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# .asmc files: a fixed header followed by the marshalled data of Emulator.compile_prg()
+MAGIC = b"ASMC"
+FORMAT_VERSION = 1  # increase whenever the layout of .asmc files changes
+# magic, format version, parser version, BLAKE2b hash of the source, MAX_CELS the program was validated against
+HEADER = struct.Struct("<4sHH32sQ")
+
+
+def gt_source_hash(prg_str):
+    return hashlib.blake2b(prg_str.encode("utf-8"), digest_size=32).digest()
+
+
+def gt_compiled_path(source_path, cache_dir=None):
+    """Return the path of the .asmc file next to source_path or inside cache_dir if it is given"""
+    if cache_dir is None:
+        return os.path.splitext(source_path)[0] + ".asmc"
+    path_hash = hashlib.sha1(os.path.abspath(source_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(source_path)}.{path_hash}.asmc")
+
+
+def gt_header(source_hash):
+    return HEADER.pack(MAGIC, FORMAT_VERSION, emu.PARSER_VERSION, source_hash, emu.MAX_CELS)
+
+
+def load(compiled_path, source_hash):
+    """Return the compiled program of the .asmc file or None if it is missing, outdated or belongs to another source"""
+    try:
+        with open(compiled_path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.size() < HEADER.size or mm[:HEADER.size] != gt_header(source_hash):
+                    return None
+                # marshal reads straight from the memory map, the payload is never copied into a bytes object
+                with memoryview(mm) as view, view[HEADER.size:] as payload, emu.gc_paused():
+                    return marshal.loads(payload)
+    except (OSError, EOFError, ValueError, TypeError):  # missing or unreadable files are just rebuilt
+        return None
+
+
+def dump(compiled_path, source_hash, compiled_prg):
+    tmp_path = None
+    try:
+        compiled_dir = os.path.dirname(os.path.abspath(compiled_path))
+        os.makedirs(compiled_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=compiled_dir, suffix=".tmp", delete=False) as file:
+            tmp_path = file.name
+            file.write(gt_header(source_hash))
+            marshal.dump(compiled_prg, file)
+        os.replace(tmp_path, compiled_path)
+    except (OSError, ValueError):  # the cache is optional, e.g. the directory of the source might be read-only
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class CompiledFile:
+    """The .asmc file of an opened source, it is only read, parsed or written when the emulator first runs the source"""
+    
+    def __init__(self, source_path, cache_dir=None):
+        self.path = gt_compiled_path(source_path, cache_dir)
+        self.source_hash = None
+        self.compiled_prg = None
+        self.max_cels = None  # MAX_CELS that compiled_prg was validated against
+    
+    def gt_compiled_prg(self, prg_str):
+        """Return the compiled program of prg_str from memory or the .asmc file or None if there is no valid one"""
+        if self.source_hash is None:
+            self.source_hash = gt_source_hash(prg_str)
+        if self.compiled_prg is None or self.max_cels != emu.MAX_CELS:
+            # programs that were valid before the options lowered MAX_CELS have to be parsed again
+            self.compiled_prg = load(self.path, self.source_hash)
+            self.max_cels = emu.MAX_CELS
+        return self.compiled_prg
+    
+    def st_compiled_prg(self, prg_str, compiled_prg):
+        if self.source_hash is None:
+            self.source_hash = gt_source_hash(prg_str)
+        self.compiled_prg = compiled_prg
+        self.max_cels = emu.MAX_CELS
+        dump(self.path, self.source_hash, compiled_prg)
+
+
+def gt_program(source_path, cache_dir=None, encoding="utf-8"):
+    """
+    Return the Program of the file at source_path, loaded from its .asmc file if the source didn't change.
+    
+    The file is hashed through a memory map and only parsed line by line (see Emulator.parse_file()) if there is no
+    valid .asmc file, so the source is never read into memory as a whole.
+    """
+    compiled_path = gt_compiled_path(source_path, cache_dir)
+    with open(source_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:  # empty files can't be mapped
+            return emu.Program("")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            source_hash = hashlib.blake2b(mm, digest_size=32).digest()  # same as gt_source_hash() for UTF-8 files
+            compiled_prg = load(compiled_path, source_hash)
+            if compiled_prg is not None:
+                return emu.build_prg(compiled_prg)
+            prg = emu.Program(emu.iter_mmap_lines(mm, encoding))  # raises the usual errors for invalid programs
+    dump(compiled_path, source_hash, emu.compile_prg(prg))
+    return prg
@@ -0,0 +1,113 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from program.source import Emulator as emu
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# Stores the results of test specs (see SpecRunner.run_spec()) in an SQLite file, so that a resubmitted program isn't
+# executed again. Programs that only differ in comments, empty lines or whitespaces share their results.
+CACHE_VERSION = 2  # increase whenever the format of the results changes, so that old entries are ignored
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+def gt_code(prg_str):
+    """Return the tokens of all cells of prg_str without comments and whitespaces, one line per cell
+    
+    Error messages only quote tokens without their whitespaces and addresses, never lines, so programs with the same
+    code get the same results. Tokens keep their case for the same reason."""
+    lines = []
+    for line_str in prg_str.split("\n"):
+        tok_strs = emu.split_cell_at_comment(line_str)[0].split()
+        if tok_strs:
+            lines.append(" ".join(tok_strs))
+    return "\n".join(lines)
+
+
+def gt_key(prg_str, spec):
+    """Return the key of the results of prg_str for spec under the current properties of the emulator"""
+    properties = CACHE_VERSION, emu.PARSER_VERSION, emu.MAX_JMPS, emu.MAX_CELS, emu.WORD_SIZE, emu.OVERFLOW_MODE
+    data = json.dumps([properties, gt_code(prg_str), spec])  # the order of the cases is kept, it's the order of results
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """An SQLite file of results that drops the least recently used ones when it grows beyond max_bytes"""
+    
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()  # the connection is shared by the threads of the grading server
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")  # a hit updates last_used, so every access writes
+        self.db.execute("CREATE TABLE IF NOT EXISTS results "
+                        "(key TEXT PRIMARY KEY, results TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0  # results that couldn't be serialised or are larger than the whole cache
+    
+    def get(self, key):
+        """Return the stored results of key or None"""
+        with self.lock:
+            row = self.db.execute("SELECT results FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+    
+    def put(self, key, results):
+        """Store results under key, results that can't be stored are skipped"""
+        try:
+            data = json.dumps(results)
+        except (TypeError, ValueError):  # e.g. ints with too many digits for str(), see SpecRunner.gt_reported_val()
+            data = None
+        if data is None or len(data) > self.max_bytes:
+            with self.lock:
+                self.skipped += 1
+            return
+        size = len(data)
+        with self.lock:
+            old_size = self.db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, data, size, time.time()))
+            self.size += size - (old_size[0] if old_size else 0)
+            if self.size > self.max_bytes:
+                self.evict()
+    
+    def evict(self):
+        """Delete the least recently used results until the cache fits into max_bytes again"""
+        self.db.execute("BEGIN")
+        while self.size > self.max_bytes:
+            rows = self.db.execute("SELECT key, size FROM results ORDER BY last_used LIMIT 64").fetchall()
+            for key, size in rows:
+                self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.size -= size
+                self.evictions += 1
+                if self.size <= self.max_bytes:
+                    break
+            if not rows:
+                break
+        self.db.execute("COMMIT")
+    
+    def gt_stats(self):
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {"entries": entries, "bytes": self.size, "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": self.hits / lookups if lookups else None,
+                    "evictions": self.evictions, "skipped": self.skipped}
+    
+    def close(self):
+        with self.lock:
+            self.db.close()
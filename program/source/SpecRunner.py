@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import argparse
+from ast import literal_eval
+import xml.etree.ElementTree as et
+
+from program.source import Lanes as ln
+from program.source import Headless as hl
+from program.source import Emulator as emu
+from program.source import ProgramCache as pcc
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# usage: python -m program.source.SpecRunner FILE.asm ... [--format json|junit] [--output FILE] [--cache-dir DIR]
+#
+# The cases of "program.asm" are listed in "program.tests", a dict in the format of the packs:
+# {
+#     "max_steps": 10000,                 # optional, for all cases
+#     "word_size": 16,                    # optional, see Emulator.st_properties()
+#     "overflow_mode": "wrap",            # optional
+#     "cases": {
+#         "3 times 4": {
+#             "inputs":    {1: 3, 2: 4},  # values that overwrite the memory cells before the execution
+#             "accu":      12,            # optional, expected ACC after STP
+#             "memory":    {3: 12},       # optional, expected values of memory cells after STP
+#             "max_steps": 100            # optional, the case fails if the program needs more steps
+#         }
+#     }
+# }
+SPEC_EXTENSION = ".tests"
+SPEC_KEYS = "cases", "max_steps", "word_size", "overflow_mode"
+CASE_KEYS = "inputs", "accu", "memory", "max_steps"
+# str() and json refuse ints with more digits (Python 3.11+), 0 means unlimited
+MAX_INT_DIGITS = getattr(sys, "get_int_max_str_digits", lambda: 0)()
+
+
+class SpecError(Exception):  # raised by load_spec() for malformed test files
+    pass
+
+
+def gt_spec_path(asm_path):
+    return os.path.splitext(asm_path)[0] + SPEC_EXTENSION
+
+
+def load_spec(spec_path):
+    """Return the test spec of spec_path after checking its structure"""
+    try:
+        with open(spec_path, "r", encoding="utf-8") as file:
+            spec = literal_eval(file.read())
+    except (OSError, SyntaxError, ValueError) as error:
+        raise SpecError(f"Couldn't read test spec '{spec_path}': {error}")
+    return check_spec(spec, spec_path)
+
+
+def check_spec(spec, spec_path):
+    """Return spec if it has the structure of a test spec and raise a SpecError otherwise; spec_path names its origin"""
+    if not isinstance(spec, dict) or not isinstance(spec.get("cases"), dict):
+        raise SpecError(f"Test spec '{spec_path}' has to be a dict with a dict of cases under 'cases'.")
+    for key in spec:
+        if key not in SPEC_KEYS:
+            raise SpecError(f"Unknown key '{key}' in test spec '{spec_path}', choose from: {', '.join(SPEC_KEYS)}")
+    if spec.get("word_size", 0) not in emu.WORD_SIZES:
+        raise SpecError(f"Unsupported word size {spec['word_size']} in test spec '{spec_path}', choose from: "
+                        f"{', '.join(map(str, emu.WORD_SIZES))}")
+    if spec.get("overflow_mode", "wrap") not in emu.OVERFLOW_MODES:
+        raise SpecError(f"Unsupported overflow mode '{spec['overflow_mode']}' in test spec '{spec_path}', choose "
+                        f"from: {', '.join(emu.OVERFLOW_MODES)}")
+    for name, case in spec["cases"].items():
+        if not isinstance(case, dict):
+            raise SpecError(f"Case '{name}' of test spec '{spec_path}' has to be a dict.")
+        for key in case:
+            if key not in CASE_KEYS:
+                raise SpecError(f"Unknown key '{key}' in case '{name}' of test spec '{spec_path}', choose from: "
+                                f"{', '.join(CASE_KEYS)}")
+        for key in ("inputs", "memory"):
+            if not isinstance(case.get(key, {}), dict) or not all(type(adr) is int for adr in case.get(key, {})):
+                raise SpecError(f"'{key}' of case '{name}' of test spec '{spec_path}' has to map addresses to values.")
+    return spec
+
+
+class ProgramSnapshot:
+    """Remembers the stored values of a program, so that it can be reset between cases without parsing it again"""
+    
+    def __init__(self, prg):
+        self.prg = prg
+        self.cel_count = len(prg.cells)
+        self.vals = [(cell.toks[1].tok, cell.toks[1].tok_str) for cell in prg.cells]
+        self.input_adrs = set()
+    
+    def apply_inputs(self, inputs):
+        self.input_adrs.update(inputs)
+        ln.apply_inputs(self.prg, inputs)
+    
+    def reset(self):
+        """Restore only the cells that were changed by inputs or STA since the last reset"""
+        for adr in self.prg.stored_adrs | self.input_adrs:
+            if 0 <= adr < self.cel_count:
+                tok = self.prg.cells[adr].toks[1]
+                tok.tok, tok.tok_str = self.vals[adr]
+        del self.prg.cells[self.cel_count:]  # cells that were created behind the program
+        self.prg.stored_adrs.clear()
+        self.input_adrs.clear()
+        self.prg.start_executing()  # resets the registers
+        self.prg.executing = False
+
+
+def gt_reported_val(val):
+    """Return val or, if it has too many digits for str() and json, the hexadecimal string of val"""
+    if isinstance(val, int) and MAX_INT_DIGITS and val.bit_length() > 3 * MAX_INT_DIGITS:  # 3 bits per digit at most
+        return hex(val)
+    return val
+
+
+def check_case(state, case):
+    """Return a description of every difference between the final state and the expectations of a case"""
+    mismatches = []
+    if "accu" in case and state["accu"] != case["accu"]:
+        mismatches.append(f"ACC is {gt_reported_val(state['accu'])}, expected {case['accu']}")
+    for adr, expected_val in case.get("memory", {}).items():
+        val = state["memory"].get(adr)
+        if val != expected_val:
+            mismatches.append(f"memory cell {adr} is {gt_reported_val(val)}, expected {expected_val}")
+    return mismatches
+
+
+def gt_result(name, case, state, max_steps, seconds):
+    """Return the result of a case from the final state of its run, see Lanes.gt_state()"""
+    result = {"name": name, "status": "passed", "messages": [], "accu": gt_reported_val(state["accu"]),
+              "pc": state["pc"], "steps": state["steps"], "seconds": seconds}
+    if state["error"] is not None:
+        # needing too many steps is a wrong solution, every other error means that the program crashed
+        is_too_slow = max_steps is not None and state["error"] == emu.eh.error("MaxSteps", max_steps=max_steps)
+        result["status"] = "failed" if is_too_slow else "error"
+        result["messages"].append(state["error"])
+    else:
+        result["messages"] = check_case(state, case)
+        if result["messages"]:
+            result["status"] = "failed"
+    return result
+
+
+def run_case(snapshot, name, case, max_steps=None):
+    start = time.perf_counter()
+    snapshot.reset()
+    max_steps = case.get("max_steps", max_steps)
+    try:
+        snapshot.apply_inputs(case.get("inputs", {}))
+        ln.execute(snapshot.prg, max_steps)
+    except MemoryError:  # a job that hit the memory limit of a grading worker is no case error
+        raise
+    except Exception as error:
+        state = ln.gt_state(snapshot.prg, error)
+    else:
+        state = ln.gt_state(snapshot.prg)
+    return gt_result(name, case, state, max_steps, time.perf_counter() - start)
+
+
+def run_cases(prg, cases, max_steps=None):
+    """Return the results of all cases, run as lanes if there are enough of them, see Lanes.run_lanes()"""
+    if ln.np is None or len(cases) < ln.MIN_GROUP_LANES:
+        snapshot = ProgramSnapshot(prg)
+        return [run_case(snapshot, name, case, max_steps) for name, case in cases.items()]
+    max_steps_list = [case.get("max_steps", max_steps) for case in cases.values()]
+    start = time.perf_counter()
+    states = ln.run_lanes(prg, [case.get("inputs", {}) for case in cases.values()], max_steps_list)
+    seconds = (time.perf_counter() - start) / len(cases)  # the lanes share their time
+    return [gt_result(name, case, state, case_max_steps, seconds)
+            for (name, case), state, case_max_steps in zip(cases.items(), states, max_steps_list)]
+
+
+def run_file(asm_path, spec_path=None, cache_dir=None):
+    """Run all cases of the test spec of asm_path and return the results of the file"""
+    spec_path = spec_path or gt_spec_path(asm_path)
+    return run_spec(load_spec(spec_path), lambda: pcc.gt_program(asm_path, cache_dir), asm_path, spec_path)
+
+
+def run_spec(spec, gt_prg, asm_path, spec_path):
+    """Run all cases of a checked spec on the Program returned by gt_prg() and return the results"""
+    start = time.perf_counter()
+    suite = {"file": asm_path, "spec": spec_path, "cases": []}
+    properties = emu.MIN_ADR_LEN, emu.MAX_JMPS, emu.MAX_CELS, emu.WORD_SIZE, emu.OVERFLOW_MODE
+    emu.st_properties(*properties[:3], spec.get("word_size", emu.WORD_SIZE),
+                      spec.get("overflow_mode", emu.OVERFLOW_MODE))
+    try:
+        try:
+            prg = gt_prg()  # parsed once for all cases
+        except MemoryError:
+            raise
+        except Exception as error:
+            suite["cases"] = [{"name": name, "status": "error", "messages": [str(error)], "accu": None, "pc": None,
+                               "steps": 0, "seconds": 0} for name in spec["cases"]]
+        else:
+            suite["cases"] = run_cases(prg, spec["cases"], spec.get("max_steps"))
+    finally:
+        emu.st_properties(*properties)
+    suite["seconds"] = time.perf_counter() - start
+    return suite
+
+
+def count(suite, status):
+    return sum(result["status"] == status for result in suite["cases"])
+
+
+def gt_json(suites):
+    return json.dumps({"passed": sum(count(suite, "passed") for suite in suites),
+                       "failed": sum(count(suite, "failed") for suite in suites),
+                       "errors": sum(count(suite, "error") for suite in suites),
+                       "files":  suites}, indent=4)
+
+
+def gt_junit(suites):
+    """Return the results as JUnit XML, failed expectations are failures and crashed programs are errors"""
+    root = et.Element("testsuites")
+    for suite in suites:
+        suite_elm = et.SubElement(root, "testsuite", name=suite["file"], tests=str(len(suite["cases"])),
+                                  failures=str(count(suite, "failed")), errors=str(count(suite, "error")),
+                                  time=f"{suite['seconds']:.6f}")
+        for result in suite["cases"]:
+            case_elm = et.SubElement(suite_elm, "testcase", name=result["name"], classname=suite["file"],
+                                     time=f"{result['seconds']:.6f}")
+            if result["status"] != "passed":
+                tag = "failure" if result["status"] == "failed" else "error"
+                outcome_elm = et.SubElement(case_elm, tag, message=result["messages"][0])
+                outcome_elm.text = "\n".join(result["messages"])
+    et.indent(root)
+    return et.tostring(root, encoding="unicode", xml_declaration=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m program.source.SpecRunner",
+                                     description=f"Run the test cases of Assembly programs, listed in a "
+                                                 f"'{SPEC_EXTENSION}' file next to each program.")
+    parser.add_argument("files", nargs="+", help="programs to test")
+    parser.add_argument("--format", choices=("json", "junit"), default="json", help="format of the report")
+    parser.add_argument("--output", help="write the report to this file instead of printing it")
+    parser.add_argument("--cache-dir", help="directory for the compiled programs (default: next to the programs)")
+    args = parser.parse_args(argv)
+    
+    hl.startup()
+    suites = []
+    for asm_path in args.files:
+        try:
+            suites.append(run_file(asm_path, cache_dir=args.cache_dir))
+        except SpecError as error:
+            print(error, file=sys.stderr)
+            return 2
+    report = gt_json(suites) if args.format == "json" else gt_junit(suites)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report)
+    else:
+        print(report)
+    return 0 if all(count(suite, "passed") == len(suite["cases"]) for suite in suites) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import gc
+import sys
+import json
+import math
+import time
+import argparse
+import tracemalloc
+
+from program.source import Headless as hl
+from program.source import Emulator as emu
+from program.source import Generator as gen
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# usage: python -m program.source.Stress [--size N] [--factor F] [--steps S] [--repeat R] [--case NAME ...]
+#                                        [--output FILE]
+CASES = {"address_gaps":     gen.gen_address_gaps,
+         "huge_gap":         gen.gen_huge_gap,
+         "top_comments":     gen.gen_top_comments,
+         "cell_comments":    gen.gen_cell_comments,
+         "whitespace_runs":  gen.gen_whitespace_runs,
+         "indirect_chain":   gen.gen_indirect_chain,
+         "max_jumps":        gen.gen_max_jumps}
+STAGES = "parse", "execute", "output"
+# exponent k of time ~ size^k above which a stage is reported as superlinear: quadratic paths fit at about 2 and
+# n log n at about 1.1, while single timings vary by up to 20 % on a busy machine, which moves k by up to 0.1
+MAX_SLOPE = 1.3
+MIN_SECONDS = 0.02  # stages that are faster at the largest size are too noisy to judge their growth
+
+
+def run_stages(prg_str):
+    """Return the seconds spent parsing, executing and building the output of prg_str"""
+    times = {}
+    gc.collect()  # garbage of the run before would otherwise be collected at some point during this one
+    start = time.perf_counter()
+    prg = emu.Program(prg_str)
+    times["parse"] = time.perf_counter() - start
+    start = time.perf_counter()
+    prg.execute()
+    times["execute"] = time.perf_counter() - start
+    start = time.perf_counter()
+    str(prg)
+    prg.gt_prg()
+    times["output"] = time.perf_counter() - start
+    return times
+
+
+def gt_slope(sizes, times):
+    """Return the exponent k of times ~ sizes^k as the least squares slope on a log-log scale"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(seconds, 1e-9)) for seconds in times]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / sum((x - x_mean) ** 2 for x in xs)
+
+
+def measure(prg_strs, repeat):
+    """Return the fastest times of repeat runs and the peak memory of each program of prg_strs ({size: program})"""
+    # the sizes take turns, so that a disturbance of the machine doesn't slow down all runs of one size
+    times = {size: {stage: float("inf") for stage in STAGES} for size in prg_strs}
+    for i in range(repeat):
+        for size, prg_str in prg_strs.items():
+            for stage, seconds in run_stages(prg_str).items():
+                times[size][stage] = min(times[size][stage], seconds)
+    results = {}
+    for size, prg_str in prg_strs.items():
+        # peak memory is measured in a separate run because tracemalloc slows everything down
+        tracemalloc.start()
+        try:
+            run_stages(prg_str)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        results[size] = {"seconds": times[size], "peak_bytes": peak, "input_bytes": len(prg_str)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m program.source.Stress",
+                                     description="Run worst-case inputs through the parser and the emulator at growing "
+                                                 "sizes and report time, peak memory and how the time grows.")
+    parser.add_argument("--size", type=int, default=5000, help="size n of the smallest input")
+    parser.add_argument("--factor", type=int, default=2, help="each input is factor times larger than the one before")
+    parser.add_argument("--steps", type=int, default=4, help="number of sizes, at least 3")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size, the fastest one counts")
+    parser.add_argument("--case", action="append", choices=list(CASES), help="only run this case")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.steps < 3:
+        parser.error("--steps has to be at least 3 to fit the growth")
+    
+    sizes = [args.size * args.factor ** i for i in range(args.steps)]
+    # the limits of the profile would stop most cases long before they get interesting
+    hl.startup(max_jmps=sizes[-1] + 1, max_cels=2 * sizes[-1] + 2)
+    results = {}
+    superlinear = []
+    for name in args.case or CASES:
+        measured = measure({size: CASES[name](size) for size in sizes}, args.repeat)
+        results[name] = {"sizes": measured, "slopes": {}}
+        largest = measured[sizes[-1]]
+        growths = []
+        for stage in STAGES:
+            slope = gt_slope(sizes, [measured[size]["seconds"][stage] for size in sizes])
+            results[name]["slopes"][stage] = slope
+            growths.append(f"{stage} {largest['seconds'][stage] * 1000:9.2f} ms (n^{slope:4.2f})")
+            if slope > MAX_SLOPE and largest["seconds"][stage] > MIN_SECONDS:
+                superlinear.append(f"{name}: {stage} (n^{slope:.2f})")
+        print(f"  {name:<16} {'  '.join(growths)}  peak {largest['peak_bytes'] / 2 ** 20:7.1f} MiB")
+    if superlinear:
+        print(f"Superlinear growth (time grows faster than n^{MAX_SLOPE} over sizes {sizes[0]} to {sizes[-1]}): "
+              f"{', '.join(superlinear)}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+    return 1 if superlinear else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
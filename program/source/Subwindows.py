@@ -3,6 +3,7 @@ import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.font as fn
 from program.source import Widgets as wdg
+from program.source import Profiler as prf
 
 
 #          Copyright Blyfh https://github.com/Blyfh
@@ -11,6 +12,9 @@ from program.source import Widgets as wdg
 #           http://www.boost.org/LICENSE_1_0.txt)
 
 
+font_faces = None
+
+
 def startup(profile_handler, language_handler, sprite_handler, emulator):
     global ph
     global lh
@@ -30,9 +34,11 @@ def gt_font_faces_with_names():
 
 
 def gt_font_faces():
-    fonts = list(fn.families())
-    fonts.sort()
-    return fonts
+    # enumerating fonts can take seconds on systems with many fonts, so it is only done once per session
+    global font_faces
+    if font_faces is None:
+        font_faces = sorted(fn.families())
+    return font_faces
 
 
 def font_face_name(font_face):
@@ -45,11 +51,17 @@ class Subwindow:
         self.ed = editor
         self.subroot = None
         self.active = False
+        self.built = False  # the window is only built once and hidden instead of destroyed on closing
     
     def open(self):
         if not self.active:
             self.active = True
-            self.build_gui()
+            if self.built and self.subroot.winfo_exists():
+                self.refresh()
+                self.subroot.deiconify()
+            else:
+                self.build_gui()
+                self.built = True
             self.focus()
         else:  # set focus on already existing window
             self.focus()
@@ -57,6 +69,9 @@ class Subwindow:
     def build_gui(self):  # different for each Subwindow
         self.subroot.protocol("WM_DELETE_WINDOW", self.close)
     
+    def refresh(self):  # updates the state of an already built window before it is shown again
+        pass
+    
     def focus(self):
         if self.active:
             self.subroot.focus_force()
@@ -68,7 +83,7 @@ class Subwindow:
     def close(self):
         if self.active:
             self.active = False
-            self.subroot.destroy()
+            self.subroot.withdraw()
         else:
             raise RuntimeError(f"Can't close Subwindow if it isn't opened.")
 
@@ -76,6 +91,28 @@ class Subwindow:
 class Options(Subwindow):
     
     def open(self):
+        if not self.active:
+            if not self.built:
+                self.create_option_vars()
+            self.set_option_vars()
+            self.init_state = {
+                "theme":           self.gt_theme(),
+                "language":        ph.language(),
+                "code_font_face":  ph.code_font_face(),
+                "code_font_size":  self.code_font_size_VAR.get(),
+                "min_adr_len":     self.min_adr_len_VAR.get(),
+                "max_cels":        self.max_cels_VAR.get(),
+                "max_jmps":        self.max_jmps_VAR.get(),
+                "word_size":       ph.word_size(),
+                "overflow_mode":   ph.overflow_mode(),
+                "auto_shift_addresses": self.auto_shift_addresses_VAR.get(),
+                "auto_shift_operands": self.auto_shift_operands_VAR.get(),
+                "closing_unsaved": ph.closing_unsaved(),
+                "dev_mode":        self.dev_mode_VAR.get()
+            }
+        super().open()
+    
+    def create_option_vars(self):
         self.is_light_theme_VAR  = tk.BooleanVar()
         self.language_VAR        = tk.StringVar()
         self.code_font_face_VAR  = tk.StringVar()
@@ -83,23 +120,12 @@ class Options(Subwindow):
         self.min_adr_len_VAR     = tk.IntVar()
         self.max_cels_VAR        = tk.IntVar()
         self.max_jmps_VAR        = tk.IntVar()
+        self.word_size_VAR       = tk.StringVar()
+        self.overflow_mode_VAR   = tk.StringVar()
         self.auto_shift_addresses_VAR = tk.BooleanVar()
+        self.auto_shift_operands_VAR = tk.BooleanVar()
         self.closing_unsaved_VAR = tk.StringVar()
         self.dev_mode_VAR        = tk.BooleanVar()
-        self.set_option_vars()
-        self.init_state = {
-            "theme":           self.gt_theme(),
-            "language":        ph.language(),
-            "code_font_face":  ph.code_font_face(),
-            "code_font_size":  self.code_font_size_VAR.get(),
-            "min_adr_len":     self.min_adr_len_VAR.get(),
-            "max_cels":        self.max_cels_VAR.get(),
-            "max_jmps":        self.max_jmps_VAR.get(),
-            "auto_shift_addresses": self.auto_shift_addresses_VAR.get(),
-            "closing_unsaved": ph.closing_unsaved(),
-            "dev_mode":        self.dev_mode_VAR.get()
-        }
-        super().open()
     
     def gt_theme(self):
         if self.is_light_theme_VAR.get():
@@ -167,6 +193,17 @@ class Options(Subwindow):
         self.max_jmps_LBL = ttk.Label(self.max_jmps_FRM, style="TLabel", text=lh.opt_win("MaxJmps"))
         self.max_jmps_SBX = wdg.Spinbox(self.max_jmps_FRM, self.subroot, textvariable=self.max_jmps_VAR, min=1,
                                         max=1048576, default=self.max_jmps_VAR.get(), threshold=1, height=23)
+        self.word_size_FRM = ttk.Frame(self.options_FRM, style="text.TFrame")
+        self.word_size_LBL = ttk.Label(self.word_size_FRM, style="TLabel", text=lh.opt_win("WordSize"))
+        self.word_size_OMN = wdg.OptionMenu(self.word_size_FRM, textvariable=self.word_size_VAR,
+                                            default_option=str(ph.word_size()),
+                                            options=lh.opt_win("WordSizeOptions"), style="TMenubutton")
+        self.word_size_TIP = wdg.Tooltip(self.word_size_LBL, text=lh.opt_win("WordSizeTip"))
+        self.overflow_mode_FRM = ttk.Frame(self.options_FRM, style="text.TFrame")
+        self.overflow_mode_LBL = ttk.Label(self.overflow_mode_FRM, style="TLabel", text=lh.opt_win("OverflowMode"))
+        self.overflow_mode_OMN = wdg.OptionMenu(self.overflow_mode_FRM, textvariable=self.overflow_mode_VAR,
+                                                default_option=ph.overflow_mode(),
+                                                options=lh.opt_win("OverflowModeOptions"), style="TMenubutton")
         self.auto_shift_addresses_CHB = ttk.Checkbutton(self.options_FRM, style="embedded.TCheckbutton",
                                                        text=lh.opt_win("AutoShiftAddresses"),
                                                        variable=self.auto_shift_addresses_VAR, onvalue=True,
@@ -175,6 +212,14 @@ class Options(Subwindow):
             self.auto_shift_addresses_CHB.state(["!alternate"])
         self.auto_shift_addresses_TIP = wdg.Tooltip(self.auto_shift_addresses_CHB,
                                                    text=lh.opt_win("AutoShiftAddressesTip"))
+        self.auto_shift_operands_CHB = ttk.Checkbutton(self.options_FRM, style="embedded.TCheckbutton",
+                                                      text=lh.opt_win("AutoShiftOperands"),
+                                                      variable=self.auto_shift_operands_VAR, onvalue=True,
+                                                      offvalue=False)
+        if not self.auto_shift_operands_VAR.get():
+            self.auto_shift_operands_CHB.state(["!alternate"])
+        self.auto_shift_operands_TIP = wdg.Tooltip(self.auto_shift_operands_CHB,
+                                                  text=lh.opt_win("AutoShiftOperandsTip"))
         self.seperator1_FRM.pack(anchor="center", fill="x", pady=5, padx=10)
         self.assembler_subtitle_LBL.pack(fill="x", pady=5, padx=10)
         self.min_adr_len_FRM.pack(fill="x",             padx=(20, 5))
@@ -186,7 +231,14 @@ class Options(Subwindow):
         self.max_jmps_FRM   .pack(fill="x",     padx=(20, 5))
         self.max_jmps_LBL   .pack(side="left",  pady=5, padx=(0, 15))
         self.max_jmps_SBX   .pack(side="right", pady=5, padx=5)
+        self.word_size_FRM  .pack(fill="x",     padx=(20, 5))
+        self.word_size_LBL  .pack(side="left",  pady=5, padx=(0, 15))
+        self.word_size_OMN  .pack(side="right", pady=5, padx=5)
+        self.overflow_mode_FRM.pack(fill="x",   padx=(20, 5))
+        self.overflow_mode_LBL.pack(side="left",  pady=5, padx=(0, 15))
+        self.overflow_mode_OMN.pack(side="right", pady=5, padx=5)
         self.auto_shift_addresses_CHB.pack(fill="x", pady=5, padx=(20, 5))
+        self.auto_shift_operands_CHB.pack(fill="x", pady=5, padx=(20, 5))
         
         # File
         
@@ -252,11 +304,18 @@ class Options(Subwindow):
         self.min_adr_len_VAR    .set(value=ph.min_adr_len())
         self.max_cels_VAR       .set(value=ph.max_cels())
         self.max_jmps_VAR       .set(value=ph.max_jmps())
+        # have language dependent displaytexts
+        self.word_size_VAR      .set(value=lh.opt_win("WordSizeOptions")[str(ph.word_size())])
+        self.overflow_mode_VAR  .set(value=lh.opt_win("OverflowModeOptions")[ph.overflow_mode()])
         self.auto_shift_addresses_VAR.set(value=ph.auto_shift_addresses())
+        self.auto_shift_operands_VAR.set(value=ph.auto_shift_operands())
         # has language dependent displaytext
         self.closing_unsaved_VAR.set(value=lh.opt_win("ClosingUnsavedOptions")[ph.closing_unsaved()])
         self.dev_mode_VAR       .set(value=ph.dev_mode())
     
+    def refresh(self):
+        self.update_on_restart_required_change()
+    
     def restart_required_flag(self):
         return (self.ed.active_theme    != self.current_state("theme") or
                 self.ed.active_language != self.current_state("language"))
@@ -271,6 +330,7 @@ class Options(Subwindow):
     
     def restart(self):
         self.save()
+        ph.flush()  # the new instance has to read the saved options
         self.ed.destroy()
         os.startfile(self.ed.root_dir / "Assemblitor.pyw")
     
@@ -289,8 +349,10 @@ class Options(Subwindow):
         return self.init_state[option] != self.current_state(option)
     
     def current_state(self, option: str):
-        if option == "language" or option == "code_font_face" or option == "closing_unsaved":
+        if option in ("language", "code_font_face", "closing_unsaved", "overflow_mode"):
             return getattr(self, f"{option}_OMN").current_option()
+        elif option == "word_size":
+            return int(self.word_size_OMN.current_option())  # the options are named by strings
         elif option == "theme":
             return self.gt_theme()
         else:
@@ -305,11 +367,13 @@ class Options(Subwindow):
         self.restart_BTN.config(state="disabled")
     
     def save(self):
-        for option in self.init_state:
-            if self.option_changed(option):
-                ph.save_profile_data(key=option, new_value=self.current_state(option))
-                self.init_state[option] = self.current_state(option)
-                getattr(self, f"save_option_{option}")()  # individual saving methods
+        # write all changed options at once without blocking the dialog on slow disks
+        with ph.transaction(write_behind=True):
+            for option in self.init_state:
+                if self.option_changed(option):
+                    ph.save_profile_data(key=option, new_value=self.current_state(option))
+                    self.init_state[option] = self.current_state(option)
+                    getattr(self, f"save_option_{option}")()  # individual saving methods
     
     def save_option_theme(self):
         pass
@@ -332,15 +396,25 @@ class Options(Subwindow):
     def save_option_max_jmps(self):
         emu.update_properties()
     
+    def save_option_word_size(self):
+        emu.update_properties()
+    
+    def save_option_overflow_mode(self):
+        emu.update_properties()
+    
     def save_option_auto_shift_addresses(self):
         # Update emulator or other components if needed
         emu.update_properties()
-
+    
+    def save_option_auto_shift_operands(self):
+        pass
+    
     def save_option_closing_unsaved(self):
         self.ed.action_on_closing_unsaved_prg = self.current_state("closing_unsaved")
     
     def save_option_dev_mode(self):
         self.ed.dev_mode = self.dev_mode_VAR.get()
+        self.ed.update_perf_overlay()
 
 
 class Assembly(Subwindow):
@@ -370,7 +444,7 @@ class Assembly(Subwindow):
         super().build_gui()
     
     def set_code_font(self):
-        if self.active:
+        if self.built:
             self.text_TXT.tag_config("asm_code", font=ph.code_font())
 
 
@@ -422,3 +496,38 @@ class About(Subwindow):
         self.icon_LBL .pack(side="left",  padx=5, pady=5, anchor="center", )
         self.text_TXT .pack(side="right", padx=5, pady=5)
         super().build_gui()
+
+
+class Performance(Subwindow):  # timings of the last runs, only reachable in developer mode
+    
+    def build_gui(self):
+        self.subroot = tk.Toplevel(self.ed.root)
+        self.subroot.geometry(lh.prf_win("geometry"))
+        self.subroot.config(bg=self.ed.theme_base_bg)
+        self.subroot.title(lh.prf_win("title"))
+        
+        self.performance_FRM = ttk.Frame(self.subroot, style="TFrame")
+        self.text_BAR = tk.Scrollbar(self.performance_FRM)
+        self.text_TXT = tk.Text(self.performance_FRM, bg=self.ed.theme_text_bg, fg=self.ed.theme_text_fg, bd=5,
+                                relief="flat", wrap="none", font=ph.code_font(), yscrollcommand=self.text_BAR.set)
+        self.performance_FRM.pack(fill="both", expand=True)
+        self.text_TXT.pack(side="left",  fill="both", expand=True)
+        self.text_BAR.pack(side="right", fill="y")
+        self.text_BAR.config(command=self.text_TXT.yview)
+        self.text_TXT.tag_config("header", font=ph.code_font() + ("bold",))
+        self.refresh()
+        super().build_gui()
+    
+    def refresh(self):
+        columns = lh.prf_win("columns")  # {record key: column title}
+        widths = {key: max(len(title), 10) for key, title in columns.items()}
+        lines = []
+        for record in reversed(self.ed.perf_history):  # newest run first
+            formatted = prf.format_run_record(record)
+            lines.append("  ".join(f"{formatted[key]:>{widths[key]}}" for key in columns))
+        self.text_TXT.config(state="normal")
+        self.text_TXT.delete("1.0", "end")
+        self.text_TXT.insert("1.0", "  ".join(f"{title:>{widths[key]}}" for key, title in columns.items()) + "\n",
+                             "header", "\n".join(lines))
+        self.text_TXT.config(state="disabled")
+
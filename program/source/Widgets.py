@@ -2,6 +2,8 @@ import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.scrolledtext as st
 import string
+import threading
+import itertools as it
 from typing import Literal
 
 from program.source import Emulator as emu
@@ -45,6 +47,10 @@ class CodeBlock(tk.Frame):
 
 class OutCodeBlock(CodeBlock):
     
+    # only a window of the output is inserted into the Text widget so that huge programs display as fast as small ones
+    WINDOW_LINES = 400  # maximum number of lines inside the Text widget
+    WINDOW_MARGIN = 100  # lines kept above and below the visible lines before the window gets moved
+    
     def __init__(self, root, editor):
         super().__init__(root, editor)
         self.TXT.tag_config("code", foreground=self.ed.theme_text_fg)  # "fg" is an invalid argument
@@ -53,50 +59,140 @@ class OutCodeBlock(CodeBlock):
         self.TXT.tag_config("active_code", foreground=self.ed.theme_accent_color)
         self.TXT.tag_config("error", foreground=self.ed.theme_error_color, wrap="word")
         self.error_expanded = False
-        self.TXT.config(state="disabled")
+        self.displayed_runs = None  # (text, tag) runs of the displayed output, None if something else is displayed
+        self.lines = None  # line index of the displayed output: one list of (text, tag) runs per line
+        self.window_first = 0  # first line of self.lines that is inside the Text widget
+        self.window_last = 0  # line after the last line of self.lines that is inside the Text widget
+        self.top_line = 0  # first visible line of self.lines
+        self.visible_lines = 30  # gets updated as soon as the Text widget reports its scroll position
+        self.recenter_job = None
+        self.TXT.config(yscrollcommand=self.on_txt_yscroll, state="disabled")
+        self.y_BAR.config(command=self.on_bar_yview)
     
     def append_text(self, text, tag):
+        self.displayed_runs = None
+        self.lines = None
         self.TXT.config(state="normal")
         self.TXT.insert("insert", text, tag)
         self.TXT.config(state="disabled")
     
     def clear_text(self):
+        self.displayed_runs = None
+        self.lines = None
         self.TXT.config(state="normal")
         self.TXT.delete("1.0", "end")
         self.TXT.config(state="disabled")
     
     def display_output(self, code_section1, active_code, code_section2):
-        self.clear_text()
-        self.error_expanded = False
-        self.append_text_with_comments(code_section1, "code")
+        runs = []
+        self.add_runs_with_comments(runs, code_section1, "code")
         if active_code:
-            self.append_text_with_comments(active_code, "active_code")
-            self.TXT.yview_moveto(1)  # jumps to current command
-        self.append_text_with_comments(code_section2, "code")
-    
-    def append_text_with_comments(self, text, tag):
-        """Append text and highlight comments in dark green"""
+            self.add_runs_with_comments(runs, active_code, "active_code")
+        self.add_runs_with_comments(runs, code_section2, "code")
+        # merge neighbouring runs of the same tag to keep the number of arguments small
+        runs = [("".join(text for text, _ in group), tag) for tag, group in it.groupby(runs, key=lambda run: run[1])]
+        if runs != self.displayed_runs:  # skip redrawing an identical output
+            self.clear_text()
+            self.error_expanded = False
+            self.lines = self.split_runs_into_lines(runs)
+            self.displayed_runs = runs
+            self.insert_window(0)
+        if active_code:
+            # jumps to current command
+            active_line = code_section1.count("\n")
+            self.scroll_to_line(active_line - self.visible_lines // 2)
+    
+    def split_runs_into_lines(self, runs):
+        lines = [[]]
+        for text, tag in runs:
+            line_strs = text.split("\n")
+            if line_strs[0]:
+                lines[-1].append((line_strs[0], tag))
+            for line_str in line_strs[1:]:
+                lines.append([(line_str, tag)] if line_str else [])
+        return lines
+    
+    def insert_window(self, first_line):
+        """Replace the content of the Text widget with the lines of the window that starts at first_line"""
+        self.window_first = max(0, min(first_line, len(self.lines) - self.WINDOW_LINES))
+        self.window_last = min(len(self.lines), self.window_first + self.WINDOW_LINES)
+        args = []
+        for i in range(self.window_first, self.window_last):
+            if i > self.window_first:
+                args += ("\n", "")
+            for run in self.lines[i]:
+                args += run
+        xview = self.TXT.xview()[0]
         self.TXT.config(state="normal")
-        lines = text.split('\n')
-        for i, line in enumerate(lines):
+        self.TXT.delete("1.0", "end")
+        if args:
+            # a single insert with alternating text and tag arguments instead of one insert per line
+            self.TXT.insert("end", *args)
+        self.TXT.config(state="disabled")
+        self.TXT.xview_moveto(xview)
+    
+    def is_virtual(self):
+        return self.lines is not None and len(self.lines) > self.WINDOW_LINES
+    
+    def scroll_to_line(self, top_line):
+        if self.lines is None:
+            return
+        top_line = max(0, min(top_line, len(self.lines) - self.visible_lines))
+        if (top_line - self.WINDOW_MARGIN < self.window_first and self.window_first > 0 or
+                top_line + self.visible_lines + self.WINDOW_MARGIN > self.window_last and
+                self.window_last < len(self.lines)):
+            self.insert_window(top_line - (self.WINDOW_LINES - self.visible_lines) // 2)
+        self.TXT.yview(f"{top_line - self.window_first + 1}.0")
+    
+    def on_bar_yview(self, *args):
+        if not self.is_virtual():
+            self.TXT.yview(*args)
+            return
+        if args[0] == "moveto":
+            top_line = int(float(args[1]) * len(self.lines))
+        elif args[2] == "pages":
+            top_line = self.top_line + int(args[1]) * self.visible_lines
+        else:
+            top_line = self.top_line + int(args[1])
+        self.scroll_to_line(top_line)
+    
+    def on_txt_yscroll(self, first, last):
+        if not self.is_virtual():
+            self.y_BAR.set(first, last)
+            return
+        # translate the scroll position inside the window into a position inside the whole output
+        window_len = self.window_last - self.window_first
+        top = self.window_first + float(first) * window_len
+        bottom = self.window_first + float(last) * window_len
+        self.top_line = int(top)
+        self.visible_lines = max(1, round(bottom - top))
+        self.y_BAR.set(top / len(self.lines), bottom / len(self.lines))
+        # e.g. the mouse wheel scrolls the Text widget directly, so the window has to follow
+        if (self.top_line - self.window_first < self.WINDOW_MARGIN // 2 and self.window_first > 0 or
+                self.window_last - self.top_line - self.visible_lines < self.WINDOW_MARGIN // 2 and
+                self.window_last < len(self.lines)):
+            if self.recenter_job is None:
+                self.recenter_job = self.TXT.after_idle(self.recenter_window)
+    
+    def recenter_window(self):
+        self.recenter_job = None
+        if self.is_virtual():
+            top_line = self.top_line
+            self.insert_window(top_line - (self.WINDOW_LINES - self.visible_lines) // 2)
+            self.TXT.yview(f"{top_line - self.window_first + 1}.0")
+    
+    def add_runs_with_comments(self, runs, text, tag):
+        """Append (text, tag) runs to runs with comments tagged to be highlighted in dark green"""
+        for i, line in enumerate(text.split("\n")):
             if i > 0:
-                self.TXT.insert("insert", "\n", tag)
-            
+                runs.append(("\n", tag))
             # Split line at comment marker (;)
-            if ';' in line:
-                parts = line.split(';', 1)
-                code_part = parts[0]
-                comment_part = ';' + parts[1]
-                
-                # Insert code part with original tag
-                self.TXT.insert("insert", code_part, tag)
-                # Insert comment part with comment tag
-                self.TXT.insert("insert", comment_part, "comment")
-            else:
-                # No comment, insert whole line
-                self.TXT.insert("insert", line, tag)
-        
-        self.TXT.config(state="disabled")
+            if ";" in line:
+                code_part, comment_part = line.split(";", 1)
+                runs.append((code_part, tag))
+                runs.append((";" + comment_part, "comment"))
+            elif line:
+                runs.append((line, tag))
     
     def display_error(self, exception_message, prg_state=None):
         self.clear_text()
@@ -142,10 +238,51 @@ class OutCodeBlock(CodeBlock):
 
 class InpCodeBlock(CodeBlock):
     
+    FULL_RESCAN_LINES = 500  # edits spanning more lines than this (e.g. large pastes) rehighlight the whole text
+    HIGHLIGHT_DELAY = 50  # ms without edits before the dirty lines get retagged
+    HIGHLIGHT_CHUNK_LINES = 500  # lines retagged per event loop turn during a full rescan
+    HASH_MASK = 2 ** 64 - 1
+    LOAD_CHUNK_CHARS = 2 ** 18  # files larger than this are loaded in chunks of this size, see load_file()
+    SYNTAX_TAGS = ("address", "command", "value", "direct_opr", "indirect_opr", "absolute_opr", "invalid", "comment")
+    
     def __init__(self, root, editor):
         super().__init__(root, editor, undo=True)
         self.already_modified = False
+        self.dirty_lines = None  # (first_line, last_line) of all edits since the last highlighting pass
+        self.full_rescan_flag = False
+        self.highlight_job = None
+        self.rescan_job = None
+        self.rescan_line = None  # next line of a running full rescan
+        # dirty state tracking without comparing the whole text on every keystroke
+        self.edit_generation = 0  # increases with every edit
+        self.content_hash = 0  # order independent sum of all line hashes, updated with every edit
+        self.line_count = 1
+        self.saved_generation = 0
+        self.saved_hash = None
+        # chunked loading of large files
+        self.load_file_obj = None
+        self.load_job = None
+        self.load_chunks = []
+        self.load_chars = 0
+        self.load_generation = 0  # edit_generation after the last loaded chunk, to notice edits while loading
+        self.load_edited_flag = False
+        self.load_on_done = None
+        self.load_progress_BAR = ttk.Progressbar(self, orient="horizontal", mode="determinate")
+        self.create_edit_tracker()
+        self.recompute_content_hash()
+        self.mark_saved()
+        self.validator = Validator(self)
         
+        # syntax highlighting
+        self.TXT.tag_config("address",      foreground=self.ed.theme_address_color)
+        self.TXT.tag_config("command",      foreground=self.ed.theme_command_color)
+        self.TXT.tag_config("value",        foreground=self.ed.theme_value_color)
+        self.TXT.tag_config("direct_opr",   foreground=self.ed.theme_operand_color)
+        self.TXT.tag_config("indirect_opr", foreground=self.ed.theme_operand_color)
+        self.TXT.tag_config("absolute_opr", foreground=self.ed.theme_value_color)
+        self.TXT.tag_config("invalid",      foreground=self.ed.theme_error_color)
+        # set by the live validation on the memory cell that would make running the program fail
+        self.TXT.tag_config("validation_error", underline=True)
         # Configure comment tag with dark green color
         self.TXT.tag_config("comment", foreground="#228B22")  # Dark green
         
@@ -169,6 +306,80 @@ class InpCodeBlock(CodeBlock):
         self.TXT.bind(sequence="<BackSpace>", func=lambda event: self.on_backspace())
         self.TXT.bind(sequence="<Delete>", func=lambda event: self.on_delete())
     
+    def create_edit_tracker(self):
+        """Route the Tcl command of the Text widget through track_edit() to learn which lines every edit touches"""
+        self.txt_cmd = self.TXT._w + "_orig"
+        self.TXT.tk.call("rename", self.TXT._w, self.txt_cmd)
+        self.TXT.tk.createcommand(self.TXT._w, self.track_edit)
+    
+    def track_edit(self, *args):
+        if args and args[0] in ("insert", "delete", "replace"):
+            end_line = self.gt_line(self.TXT.tk.call(self.txt_cmd, "index", "end-1c"))
+            # "end" lies on the line behind the last one
+            first_line = min(self.gt_line(self.TXT.tk.call(self.txt_cmd, "index", args[1])), end_line)
+            if args[0] == "insert":
+                last_line = first_line
+            else:
+                end_index = args[2] if len(args) > 2 else f"{args[1]}+1c"
+                last_line = self.gt_line(self.TXT.tk.call(self.txt_cmd, "index", end_index))
+            last_line = max(first_line, min(last_line, end_line))
+            old_lines_hash = self.gt_lines_hash(first_line, last_line)
+            result = self.TXT.tk.call((self.txt_cmd,) + args)
+            self.line_count = self.gt_line(self.TXT.tk.call(self.txt_cmd, "index", "end-1c"))
+            line_delta = self.line_count - end_line
+            # only the touched lines are rehashed, so this is independent of the length of the text
+            new_lines_hash = self.gt_lines_hash(first_line, max(first_line, last_line + line_delta))
+            self.content_hash = (self.content_hash - old_lines_hash + new_lines_hash) & self.HASH_MASK
+            self.edit_generation += 1
+            self.add_dirty_lines(first_line, line_delta)
+            return result
+        if len(args) > 1 and args[0] == "edit" and args[1] in ("undo", "redo"):
+            # Tk applies the changes of its undo stack internally without passing the commands above
+            result = self.TXT.tk.call((self.txt_cmd,) + args)
+            self.recompute_content_hash()
+            self.edit_generation += 1
+            self.full_rescan_flag = True
+            return result
+        return self.TXT.tk.call((self.txt_cmd,) + args)
+    
+    def gt_lines_hash(self, first_line, last_line):
+        lines = self.TXT.tk.call(self.txt_cmd, "get", f"{first_line}.0", f"{last_line}.end").split("\n")
+        return sum(hash(line) for line in lines) & self.HASH_MASK
+    
+    def recompute_content_hash(self):
+        self.line_count = self.gt_line(self.TXT.tk.call(self.txt_cmd, "index", "end-1c"))
+        self.content_hash = self.gt_lines_hash(1, self.line_count)
+    
+    def mark_saved(self):
+        """Remember the current text as the saved state for is_dirty()"""
+        self.saved_generation = self.edit_generation
+        self.saved_hash = self.content_hash, self.line_count
+    
+    def is_dirty(self):
+        if self.edit_generation == self.saved_generation:
+            return False
+        if (self.content_hash, self.line_count) != self.saved_hash:
+            return True
+        # hashes match, so the text most likely got reverted to the saved state
+        return self.ed.init_inp != self.gt_input()
+    
+    def add_dirty_lines(self, first_line, line_delta):
+        last_line = first_line + max(line_delta, 0)
+        if self.dirty_lines:
+            # lines of earlier edits that lie behind this edit moved up or down
+            old_first, old_last = (line if line <= first_line else max(first_line, line + line_delta)
+                                   for line in self.dirty_lines)
+            first_line, last_line = min(first_line, old_first), max(last_line, old_last)
+        if last_line - first_line > self.FULL_RESCAN_LINES:
+            self.full_rescan_flag = True
+        self.dirty_lines = first_line, last_line
+        if self.rescan_line and first_line < self.rescan_line:
+            # keep a running full rescan from skipping lines that moved in front of it
+            self.rescan_line = max(first_line, self.rescan_line + line_delta)
+    
+    def gt_line(self, index):
+        return int(str(index).split(".")[0])
+    
     def redo(self):
         try:
             self.TXT.edit_redo()
@@ -197,10 +408,10 @@ class InpCodeBlock(CodeBlock):
         if not self.is_auto_shift_enabled():
             self.TXT.insert("insert", "\n")
             return
-
+        
         # Get the current line content
         current_line = self.TXT.get("insert linestart", "insert lineend")
-
+        
         # Extract the last address and increment it
         try:
             last_address = int(current_line.strip())
@@ -209,7 +420,7 @@ class InpCodeBlock(CodeBlock):
             # If the line doesn't contain a valid address, just insert a newline
             self.TXT.insert("insert", "\n")
             return
-
+        
         # Insert the next address and a newline
         self.TXT.insert("insert", f"\n{next_address}")
     
@@ -228,13 +439,17 @@ class InpCodeBlock(CodeBlock):
     def on_inp_modified(self):
         if not self.already_modified:  # because somehow on_inp_modified always gets called twice
             self.TXT.edit_modified(False)
-            if self.ed.init_inp == self.TXT.get(1.0, "end-1c"):
-                # checks if code got reverted to last saved instance (to avoid pointless ask-to-save'ing)
-                self.ed.set_dirty_flag(False)
+            # checks if code got reverted to last saved instance (to avoid pointless ask-to-save'ing)
+            if self.is_loading():
+                # only edits of the user count, chunks catch up with load_generation; load_file() does the rest
+                if self.edit_generation != self.load_generation:
+                    self.load_edited_flag = True
+                    self.ed.set_dirty_flag(True)
             else:
-                self.ed.set_dirty_flag(True)
-            # Highlight comments in real-time
-            self.highlight_comments()
+                self.ed.set_dirty_flag(self.is_dirty())
+                # bursts of typing only cause one highlighting pass
+                self.schedule_highlighting()
+                self.validator.schedule()
             self.already_modified = True
         else:
             self.already_modified = False
@@ -272,31 +487,70 @@ class InpCodeBlock(CodeBlock):
         
         return None  # Let the default delete behavior happen
     
+    def is_operand_shift_enabled(self):
+        """Check if operands pointing to shifted addresses should be shifted as well"""
+        try:
+            from program.source import Editor as ed_module
+            return ed_module.ph.auto_shift_operands()
+        except:
+            return False
+    
     def shift_addresses_on_delete(self, deleted_line):
         """Shift all addresses after deleted line down by -1"""
         try:
-            last_line_index = int(self.TXT.index("end-1c").split('.')[0])
-            
-            # Shift all lines after the deleted line
-            for ln in range(deleted_line, last_line_index + 1):
-                line_start = f"{ln}.0"
-                line_end = f"{ln}.end"
-                line = self.TXT.get(line_start, line_end)
-                
-                if not line.strip():
-                    continue
-                
-                cell, comment = emu.split_cell_at_comment(line)
-                if cell.strip():
-                    # Decrement address by 1
-                    new_cell = self.change_adr(cell, -1)
-                    # Only rewrite if address actually changed
-                    if new_cell != cell:
-                        self.TXT.delete(line_start, line_end)
-                        self.TXT.insert(line_start, new_cell + comment)
+            shift_oprs_flag = self.is_operand_shift_enabled()
+            # operands in front of the deleted line can point to shifted cells as well
+            first_line = 1 if shift_oprs_flag else deleted_line
+            old_text = self.TXT.get(f"{first_line}.0", "end-1c")
+            new_text = self.shift_addresses(old_text, deleted_line - first_line, shift_oprs_flag)
+            if new_text == old_text:
+                return
+            # only replace from the first changed line on
+            old_lines = old_text.split("\n")
+            new_lines = new_text.split("\n")
+            i = 0
+            while old_lines[i] == new_lines[i]:
+                i += 1
+            insert_idx = self.TXT.index("insert")
+            yview = self.TXT.yview()[0]
+            # a single replace that is undone in one step instead of a delete and insert per line
+            self.TXT.config(autoseparators=False)
+            self.TXT.edit_separator()
+            self.TXT.replace(f"{first_line + i}.0", "end-1c", "\n".join(new_lines[i:]))
+            self.TXT.edit_separator()
+            self.TXT.config(autoseparators=True)
+            self.TXT.mark_set("insert", insert_idx)  # the number of lines didn't change, so the index is still valid
+            self.TXT.yview_moveto(yview)
         except Exception:
             # Keep silent on any unexpected error to not break deletion
-            pass
+            self.TXT.config(autoseparators=True)
+    
+    def shift_addresses(self, text, first_shifted_line, shift_oprs_flag=False):
+        """Return text with the addresses of all lines from first_shifted_line on decremented by 1"""
+        lines = text.split("\n")
+        shifted_adrs = set()
+        for i in range(first_shifted_line, len(lines)):
+            cell, comment = emu.split_cell_at_comment(lines[i])
+            if cell.strip():
+                new_cell = self.change_adr(cell, -1)
+                if new_cell != cell:
+                    lines[i] = new_cell + comment
+                    adr = self.gt_tok_int(cell, "address")
+                    if adr is not None:
+                        shifted_adrs.add(adr)
+        if shift_oprs_flag and shifted_adrs:
+            for i in range(len(lines)):
+                cell, comment = emu.split_cell_at_comment(lines[i])
+                opr = self.gt_tok_int(cell, "direct_opr", "indirect_opr")
+                if opr in shifted_adrs:
+                    lines[i] = self.change_opr(cell, -1) + comment
+        return "\n".join(lines)
+    
+    def gt_tok_int(self, cell, *kinds):
+        for start, end, kind in emu.lex_line(cell):
+            if kind in kinds:
+                return int(cell[start:end].strip("()"))
+        return None
     
     def increment_selected_text(self):
         self.change_selected_text(change=int(self.ed.chng_SBX.gt()))
@@ -334,7 +588,7 @@ class InpCodeBlock(CodeBlock):
         return new_text[:-1]  # :-1 to remove line break from last line
     
     def change_adr(self, cell, change):
-        tok_strs = emu.Cell.split_cel_str(self=None, cel_str_unstripped=cell)
+        tok_strs = emu.split_cel_str(cell)
         cell_rest = "".join(tok_strs[1:])
         adr_str = tok_strs[0]
         i = 0
@@ -355,7 +609,7 @@ class InpCodeBlock(CodeBlock):
         return cell
     
     def change_opr(self, cell, change):
-        tok_strs = emu.Cell.split_cel_str(self=None, cel_str_unstripped=cell)
+        tok_strs = emu.split_cel_str(cell)
         cell_rest = "".join(tok_strs[:-1])
         opr_str = tok_strs[-1]
         i = len(opr_str) - 1
@@ -395,25 +649,215 @@ class InpCodeBlock(CodeBlock):
         return self.TXT.get(1.0, "end-1c")
     
     def st_input(self, inp_str: str):
+        self.cancel_loading()
         self.TXT.delete("1.0", "end")
         self.TXT.insert("insert", inp_str)
-        # Highlight all comments in the input
-        self.highlight_comments()
-    
-    def highlight_comments(self):
-        """Scan entire text and apply comment tag to all comments (lines starting with ;)"""
-        self.TXT.tag_remove("comment", "1.0", "end")
-        content = self.TXT.get("1.0", "end-1c")
-        lines = content.split('\n')
-        
-        for line_num, line in enumerate(lines, 1):
-            if ';' in line:
-                # Find the position of the comment marker
-                comment_start = line.find(';')
-                # Calculate the index: line_num.comment_start
-                start_idx = f"{line_num}.{comment_start}"
-                end_idx = f"{line_num}.end"
-                self.TXT.tag_add("comment", start_idx, end_idx)
+        self.highlight_all()
+    
+    def load_file(self, file, size, on_done=None):
+        """
+        Stream the opened text file into the Text widget in chunks from the event loop and close it afterwards.
+        
+        The part that is already loaded can be scrolled and edited, only the visible lines get highlighted until the
+        file is complete. on_done(file_str) gets called with the content of the file once it is loaded.
+        """
+        self.cancel_loading()
+        self.TXT.delete("1.0", "end")
+        self.TXT.config(undo=False)  # undoing single chunks would leave half of the file
+        self.TXT.mark_set("load_end", "end-1c")
+        self.TXT.mark_gravity("load_end", "right")  # stays behind every inserted chunk
+        self.load_file_obj = file
+        self.load_chunks = []
+        self.load_chars = 0
+        self.load_generation = self.edit_generation
+        self.load_edited_flag = False
+        self.load_on_done = on_done
+        self.load_progress_BAR.config(maximum=max(size, 1), value=0)
+        self.load_progress_BAR.grid(row=2, column=0, columnspan=2, sticky="EW")
+        self.load_job = self.TXT.after_idle(self.continue_loading)
+    
+    def continue_loading(self):
+        if self.edit_generation != self.load_generation:
+            self.load_edited_flag = True
+            self.ed.set_dirty_flag(True)  # in case the <<Modified>> event of the edit comes after the next chunk
+        try:
+            chunk = self.load_file_obj.read(self.LOAD_CHUNK_CHARS)
+        except Exception:  # e.g. UnicodeDecodeError; keeps what was loaded so far
+            self.stop_loading()
+            raise
+        if not chunk:
+            self.finish_loading()
+            return
+        self.load_chunks.append(chunk)
+        self.load_chars += len(chunk)
+        self.TXT.insert("load_end", chunk)
+        self.load_generation = self.edit_generation
+        self.load_progress_BAR.config(value=self.load_chars)  # characters instead of bytes, close enough for UTF-8
+        self.highlight_visible()
+        self.load_job = self.TXT.after(1, self.continue_loading)
+    
+    def finish_loading(self):
+        file_str = "".join(self.load_chunks)
+        on_done = self.load_on_done
+        self.stop_loading()
+        if self.load_edited_flag:
+            # the text differs from the file, so the file content is the saved state instead of the current text
+            lines = file_str.split("\n")
+            self.saved_hash = sum(hash(line) for line in lines) & self.HASH_MASK, len(lines)
+            self.saved_generation = -1
+        else:
+            self.mark_saved()
+        self.highlight_all()
+        self.validator.schedule()
+        if on_done:
+            on_done(file_str)
+    
+    def cancel_loading(self):
+        if self.is_loading():
+            self.stop_loading()
+    
+    def stop_loading(self):
+        self.TXT.after_cancel(self.load_job)
+        self.load_job = None
+        self.load_file_obj.close()
+        self.load_file_obj = None
+        self.load_chunks = []
+        self.load_on_done = None
+        self.TXT.mark_unset("load_end")
+        self.TXT.edit_reset()
+        self.TXT.config(undo=True)
+        self.load_progress_BAR.grid_remove()
+    
+    def is_loading(self):
+        return self.load_job is not None
+    
+    def schedule_highlighting(self):
+        if self.highlight_job:
+            self.TXT.after_cancel(self.highlight_job)
+        self.highlight_job = self.TXT.after(self.HIGHLIGHT_DELAY, self.highlight_dirty_lines)
+    
+    def highlight_dirty_lines(self):
+        """Only rehighlight the lines touched since the last pass; keeps typing latency independent of file length"""
+        self.highlight_job = None
+        if self.dirty_lines is None or self.full_rescan_flag:
+            # edits that bypassed the edit tracker (e.g. Tk's undo stack) can't be located, so rescan everything
+            self.highlight_all()
+        else:
+            first_line, last_line = self.dirty_lines
+            self.dirty_lines = None
+            self.highlight_lines(first_line, last_line)
+    
+    def highlight_all(self):
+        """Rehighlight the whole text in chunks from the event loop so that large files never block typing"""
+        self.dirty_lines = None
+        self.full_rescan_flag = False
+        self.highlight_visible()  # the visible lines don't have to wait for the rescan to reach them
+        self.rescan_line = 1
+        if self.rescan_job is None:
+            self.rescan_job = self.TXT.after_idle(self.continue_rescan)
+    
+    def highlight_visible(self):
+        first_line = self.gt_line(self.TXT.index("@0,0"))
+        last_line = self.gt_line(self.TXT.index(f"@0,{self.TXT.winfo_height()}"))
+        self.highlight_lines(first_line, last_line)
+    
+    def continue_rescan(self):
+        end_line = self.gt_line(self.TXT.index("end-1c"))
+        first_line = self.rescan_line
+        last_line = min(first_line + self.HIGHLIGHT_CHUNK_LINES - 1, end_line)
+        self.highlight_lines(first_line, last_line)
+        if last_line < end_line:
+            self.rescan_line = last_line + 1
+            self.rescan_job = self.TXT.after(1, self.continue_rescan)
+        else:
+            self.rescan_line = None
+            self.rescan_job = None
+    
+    def highlight_lines(self, first_line, last_line):
+        """Retag addresses, commands, values, operands, invalid tokens and comments from first_line to last_line"""
+        start_idx = f"{first_line}.0"
+        end_idx = f"{last_line}.end"
+        lines = self.TXT.get(start_idx, end_idx).split("\n")
+        tag_ranges = {tag: [] for tag in self.SYNTAX_TAGS}
+        for line_num, line in enumerate(lines, first_line):
+            for start, end, kind in emu.lex_line(line):
+                tag_ranges[kind] += (f"{line_num}.{start}", f"{line_num}.{end}")
+        # one Tk call per tag instead of one per token
+        for tag, ranges in tag_ranges.items():
+            self.TXT.tag_remove(tag, start_idx, end_idx)
+            if ranges:
+                self.TXT.tag_add(tag, *ranges)
+
+
+class Validator:  # used by InpCodeBlock
+    """Parses the input in a background thread after a typing pause and underlines the first erroneous cell"""
+    
+    DELAY = 300  # ms without edits before the input gets validated
+    POLL_INTERVAL = 50  # ms between checks for a finished validation
+    
+    def __init__(self, code_block):
+        self.cdb = code_block
+        self.job = None
+        self.poll_job = None
+        self.request = None  # (edit_generation, prg_str) for the worker thread
+        self.result = None  # (edit_generation, error) from the worker thread, error is None or (line, message)
+        self.error_msg = None
+        self.error_TIP = Tooltip(self.cdb.TXT, text="", tag="validation_error")  # shows error_msg
+        self.condition = threading.Condition()
+        self.worker = threading.Thread(target=self.work, name="Validator", daemon=True)
+        self.worker.start()
+    
+    def schedule(self):
+        if self.job:
+            self.cdb.TXT.after_cancel(self.job)
+        self.job = self.cdb.TXT.after(self.DELAY, self.submit)
+    
+    def submit(self):
+        self.job = None
+        with self.condition:
+            self.request = self.cdb.edit_generation, self.cdb.gt_input()
+            self.condition.notify()
+        if self.poll_job is None:
+            self.poll_job = self.cdb.TXT.after(self.POLL_INTERVAL, self.poll)
+    
+    def work(self):
+        while True:
+            with self.condition:
+                while self.request is None:
+                    self.condition.wait()
+                generation, prg_str = self.request
+                self.request = None
+            try:
+                # validations of outdated input stop as soon as a newer edit arrives
+                error = emu.validate_prg(prg_str, is_cancelled=lambda: self.cdb.edit_generation != generation)
+            except emu.ValidationCancelled:
+                continue
+            with self.condition:
+                self.result = generation, error
+    
+    def poll(self):  # the Tk thread never waits for the worker, it only picks up finished results
+        self.poll_job = None
+        with self.condition:
+            result = self.result
+            self.result = None
+            pending = self.request is not None
+        if result and result[0] == self.cdb.edit_generation:
+            self.display(result[1])
+        elif pending or result is None:
+            self.poll_job = self.cdb.TXT.after(self.POLL_INTERVAL, self.poll)
+    
+    def display(self, error):
+        self.cdb.TXT.tag_remove("validation_error", "1.0", "end")
+        self.error_TIP.on_leave()  # the underlined cell might be gone
+        self.error_msg = None
+        if error:
+            line, self.error_msg = error
+            self.error_TIP.update_text(self.error_msg)
+            if line is not None:
+                line_str = self.cdb.TXT.get(f"{line + 1}.0", f"{line + 1}.end")
+                cel_str = emu.split_cell_at_comment(line_str)[0].rstrip()
+                start = len(cel_str) - len(cel_str.lstrip())
+                self.cdb.TXT.tag_add("validation_error", f"{line + 1}.{start}", f"{line + 1}.{len(cel_str)}")
 
 
 # UNIVERSAL WIDGETS
@@ -721,20 +1165,20 @@ class Slider(tk.Label):  # used by Spinbox
 class Tooltip:
     """
     It creates a tooltip for a given widget as the mouse goes on it.
-
+    
     see:
-
+    
     http://stackoverflow.com/questions/3221956/
            what-is-the-simplest-way-to-make-tooltips-
            in-tkinter/36221216#36221216
-
+    
     http://www.daniweb.com/programming/software-development/
            code/484591/a-tooltip-class-for-tkinter
-
+    
     - Originally written by vegaseat on 2014.09.09.
-
+    
     - Modified to include a delay time by Victor Zaccardo on 2016.03.25.
-
+    
     - Modified
         - to correct extreme right and extreme bottom behavior,
         - to stay inside the screen whenever the tooltip might go out on
@@ -743,11 +1187,11 @@ class Tooltip:
         - to add customizable background color, padding, waittime and
           wraplength on creation
       by Alberto Vassena on 2016.11.05.
-
+    
       Tested on Ubuntu 16.04/16.10, running Python 3.5.2
-
+    
     - Modified slightly by Blyfh
-
+    
     To-Do: themes styles support
     """
     
@@ -757,15 +1201,21 @@ class Tooltip:
                  pad=(5, 3, 5, 3),
                  text='widget info',
                  waittime=600,
-                 wraplength=250):
+                 wraplength=250,
+                 tag=None):
         
         self.waittime = waittime  # in milliseconds, originally 500
         self.wraplength = wraplength  # in pixels, originally 180
         self.widget = widget
         self.text = text
-        self.widget.bind("<Enter>", self.on_enter, add="+")
-        self.widget.bind("<Leave>", self.on_leave, add="+")
-        self.widget.bind("<ButtonPress>", self.on_leave, add="+")
+        if tag:  # only shown while the mouse is on the text of a tag of a tk.Text widget
+            self.widget.tag_bind(tag, "<Enter>", self.on_enter, add="+")
+            self.widget.tag_bind(tag, "<Leave>", self.on_leave, add="+")
+            self.widget.tag_bind(tag, "<ButtonPress>", self.on_leave, add="+")
+        else:
+            self.widget.bind("<Enter>", self.on_enter, add="+")
+            self.widget.bind("<Leave>", self.on_leave, add="+")
+            self.widget.bind("<ButtonPress>", self.on_leave, add="+")
         self.bg = bg
         self.pad = pad
         self.id = None
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from program.source import Headless as hl
+from program.source import Emulator as emu
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+@pytest.fixture(autouse=True)
+def emulator():
+    """Run every test with the limits of the default profile, even if the one before changed them"""
+    hl.startup()
+    yield emu
+    hl.startup()
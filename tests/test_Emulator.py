@@ -0,0 +1,82 @@
+import gc
+import threading
+
+import pytest
+
+from program.source import Emulator as emu
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+def test_gc_paused_overlapping_threads():
+    first_paused = threading.Event()
+    first_ended = threading.Event()
+    enabled = []
+    
+    def pause_first():
+        with emu.gc_paused():
+            first_paused.set()
+            first_ended.wait()
+    
+    thread = threading.Thread(target=pause_first)
+    thread.start()
+    first_paused.wait()
+    with emu.gc_paused():
+        first_ended.set()
+        thread.join()  # the first block ends while the second one is still parsing
+        enabled.append(gc.isenabled())
+    enabled.append(gc.isenabled())
+    assert enabled == [False, True]
+
+
+# "LDA 10 / <command> 11" with the values a in memory cell 10 and b in 11, and the ACC after it got wrapped and after it
+# got saturated, in terms of the smallest and largest value of a word
+OVERFLOW_CASES = {
+    "ADD above max":        lambda lo, hi: (hi, "ADD", 1, lo, hi),
+    "ADD negative":         lambda lo, hi: (lo, "ADD", lo, 0, lo),
+    "SUB below min":        lambda lo, hi: (lo, "SUB", 1, hi, lo),
+    "SUB negative":         lambda lo, hi: (hi, "SUB", lo, -1, hi),
+    "MUL negated min":      lambda lo, hi: (lo, "MUL", -1, lo, hi),
+    "MUL negative":         lambda lo, hi: (hi, "MUL", -2, 2, lo),
+    "DIV min by -1":        lambda lo, hi: (lo, "DIV", -1, lo, hi),
+    "LDA value above max":  lambda lo, hi: (hi + 2, "ADD", 0, lo + 1, hi)  # the value of a cell may be any int
+}
+IN_RANGE_CASES = {
+    "ADD min and max": lambda lo, hi: (lo, "ADD", hi, -1),
+    "SUB to min":      lambda lo, hi: (-1, "SUB", hi, lo),
+    "MUL negated max": lambda lo, hi: (hi, "MUL", -1, -hi),
+    "DIV floors":      lambda lo, hi: (-7, "DIV", 2, -4),
+    "DIV min by 1":    lambda lo, hi: (lo, "DIV", 1, lo)
+}
+
+
+def run_accu(word_size, overflow_mode, a, cmd, b):
+    emu.st_properties(emu.MIN_ADR_LEN, emu.MAX_JMPS, emu.MAX_CELS, word_size, overflow_mode)
+    prg = emu.Program(f"00 LDA 10\n01 {cmd} 11\n02 STA 12\n03 STP\n10 {a}\n11 {b}\n")
+    prg.execute()
+    assert prg.cells[12].toks[1].tok == prg.accu  # stored values are words as well
+    return prg.accu
+
+
+@pytest.mark.parametrize("word_size", [8, 16, 32, 64])
+@pytest.mark.parametrize("case", OVERFLOW_CASES)
+def test_fit_word_overflow(word_size, case):
+    lo, hi = -2 ** (word_size - 1), 2 ** (word_size - 1) - 1
+    a, cmd, b, wrapped, saturated = OVERFLOW_CASES[case](lo, hi)
+    assert run_accu(word_size, "wrap", a, cmd, b) == wrapped
+    assert run_accu(word_size, "saturate", a, cmd, b) == saturated
+    with pytest.raises(Exception, match="overflow"):
+        run_accu(word_size, "trap", a, cmd, b)
+    assert run_accu(0, "wrap", a, cmd, b) not in (wrapped, saturated)  # unbounded
+
+
+@pytest.mark.parametrize("word_size", [8, 16, 32, 64])
+@pytest.mark.parametrize("overflow_mode", ["wrap", "saturate", "trap"])
+@pytest.mark.parametrize("case", IN_RANGE_CASES)
+def test_fit_word_in_range(word_size, overflow_mode, case):
+    a, cmd, b, accu = IN_RANGE_CASES[case](-2 ** (word_size - 1), 2 ** (word_size - 1) - 1)
+    assert run_accu(word_size, overflow_mode, a, cmd, b) == accu
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from program.source import SpecRunner as spr
+from program.source import ResultCache as rc
+from program.source import GradingServer as gs
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+PRG = "00 LDA 05\n01 MUL 06\n02 STA 07\n03 STP\n"
+SPEC = {"cases": {"3 times 4": {"inputs": {5: 3, 6: 4}, "accu": 12, "memory": {7: 12}},
+                  "wrong":     {"inputs": {5: 3, 6: 4}, "accu": 13}}}
+
+
+@pytest.fixture
+def pool(tmp_path):
+    cache = rc.ResultCache(str(tmp_path / "results.sqlite"))
+    pool = gs.GradingPool(1, 30, 10, 64 * 2 ** 20, 4, max_cels=10 ** 9, cache=cache)
+    yield pool
+    pool.stop()
+    cache.close()
+
+
+def test_grades_cases(pool):
+    result = pool.submit({"program": PRG, "spec": SPEC}).result(timeout=30)
+    assert result["status"] == "done"
+    assert [case["status"] for case in result["suite"]["cases"]] == ["passed", "failed"]
+    assert pool.submit({"program": PRG + "; resubmitted", "spec": SPEC}).result(timeout=30)["cached"]
+
+
+def test_memory_error_reaches_worker(monkeypatch):
+    def execute(prg, max_steps=None):
+        raise MemoryError()
+    monkeypatch.setattr(spr.ln, "execute", execute)
+    with pytest.raises(MemoryError):  # worker_main turns it into the memory_limit status
+        spr.run_spec(SPEC, lambda: gs.emu.Program(PRG), "<submission>", "<request>")
+
+
+@pytest.mark.skipif(gs.resource is None or not os.path.exists("/proc/self/statm"), reason="needs RLIMIT_AS")
+def test_memory_limit(pool):
+    job = {"program": "00 LDA #1\n01 STA 5000000\n02 STP\n", "spec": {"cases": {"a": {}}}}
+    result = pool.submit(job).result(timeout=30)
+    assert result["status"] == "memory_limit"
+    stats = pool.gt_stats()
+    assert stats["counts"]["restarts"] == 1
+    assert stats["cache"]["entries"] == 0
+    # the replaced worker grades the next job
+    assert pool.submit({"program": PRG, "spec": SPEC}).result(timeout=30)["status"] == "done"
+
+
+@pytest.mark.parametrize("timeout, cpu_seconds, status", [(1, 30, "timeout"), (30, 1, "cpu_limit")])
+def test_time_limits(timeout, cpu_seconds, status):
+    if status == "cpu_limit" and gs.resource is None:
+        pytest.skip("needs RLIMIT_CPU")
+    pool = gs.GradingPool(1, timeout, cpu_seconds, 64 * 2 ** 20, 4, max_jmps=10 ** 12)
+    try:
+        result = pool.submit({"program": "00 JMP 00\n", "spec": {"cases": {"endless": {}}}}).result(timeout=60)
+        assert result["status"] == status
+        assert pool.gt_stats()["counts"]["restarts"] == 1
+        assert pool.submit({"program": PRG, "spec": SPEC}).result(timeout=30)["status"] == "done"
+    finally:
+        pool.stop()
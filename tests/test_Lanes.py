@@ -0,0 +1,75 @@
+import pytest
+
+from program.source import Lanes as ln
+from program.source import Corpus as crp
+from program.source import Emulator as emu
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+pytestmark = pytest.mark.skipif(ln.np is None, reason="without NumPy run_lanes() runs the input sets one by one")
+
+LANE_COUNT = 2 * ln.MIN_GROUP_LANES
+# programs whose lanes diverge, crash or leave what the arrays can represent, with the cells that get the inputs
+EDGE_PROGRAMS = {
+    # doubles cell 10 until it leaves 64 bits or the jump limit is reached
+    "growing values":   ("00 LDA 10\n01 ADD 10\n02 STA 10\n03 JZE 05\n04 JMP 00\n05 STP\n10 0\n", [10]),
+    # stores into the cell at the address in cell 10, which might be negative or far behind the program
+    "indirect stores":  ("00 LDA #7\n01 STA (10)\n02 LDA (10)\n03 STP\n10 0\n", [10]),
+    # divides by cell 11, which might be zero
+    "division":         ("00 LDA 10\n01 DIV 11\n02 STA 12\n03 STP\n10 0\n11 0\n", [10, 11]),
+    # counts cell 10 down to zero, never stops for negative values
+    "countdown":        ("00 LDA 10\n01 JLE 05\n02 SUB #1\n03 STA 10\n04 JMP 00\n05 STP\n10 0\n", [10]),
+    # jumps to the address in cell 10, which might be outside the program
+    "computed jumps":   ("00 JMP (10)\n01 STP\n02 LDA #2\n03 STP\n10 0\n", [10])
+}
+
+
+@pytest.fixture(autouse=True)
+def max_jmps():
+    """Programs that never stop end after a few steps"""
+    emu.st_properties(emu.MIN_ADR_LEN, 100, emu.MAX_CELS, emu.WORD_SIZE, emu.OVERFLOW_MODE)
+
+
+def assert_parity(prg_str, inputs_list, max_steps_list=None):
+    prg = emu.Program(prg_str)
+    states = ln.run_lanes(prg, inputs_list, max_steps_list)
+    compiled_prg = emu.compile_prg(prg)
+    max_steps_list = max_steps_list or [None] * len(inputs_list)
+    for inputs, max_steps, state in zip(inputs_list, max_steps_list, states):
+        assert state == ln.run_single(compiled_prg, inputs, max_steps), inputs
+
+
+@pytest.mark.parametrize("name", ["multiply", "divide", "fibonacci", "primes", "sort", "countdown"])
+def test_corpus_parity(name):
+    program = crp.gt_corpus()[name]
+    assert_parity(program["program"], ln.gen_inputs(LANE_COUNT, program["inputs"], -5, 30, seed=1))
+
+
+@pytest.mark.parametrize("name", EDGE_PROGRAMS)
+def test_edge_parity(name):
+    prg_str, adrs = EDGE_PROGRAMS[name]
+    values = [0, 1, -1, 2, 3, 12, -12, 255, 2 ** 31, 2 ** 32 + 1, 2 ** 62, -2 ** 63, 2 ** 63 - 1, 2 ** 70]
+    inputs_list = [{adr: values[(lane + i * 5) % len(values)] for i, adr in enumerate(adrs)}
+                   for lane in range(LANE_COUNT)]
+    assert_parity(prg_str, inputs_list)
+
+
+def test_step_limit_parity():
+    program = crp.gt_corpus()["countdown"]
+    inputs_list = ln.gen_inputs(LANE_COUNT, program["inputs"], 1, 20, seed=2)
+    assert_parity(program["program"], inputs_list, [lane * 3 for lane in range(LANE_COUNT)])
+
+
+@pytest.mark.parametrize("word_size", [8, 16, 32, 64])
+@pytest.mark.parametrize("overflow_mode", ["wrap", "saturate", "trap"])
+def test_word_size_parity(word_size, overflow_mode):
+    emu.st_properties(emu.MIN_ADR_LEN, emu.MAX_JMPS, emu.MAX_CELS, word_size, overflow_mode)
+    prg_str, adrs = EDGE_PROGRAMS["growing values"]
+    assert_parity(prg_str, ln.gen_inputs(LANE_COUNT, adrs, -300, 300, seed=3))
+    program = crp.gt_corpus()["multiply"]
+    assert_parity(program["program"], ln.gen_inputs(LANE_COUNT, program["inputs"], -200, 200, seed=4))
@@ -0,0 +1,18 @@
+from program.source import PackHandler as pck
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+def test_gt_pack_data_returns_independent_copies(tmp_path):
+    (tmp_path / "pack.dict").write_text('{"info": {"name": "Pack"}, "values": [1, 2]}', encoding="utf-8")
+    handler = pck.PackHandler(str(tmp_path / "cache"))
+    pack_data = handler.gt_pack_data("pack", str(tmp_path))
+    pack_data["info"]["name"] = "Changed"
+    pack_data["values"].append(3)
+    assert handler.gt_pack_data("pack", str(tmp_path)) == {"info": {"name": "Pack"}, "values": [1, 2]}
+    # served from the disk cache by a new handler
+    assert pck.PackHandler(str(tmp_path / "cache")).gt_pack_data("pack", str(tmp_path))["info"] == {"name": "Pack"}
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from program.source import Emulator as emu
+from program.source import ProgramCache as pcc
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+PRG_STR = "; doubles\n00 LDA 05 ; load\n\n01 ADD 05\n02 STA (06)\n03 STP\n05 21\n06 07\n"
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = tmp_path / "program.asm"
+    path.write_text(PRG_STR, encoding="utf-8")
+    return str(path)
+
+
+def fail_parsing(monkeypatch):
+    def iter_mmap_lines(*args, **kwargs):
+        raise AssertionError("parsed although the compiled program was valid")
+    monkeypatch.setattr(emu, "iter_mmap_lines", iter_mmap_lines)
+
+
+def test_gt_program_parses_like_program(source_path):
+    prg = pcc.gt_program(source_path)
+    assert str(prg) == str(emu.Program(PRG_STR))
+    assert emu.compile_prg(prg) == emu.compile_prg(emu.Program(PRG_STR))
+    assert os.path.exists(pcc.gt_compiled_path(source_path))
+
+
+def test_gt_program_loads_compiled_program(source_path, monkeypatch):
+    pcc.gt_program(source_path)
+    fail_parsing(monkeypatch)
+    prg = pcc.gt_program(source_path)
+    prg.execute()
+    assert prg.accu == 42 and prg.cells[7].gt_val() == 42
+
+
+def test_cache_dir(source_path, tmp_path):
+    pcc.gt_program(source_path, str(tmp_path / "cache"))
+    assert not os.path.exists(pcc.gt_compiled_path(source_path))
+    assert os.path.exists(pcc.gt_compiled_path(source_path, str(tmp_path / "cache")))
+
+
+def test_changed_source_is_parsed_again(source_path):
+    pcc.gt_program(source_path)
+    with open(source_path, "w", encoding="utf-8") as file:
+        file.write(PRG_STR.replace("05 21", "05 4"))
+    prg = pcc.gt_program(source_path)
+    prg.execute()
+    assert prg.accu == 8
+
+
+@pytest.mark.parametrize("change", ["parser version", "format version", "max cels", "magic", "truncated"])
+def test_outdated_header_is_ignored(source_path, change, monkeypatch):
+    pcc.gt_program(source_path)
+    compiled_path = pcc.gt_compiled_path(source_path)
+    if change == "parser version":
+        monkeypatch.setattr(emu, "PARSER_VERSION", emu.PARSER_VERSION + 1)
+    elif change == "format version":
+        monkeypatch.setattr(pcc, "FORMAT_VERSION", pcc.FORMAT_VERSION + 1)
+    elif change == "max cels":
+        emu.st_properties(emu.MIN_ADR_LEN, emu.MAX_JMPS, 6, emu.WORD_SIZE, emu.OVERFLOW_MODE)
+    else:
+        with open(compiled_path, "r+b") as file:
+            if change == "magic":
+                file.write(b"XXXX")
+            else:
+                file.truncate(pcc.HEADER.size + 3)
+    assert pcc.load(compiled_path, pcc.gt_source_hash(PRG_STR)) is None
+    if change == "max cels":
+        with pytest.raises(Exception, match="Maximum program length"):
+            pcc.gt_program(source_path)
+    else:
+        assert str(pcc.gt_program(source_path)) == str(emu.Program(PRG_STR))
+        assert pcc.load(compiled_path, pcc.gt_source_hash(PRG_STR)) is not None  # rebuilt
+
+
+def test_invalid_program_raises_and_writes_nothing(tmp_path):
+    path = tmp_path / "invalid.asm"
+    path.write_text("00 LDA 05\n01 FOO\n", encoding="utf-8")
+    with pytest.raises(Exception, match="FOO"):
+        pcc.gt_program(str(path))
+    assert not os.path.exists(pcc.gt_compiled_path(str(path)))
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.asm"
+    path.write_text("", encoding="utf-8")
+    assert pcc.gt_program(str(path)).cells == []
+
+
+def test_compiled_file_keeps_max_cels(source_path, tmp_path):
+    compiled_file = pcc.CompiledFile(source_path, str(tmp_path / "cache"))
+    assert compiled_file.gt_compiled_prg(PRG_STR) is None
+    compiled_file.st_compiled_prg(PRG_STR, emu.compile_prg(emu.Program(PRG_STR)))
+    assert pcc.CompiledFile(source_path, str(tmp_path / "cache")).gt_compiled_prg(PRG_STR) is not None
+    emu.st_properties(emu.MIN_ADR_LEN, emu.MAX_JMPS, 6, emu.WORD_SIZE, emu.OVERFLOW_MODE)
+    assert compiled_file.gt_compiled_prg(PRG_STR) is None  # validated against more memory cells
@@ -0,0 +1,69 @@
+import pytest
+
+from program.source import Emulator as emu
+from program.source import SpecRunner as spr
+from program.source import ResultCache as rc
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+SPEC = {"cases": {"a": {"inputs": {5: 3}, "accu": 6}}}
+# programs that only differ in whitespaces, empty lines and comments, each with the same error
+VARIANTS = {
+    "bad address":   ["00 LDA 05\nx1 STP\n", "\t  00   LDA 05 ; load\n\n   x1\tSTP  \n"],
+    "bad operand":   ["00 LDA #x\n01 STP\n", "  00 LDA  #x  ; x\n01 STP"],
+    "value operand": ["00 STA #3\n01 STP\n", " 00\tSTA\t#3\t\n01   STP ;"],
+    "passing":       ["00 LDA 05\n01 ADD 05\n02 STP\n", "; doubles\n00 LDA 05\n\n01 ADD 05 ; twice\n02 STP\n"]
+}
+
+
+def run(prg_str):
+    suite = spr.run_spec(SPEC, lambda: emu.Program(prg_str), "<submission>", "<request>")
+    del suite["seconds"]
+    for result in suite["cases"]:
+        del result["seconds"]
+    return suite
+
+
+@pytest.mark.parametrize("name", VARIANTS)
+def test_whitespace_variants_share_results(name, tmp_path):
+    cache = rc.ResultCache(str(tmp_path / "results.sqlite"))
+    first, second = VARIANTS[name]
+    assert rc.gt_key(first, SPEC) == rc.gt_key(second, SPEC)
+    cache.put(rc.gt_key(first, SPEC), run(first))
+    assert cache.get(rc.gt_key(second, SPEC)) == run(second)
+    cache.close()
+
+
+def test_key_depends_on_code_spec_and_properties():
+    key = rc.gt_key("00 LDA #1\n01 STP\n", SPEC)
+    assert rc.gt_key("00 lda #1\n01 STP\n", SPEC) != key  # tokens keep their case
+    assert rc.gt_key("00 LDA #1\n01 STP\n", {"cases": {"a": {"accu": 1}}}) != key
+    emu.st_properties(emu.MIN_ADR_LEN, emu.MAX_JMPS, emu.MAX_CELS, 16, "wrap")
+    assert rc.gt_key("00 LDA #1\n01 STP\n", SPEC) != key
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = rc.ResultCache(str(tmp_path / "results.sqlite"), max_bytes=300)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"data": key * 80})
+    cache.get("a")  # "b" is now the least recently used one
+    cache.put("d", {"data": "d" * 80})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("d") is not None
+    assert cache.gt_stats()["bytes"] <= 300
+    cache.close()
+    assert rc.ResultCache(str(tmp_path / "results.sqlite"), max_bytes=300).gt_stats()["entries"] == 3
+
+
+def test_skips_results_it_cannot_store(tmp_path):
+    cache = rc.ResultCache(str(tmp_path / "results.sqlite"), max_bytes=100)
+    cache.put("huge int", {"accu": 10 ** 5000})
+    cache.put("too large", {"data": "x" * 200})
+    assert cache.get("huge int") is None and cache.get("too large") is None
+    assert cache.gt_stats()["skipped"] == 2
+    cache.close()
@@ -0,0 +1,127 @@
+import json
+import xml.etree.ElementTree as et
+
+import pytest
+
+from program.source import Lanes as ln
+from program.source import Emulator as emu
+from program.source import SpecRunner as spr
+
+
+#          Copyright Blyfh https://github.com/Blyfh
+# Distributed under the Boost Software License, Version 1.0.
+#     (See accompanying file LICENSE_1_0.txt or copy at
+#           http://www.boost.org/LICENSE_1_0.txt)
+
+
+# multiplies cell 10 with cell 11 into cell 12, loops forever if cell 13 isn't zero
+PRG_STR = "00 LDA 13\n01 JNZ 01\n02 LDA 10\n03 MUL 11\n04 STA 12\n05 STP\n10 0\n11 0\n12 0\n13 0\n"
+
+
+def gt_case(a, b, loops=0, **expectations):
+    return {"inputs": {10: a, 11: b, 13: loops}, "accu": a * b, "memory": {12: a * b}, **expectations}
+
+
+def run(cases, **spec):
+    return spr.run_spec(spr.check_spec({"cases": cases, **spec}, "test"), lambda: emu.Program(PRG_STR), "test.asm",
+                        "test.tests")["cases"]
+
+
+@pytest.fixture
+def asm_path(tmp_path):
+    path = tmp_path / "program.asm"
+    path.write_text(PRG_STR, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("spec", [[], {}, {"cases": []}, {"cases": {}, "steps": 1}, {"cases": {"a": 1}},
+                                  {"cases": {"a": {"input": {}}}}, {"cases": {"a": {"inputs": {"1": 2}}}},
+                                  {"cases": {"a": {"memory": []}}}, {"cases": {}, "word_size": 12},
+                                  {"cases": {}, "overflow_mode": "clamp"}])
+def test_check_spec_rejects(spec):
+    with pytest.raises(spr.SpecError):
+        spr.check_spec(spec, "test")
+
+
+def test_load_spec_rejects_unreadable_files(tmp_path):
+    path = tmp_path / "program.tests"
+    with pytest.raises(spr.SpecError):
+        spr.load_spec(str(path))
+    path.write_text("{'cases': {", encoding="utf-8")
+    with pytest.raises(spr.SpecError):
+        spr.load_spec(str(path))
+
+
+@pytest.mark.parametrize("case_count", [3, ln.MIN_GROUP_LANES])  # one by one and as lanes
+def test_statuses(case_count):
+    cases = {f"{i} times 3": gt_case(i, 3) for i in range(case_count - 3)}
+    cases["wrong"] = gt_case(2, 3, accu=7)
+    cases["too slow"] = gt_case(2, 3, loops=1, max_steps=50)
+    cases["crash"] = {"inputs": {1: 99, 13: 1}}  # jumps behind the program
+    results = {result["name"]: result for result in run(cases)}
+    assert [result["status"] for result in results.values()] == ["passed"] * (case_count - 3) + \
+        ["failed", "failed", "error"]
+    assert results["wrong"]["messages"] == ["ACC is 6, expected 7"]
+    assert results["too slow"]["messages"] == [emu.eh.error("MaxSteps", max_steps=50)]
+    assert results["crash"]["messages"]
+
+
+def test_lanes_and_single_runs_agree():
+    cases = {f"{a} times {b}": gt_case(a, b, max_steps=1 + a % 2 * 10) for a in range(6) for b in range(-3, 2)}
+    names = list(cases)[:ln.MIN_GROUP_LANES]
+    lane_results = run({name: cases[name] for name in names})
+    single_results = [run({name: cases[name]})[0] for name in names]
+    for lane_result, single_result in zip(lane_results, single_results):
+        del lane_result["seconds"], single_result["seconds"]
+        assert lane_result == single_result
+
+
+def test_spec_max_steps():
+    assert run({"loop": gt_case(2, 3, loops=1)}, max_steps=20)[0]["status"] == "failed"
+    assert run({"loop": gt_case(2, 3, loops=1, max_steps=30)}, max_steps=20)[0]["messages"] == \
+        [emu.eh.error("MaxSteps", max_steps=30)]
+
+
+def test_word_size():
+    assert run({"overflow": gt_case(16, 16, accu=0, memory={12: 0})}, word_size=8)[0]["status"] == "passed"
+    assert run({"overflow": gt_case(16, 16, accu=127, memory={12: 127})}, word_size=8,
+               overflow_mode="saturate")[0]["status"] == "passed"
+    assert run({"overflow": gt_case(16, 16)}, word_size=8, overflow_mode="trap")[0]["status"] == "error"
+    assert (emu.WORD_SIZE, emu.OVERFLOW_MODE) == (0, "wrap")  # restored after the spec
+
+
+@pytest.mark.skipif(not spr.MAX_INT_DIGITS, reason="str() handles ints of every size")
+def test_gt_reported_val():
+    assert spr.gt_reported_val(12) == 12 and spr.gt_reported_val(None) is None
+    huge_val = 7 ** (4 * spr.MAX_INT_DIGITS)
+    assert spr.gt_reported_val(huge_val) == hex(huge_val)
+    json.dumps(run({"huge": gt_case(huge_val, 1, accu=0)})[0])
+
+
+def test_parse_error(asm_path, tmp_path):
+    spec_path = tmp_path / "broken.tests"
+    spec_path.write_text(repr({"cases": {"a": {}, "b": {}}}), encoding="utf-8")
+    (tmp_path / "broken.asm").write_text("00 LDA\n01 FOO 2\n", encoding="utf-8")
+    suite = spr.run_file(str(tmp_path / "broken.asm"))
+    assert [result["status"] for result in suite["cases"]] == ["error", "error"]
+
+
+def test_reports(asm_path, tmp_path):
+    spec = {"cases": {"passes": gt_case(2, 3), "fails": gt_case(2, 3, accu=5), "crashes": {"inputs": {1: 99, 13: 1}}}}
+    (tmp_path / "program.tests").write_text(repr(spec), encoding="utf-8")
+    suites = [spr.run_file(asm_path)]
+    report = json.loads(spr.gt_json(suites))
+    assert (report["passed"], report["failed"], report["errors"]) == (1, 1, 1)
+    suite_elm = et.fromstring(spr.gt_junit(suites)).find("testsuite")
+    assert (suite_elm.get("tests"), suite_elm.get("failures"), suite_elm.get("errors")) == ("3", "1", "1")
+    assert [len(case_elm) for case_elm in suite_elm.iter("testcase")] == [0, 1, 1]
+
+
+def test_main(asm_path, tmp_path, capsys):
+    (tmp_path / "program.tests").write_text(repr({"cases": {"passes": gt_case(2, 3)}}), encoding="utf-8")
+    assert spr.main([asm_path, "--format", "junit", "--output", str(tmp_path / "report.xml")]) == 0
+    assert et.parse(str(tmp_path / "report.xml")).getroot().tag == "testsuites"
+    (tmp_path / "program.tests").write_text("{'cases': {'a': {'accu': 1}}}", encoding="utf-8")
+    assert spr.main([asm_path]) == 1
+    (tmp_path / "program.tests").write_text("{'cases': 1}", encoding="utf-8")
+    assert spr.main([asm_path]) == 2